@@ -1,10 +1,51 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponseRedirect
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Producto, Venta, DetalleVenta
+from .models import (
+    Producto, Venta, DetalleVenta, ResumenVentasDiario, ResumenProductoDiario,
+    MovimientoInventario, VentaArchivada, DetalleVentaArchivada, Trabajo, TurnoCaja, recalculo_diferido,
+)
+from .servicios import cambiar_estado
+from . import importacion, inventario, resumenes
+from .forms import ImportarProductosForm
+from .busqueda import obtener_backend
+from . import catalogo, escaner, trabajos, turnos, typeahead
+from .imagenes import fuentes
+from .replica import LecturaReplicaAdminMixin
+
+
+class EstadoStockFilter(admin.SimpleListFilter):
+    """Filtro por nivel de stock resuelto en la base de datos"""
+    title = 'nivel de stock'
+    parameter_name = 'nivel_stock'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('reordenar', 'Por reordenar'),
+            ('agotado', 'Agotado'),
+            ('ok', 'Stock OK'),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'reordenar':
+            return queryset.bajo_stock()
+        if self.value() == 'agotado':
+            return queryset.agotados()
+        if self.value() == 'ok':
+            return queryset.filter(stock__gt=F('stock_minimo'))
+        return queryset
 
 
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
+class ProductoAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
     list_display = [
         'codigo_barras',
         'nombre',
@@ -19,6 +60,7 @@ class ProductoAdmin(admin.ModelAdmin):
     
     list_filter = [
         'activo',
+        EstadoStockFilter,
         'fecha_creacion'
     ]
 
@@ -34,7 +76,8 @@ class ProductoAdmin(admin.ModelAdmin):
     ]
     
     list_per_page = 30
-    ordering = ['nombre']
+    # Con id explícito el admin no agrega '-pk' y el orden sale del índice
+    ordering = ['nombre', 'id']
     
     fieldsets = (
         ('Información Básica', {
@@ -76,14 +119,69 @@ class ProductoAdmin(admin.ModelAdmin):
         'mostrar_miniatura'
     ]
 
+    change_list_template = 'admin/productos/producto/change_list.html'
+
+    def get_urls(self):
+        return [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_view),
+                name='productos_producto_importar',
+            ),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        """Sube un CSV/XLSX y lo importa por chunks, igual que importar_productos"""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+
+        form = ImportarProductosForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                filas = importacion.leer(archivo.file, archivo.name)
+                reporte = importacion.importar(filas, usuario=request.user)
+            except (ImportError, ValueError) as e:
+                self.message_user(request, str(e), messages.ERROR)
+            else:
+                for error in reporte.errores:
+                    self.message_user(request, error, messages.WARNING)
+                self.message_user(request, f'Importación terminada: {reporte}.')
+                return redirect('admin:productos_producto_changelist')
+
+        return TemplateResponse(request, 'admin/productos/producto/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar productos',
+            'form': form,
+        })
+
+    def save_model(self, request, obj, form, change):
+        # Los cambios de stock quedan en la bitácora a nombre de este usuario
+        obj._usuario_movimiento = request.user
+        super().save_model(request, obj, form, change)
+
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields sólo habilita la caja; la búsqueda usa el índice
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return obtener_backend().filtrar(queryset, search_term), False
+
     @admin.display(description='Ganancia', ordering='precio_venta')
     def mostrar_ganancia(self, obj):
         ganancia = obj.calcular_ganancia()
         return f"${ganancia:.2f}"
 
-    @admin.display(description='Stock OK', boolean=True)
+    def get_queryset(self, request):
+        # Alerta de stock calculada en la consulta, para poder ordenar por ella
+        return super().get_queryset(request).annotate(
+            _stock_ok=ExpressionWrapper(Q(stock__gt=F('stock_minimo')), output_field=BooleanField()),
+        )
+
+    @admin.display(description='Stock OK', boolean=True, ordering='_stock_ok')
     def mostrar_alerta_stock(self, obj):
-        return not obj.necesita_reordenar()
+        return obj._stock_ok
 
     @admin.display(description='Imagen')
     def mostrar_imagen(self, obj):
@@ -94,9 +192,19 @@ class ProductoAdmin(admin.ModelAdmin):
     @admin.display(description='Miniatura')
     def mostrar_miniatura(self, obj):
         if obj.imagen:
+            imagen = fuentes(obj.imagen, obj.miniaturas)
+            if not obj.miniaturas:
+                return format_html(
+                    '<img src="{}" width="200" height="200" style="object-fit: contain;" />',
+                    imagen['src'],
+                )
             return format_html(
-                '<img src="{}" width="200" height="200" style="object-fit: contain;" />',
-                obj.imagen.url
+                '<picture><source type="image/webp" srcset="{}" sizes="200px">'
+                '<img src="{}" srcset="{}" sizes="200px" width="200" height="200" style="object-fit: contain;" />'
+                '</picture>',
+                imagen['srcset_webp'],
+                imagen['src'],
+                imagen['srcset_jpg'],
             )
         return "Sin imagen"
     
@@ -104,12 +212,20 @@ class ProductoAdmin(admin.ModelAdmin):
     
     @admin.action(description='Marcar como inactivos')
     def marcar_como_inactivo(self, request, queryset):
-        updated = queryset.update(activo=False)
+        codigos = list(queryset.values_list('codigo_barras', flat=True))
+        updated = queryset.update(activo=False, fecha_actualizacion=timezone.now())
+        escaner.invalidar(*codigos)
+        typeahead.invalidar()
+        catalogo.invalidar()
         self.message_user(request, f'{updated} producto(s) inactivo(s).') 
     
     @admin.action(description='Marcar como activos')
     def marcar_como_activo(self, request, queryset):
-        updated = queryset.update(activo=True)
+        codigos = list(queryset.values_list('codigo_barras', flat=True))
+        updated = queryset.update(activo=True, fecha_actualizacion=timezone.now())
+        escaner.invalidar(*codigos)
+        typeahead.invalidar()
+        catalogo.invalidar()
         self.message_user(request, f'{updated} producto(s) activo(s).')
 
 
@@ -127,7 +243,7 @@ class DetalleVentaInline(admin.TabularInline):
 
 
 @admin.register(Venta)
-class VentaAdmin(admin.ModelAdmin):
+class VentaAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
     inlines = [DetalleVentaInline]
     
     list_display = [
@@ -153,12 +269,29 @@ class VentaAdmin(admin.ModelAdmin):
     list_per_page = 25
     ordering = ['-fecha']
 
+    def get_queryset(self, request):
+        # Conteos de detalles en la misma consulta del changelist
+        return super().get_queryset(request).annotate(
+            _cantidad_items=Count('detalles'),
+            _cantidad_productos=Coalesce(Sum('detalles__cantidad'), 0),
+        )
+
+    @admin.display(description='Items', ordering='_cantidad_items')
+    def cantidad_items(self, obj):
+        return obj._cantidad_items
+
+    @admin.display(description='Productos', ordering='_cantidad_productos')
+    def cantidad_productos(self, obj):
+        return obj._cantidad_productos
+
     fieldsets = (
         ('Información', {
             'fields': (
                 'fecha',
                 'estado', 
                 'notas',
+                'cajero',
+                'turno',
             )
         }),
         ('Totales', {
@@ -176,22 +309,98 @@ class VentaAdmin(admin.ModelAdmin):
     
     readonly_fields = [
         'total',
+        'cajero',
+        'turno',
         'fecha_creacion', 
         'fecha_actualizacion',
     ]
     
-    actions = ['marcar_completada', 'marcar_cancelada']
+    actions = ['marcar_completada', 'marcar_cancelada', 'recalcular_totales']
+
+    # Las ventas de un turno cerrado ya están en su corte de caja: sólo lectura.
+    # delete_selected también pregunta por cada objeto.
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and not self._turno_cerrado(obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not self._turno_cerrado(obj)
+
+    def _turno_cerrado(self, obj):
+        return obj is not None and obj.turno_id is not None and obj.turno.estado == 'cerrado'
+
+    def save_model(self, request, obj, form, change):
+        # Se quita la contribución anterior a los resúmenes y a los turnos y
+        # se vuelve a aplicar en save_related(), ya con los detalles guardados.
+        # Del inventario sólo se registra la diferencia neta de unidades.
+        request._unidades_antes = {}
+        if change:
+            turnos.aplicar_ventas([obj.pk], -1)
+        if change and form.initial.get('estado') == 'completada':
+            resumenes.aplicar_ventas([obj.pk], -1)
+            request._unidades_antes = inventario.unidades_venta(obj.pk)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        # Un solo recálculo del total aunque el inline guarde varios detalles
+        with recalculo_diferido():
+            super().save_related(request, form, formsets, change)
+        turnos.aplicar_ventas([form.instance.pk])
+        despues = {}
+        if form.instance.estado == 'completada':
+            resumenes.aplicar_ventas([form.instance.pk])
+            despues = inventario.unidades_venta(form.instance.pk)
+        try:
+            inventario.ajustar_venta(form.instance.pk, request._unidades_antes, despues)
+        except ValueError as e:
+            # changeform_view corre en una transacción: se descarta todo
+            transaction.set_rollback(True)
+            request._venta_sin_stock = True
+            self.message_user(request, str(e), messages.ERROR)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if getattr(request, '_venta_sin_stock', False):
+            return HttpResponseRedirect(request.path)
+        return super().response_add(request, obj, post_url_continue)
+
+    def response_change(self, request, obj):
+        if getattr(request, '_venta_sin_stock', False):
+            return HttpResponseRedirect(request.path)
+        return super().response_change(request, obj)
+
+    def delete_model(self, request, obj):
+        if obj.estado == 'completada':
+            resumenes.aplicar_ventas([obj.pk], -1)
+        turnos.aplicar_ventas([obj.pk], -1)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        resumenes.aplicar_ventas(queryset.filter(estado='completada').values_list('id', flat=True), -1)
+        turnos.aplicar_ventas(queryset.values_list('id', flat=True), -1)
+        super().delete_queryset(request, queryset)
 
     @admin.action(description='Marcar completadas')
     def marcar_completada(self, request, queryset):
-        updated = queryset.update(estado='completada')
+        try:
+            updated = cambiar_estado(queryset, 'completada')
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
         self.message_user(request, f'{updated} venta(s) completada(s).')
 
     @admin.action(description='Marcar canceladas')
     def marcar_cancelada(self, request, queryset):
-        updated = queryset.update(estado='cancelada')
+        try:
+            updated = cambiar_estado(queryset, 'cancelada')
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
         self.message_user(request, f'{updated} venta(s) cancelada(s).')
 
+    @admin.action(description='Recalcular totales')
+    def recalcular_totales(self, request, queryset):
+        updated = queryset.recalcular_totales()
+        self.message_user(request, f'{updated} total(es) recalculado(s).')
+
     @admin.display(description='Ticket')
     def ver_ticket(self, obj):
         from django.urls import reverse
@@ -202,7 +411,7 @@ class VentaAdmin(admin.ModelAdmin):
 
 
 @admin.register(DetalleVenta)
-class DetalleVentaAdmin(admin.ModelAdmin):
+class DetalleVentaAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
     list_display = [
         'id',
         'venta',
@@ -222,4 +431,214 @@ class DetalleVentaAdmin(admin.ModelAdmin):
         'producto__nombre',
     ]
     
-    readonly_fields = ['subtotal']
\ No newline at end of file
+    list_select_related = ['venta', 'producto']
+    
+    readonly_fields = ['subtotal']
+
+    # Los detalles se editan desde la venta, que lleva la bitácora de
+    # inventario, los resúmenes y los turnos
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ResumenVentasDiario)
+class ResumenVentasDiarioAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
+    list_display = [
+        'fecha',
+        'num_ventas',
+        'unidades',
+        'ingresos',
+        'costo',
+        'margen',
+    ]
+    
+    date_hierarchy = 'fecha'
+    list_per_page = 31
+    
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ResumenProductoDiario)
+class ResumenProductoDiarioAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
+    list_display = [
+        'fecha',
+        'producto',
+        'unidades',
+        'ingresos',
+        'costo',
+        'margen',
+    ]
+    
+    list_select_related = ['producto']
+    date_hierarchy = 'fecha'
+    search_fields = ['producto__nombre', 'producto__codigo_barras']
+    
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MovimientoInventario)
+class MovimientoInventarioAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
+    list_display = [
+        'id',
+        'fecha',
+        'producto',
+        'tipo',
+        'cantidad',
+        'venta',
+        'usuario',
+        'nota',
+    ]
+    
+    list_filter = [
+        'tipo',
+        'fecha',
+    ]
+    
+    search_fields = ['producto__nombre', 'producto__codigo_barras']
+    list_select_related = ['producto', 'venta', 'usuario']
+    date_hierarchy = 'fecha'
+    
+    # Bitácora de sólo inserción: ni alta manual, ni cambios, ni borrado
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class DetalleVentaArchivadaInline(admin.TabularInline):
+    model = DetalleVentaArchivada
+    fields = ['producto_codigo_barras', 'producto_nombre', 'cantidad', 'precio_unitario', 'subtotal']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VentaArchivada)
+class VentaArchivadaAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'fecha',
+        'total',
+        'estado',
+        'fecha_archivo',
+    ]
+    list_filter = ['estado']
+    date_hierarchy = 'fecha'
+    ordering = ['-fecha', '-id']
+    inlines = [DetalleVentaArchivadaInline]
+    # El conteo exacto de un archivo de años no aporta en la lista
+    show_full_result_count = False
+
+    # Historial de sólo lectura: se llena con archivar_ventas
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Trabajo)
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'tarea',
+        'estado',
+        'intentos',
+        'creado',
+        'latencia',
+        'duracion',
+        'trabajador',
+    ]
+    list_filter = ['estado', 'tarea']
+    search_fields = ['clave_unica', 'trabajador']
+    ordering = ['-id']
+    actions = ['reintentar']
+    readonly_fields = [
+        'tarea', 'argumentos', 'clave_unica', 'estado', 'intentos', 'max_intentos',
+        'disponible_en', 'creado', 'iniciado', 'terminado', 'trabajador', 'error',
+    ]
+
+    @admin.display(description='Latencia')
+    def latencia(self, obj):
+        # Cuánto esperó en la cola antes de que un trabajador lo tomara
+        return obj.iniciado - obj.creado if obj.iniciado else '-'
+
+    @admin.display(description='Duración')
+    def duracion(self, obj):
+        return obj.terminado - obj.iniciado if obj.terminado and obj.iniciado else '-'
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'estadisticas': trabajos.estadisticas()}
+        return super().changelist_view(request, extra_context)
+
+    @admin.action(description='Reintentar fallidos')
+    def reintentar(self, request, queryset):
+        updated = trabajos.reintentar(queryset)
+        self.message_user(request, f'{updated} trabajo(s) de vuelta en la cola.')
+
+    # Los trabajos los crea el código (encolar); en el admin sólo se revisan
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TurnoCaja)
+class TurnoCajaAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
+    list_display = [
+        'id',
+        'caja',
+        'usuario',
+        'estado',
+        'abierto',
+        'cerrado',
+        'ventas_completadas',
+        'total_completadas',
+        'ventas_canceladas',
+        'diferencia',
+    ]
+    list_filter = ['estado', 'caja', 'abierto']
+    list_select_related = ['usuario']
+    date_hierarchy = 'abierto'
+    ordering = ['-abierto']
+    # Los contadores sólo los mueven las ventas; conciliar_turnos los verifica
+    readonly_fields = [
+        'usuario', 'caja', 'estado', 'abierto', 'cerrado', 'fondo_inicial', 'efectivo_contado',
+        'ventas_completadas', 'total_completadas', 'ventas_canceladas', 'total_canceladas',
+        'ventas_pendientes', 'total_pendientes',
+    ]
+
+    @admin.display(description='Diferencia')
+    def diferencia(self, obj):
+        return obj.diferencia if obj.diferencia is not None else '-'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
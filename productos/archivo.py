@@ -0,0 +1,168 @@
+"""
+Archivo de ventas cerradas.
+
+archivar() mueve por lotes las ventas completadas o canceladas anteriores al
+horizonte a VentaArchivada/DetalleVentaArchivada (en la base de archivo del
+router) y las borra de ventas_venta y ventas_detalleventa, así las listas
+del admin, los filtros por fecha y los COUNT(*) sólo recorren los meses
+recientes. Los resúmenes diarios no se tocan: los reportes siguen saliendo
+de ellos.
+
+Cada lote bloquea sus ventas (select_for_update) y vuelve a comprobar que
+sigan cerradas y anteriores al horizonte; la copia sale de esa lectura y
+sólo se borran esas ventas, así que una edición concurrente no se pierde.
+Con el archivo en otra base de datos la copia se confirma antes que el
+borrado: si el proceso se interrumpe entre ambos, la venta queda en las dos
+y el siguiente lote reemplaza la copia (upsert) sin duplicarla.
+
+obtener_venta() busca en las tablas activas y después en el archivo; los
+tickets la usan y la exportación intercala los detalles archivados, así que
+ninguno nota el cambio.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+from django.http import Http404
+from django.utils import timezone
+
+from .models import (
+    DetalleVenta, DetalleVentaArchivada, MovimientoInventario, Venta, VentaArchivada,
+)
+from .routers import alias_archivo
+
+DIAS_HORIZONTE = 180
+TAMANO_LOTE = 500
+# Las pendientes todavía pueden completarse y mover stock
+ESTADOS_CERRADOS = ('completada', 'cancelada')
+
+
+def por_archivar(antes_de):
+    return Venta.objects.filter(fecha__lt=antes_de, estado__in=ESTADOS_CERRADOS)
+
+
+CAMPOS_VENTA = (
+    'fecha', 'total', 'estado', 'notas', 'clave_idempotencia', 'turno_id', 'cajero_id',
+    'fecha_creacion', 'fecha_actualizacion', 'fecha_archivo',
+)
+CAMPOS_DETALLE = (
+    'venta', 'producto_id', 'producto_codigo_barras', 'producto_nombre',
+    'cantidad', 'precio_unitario', 'subtotal', 'costo_unitario',
+)
+
+
+def archivar_lote(venta_ids, antes_de):
+    """
+    Copia al archivo las ventas indicadas que siguen siendo archivables y
+    las borra de las tablas activas. Regresa cuántas se archivaron.
+    """
+    with transaction.atomic():
+        ventas = list(por_archivar(antes_de).filter(id__in=venta_ids).select_for_update())
+        venta_ids = [venta.id for venta in ventas]
+        if not venta_ids:
+            return 0
+        detalles = list(
+            DetalleVenta.objects
+            .filter(venta_id__in=venta_ids)
+            .select_related('producto')
+            .only(
+                'id', 'venta_id', 'cantidad', 'precio_unitario', 'subtotal', 'costo_unitario',
+                'producto__id', 'producto__codigo_barras', 'producto__nombre',
+            )
+        )
+        _copiar(ventas, detalles)
+
+        # La bitácora pierde la llave (SET_NULL); el número de venta queda en la nota
+        (
+            MovimientoInventario.objects
+            .filter(venta_id__in=venta_ids, nota='')
+            .update(nota=Concat(Value('Venta #'), Cast('venta_id', CharField()), Value(' (archivada)')))
+        )
+        DetalleVenta.objects.filter(venta_id__in=venta_ids).delete()
+        Venta.objects.filter(id__in=venta_ids).delete()
+    return len(venta_ids)
+
+
+def _copiar(ventas, detalles):
+    """Upsert de las ventas y sus detalles en el archivo; reemplaza copias de un lote interrumpido"""
+    ahora = timezone.now()
+    with transaction.atomic(using=alias_archivo()):
+        VentaArchivada.objects.bulk_create(
+            [
+                VentaArchivada(
+                    id=venta.id,
+                    fecha=venta.fecha,
+                    total=venta.total,
+                    estado=venta.estado,
+                    notas=venta.notas,
+                    clave_idempotencia=venta.clave_idempotencia,
+                    turno_id=venta.turno_id,
+                    cajero_id=venta.cajero_id,
+                    fecha_creacion=venta.fecha_creacion,
+                    fecha_actualizacion=venta.fecha_actualizacion,
+                    fecha_archivo=ahora,
+                )
+                for venta in ventas
+            ],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=CAMPOS_VENTA,
+        )
+        # Detalles que la copia anterior tenía y la venta ya no
+        (
+            DetalleVentaArchivada.objects
+            .filter(venta_id__in=[venta.id for venta in ventas])
+            .exclude(id__in=[detalle.id for detalle in detalles])
+            .delete()
+        )
+        DetalleVentaArchivada.objects.bulk_create(
+            [
+                DetalleVentaArchivada(
+                    id=detalle.id,
+                    venta_id=detalle.venta_id,
+                    producto_id=detalle.producto.id,
+                    producto_codigo_barras=detalle.producto.codigo_barras,
+                    producto_nombre=detalle.producto.nombre,
+                    cantidad=detalle.cantidad,
+                    precio_unitario=detalle.precio_unitario,
+                    subtotal=detalle.subtotal,
+                    costo_unitario=detalle.costo_unitario,
+                )
+                for detalle in detalles
+            ],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=CAMPOS_DETALLE,
+        )
+
+
+def archivar(dias=DIAS_HORIZONTE, tamano_lote=TAMANO_LOTE, limite=None):
+    """
+    Archiva las ventas cerradas con más de `dias` días, `tamano_lote` por
+    transacción. `limite` corta después de ese número de ventas. Regresa el
+    total archivado.
+    """
+    antes_de = timezone.now() - timedelta(days=dias)
+    total = 0
+    while limite is None or total < limite:
+        tamano = tamano_lote if limite is None else min(tamano_lote, limite - total)
+        ids = list(por_archivar(antes_de).order_by('fecha', 'id').values_list('id', flat=True)[:tamano])
+        if not ids:
+            break
+        total += archivar_lote(ids, antes_de)
+    return total
+
+
+def obtener_venta(venta_id):
+    """Venta activa o archivada con ese id, o Http404"""
+    venta = Venta.objects.filter(id=venta_id).first()
+    if venta is None:
+        venta = VentaArchivada.objects.filter(id=venta_id).first()
+    if venta is None:
+        raise Http404('Venta no encontrada')
+    return venta
+
+
+def detalles_archivados(venta_id):
+    return list(DetalleVentaArchivada.objects.filter(venta_id=venta_id).order_by('id'))
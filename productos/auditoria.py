@@ -0,0 +1,164 @@
+"""
+Auditoría de planes de consulta.
+
+CONSULTAS registra las consultas de las rutas más usadas (listas, POS,
+admin, sincronización, reportes). auditar() obtiene el plan de cada una con
+QuerySet.explain() y marca los recorridos completos de tabla y los
+ordenamientos en tablas temporales, que crecen con el tamaño de los datos.
+
+Los planes no dependen de cuántas filas haya (SQLite sin ANALYZE elige por
+los índices disponibles), así que la auditoría sirve igual en una base de
+pruebas vacía y detecta cuando un cambio en una vista pierde su índice.
+"""
+import re
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from . import exportacion, reorden, sincronizacion, trabajos
+from .models import (
+    DetalleVenta, MovimientoInventario, Producto, ResumenProductoDiario, Venta,
+)
+from .paginacion import codificar_cursor, despues_de
+
+CONSULTAS = {}
+
+# Patrones de problemas por motor: (expresión, descripción)
+PATRONES = {
+    'sqlite': [
+        (re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)(?: AS \w+)?\s*$'), 'recorrido completo'),
+        (re.compile(r'USE TEMP B-TREE'), 'ordenamiento temporal'),
+    ],
+    'postgresql': [
+        (re.compile(r'Seq Scan on (\w+)'), 'recorrido completo'),
+        (re.compile(r'\bSort\b'), 'ordenamiento temporal'),
+    ],
+}
+
+
+def consulta(nombre, permitidos=()):
+    """
+    Registra una función que regresa el queryset a auditar. `permitidos` son
+    fragmentos de líneas del plan aceptadas a propósito (p. ej. una tabla
+    que siempre se recorre completa).
+    """
+    def decorador(funcion):
+        CONSULTAS[nombre] = (funcion, tuple(permitidos))
+        return funcion
+    return decorador
+
+
+class Hallazgo:
+    def __init__(self, consulta, problema, linea):
+        self.consulta = consulta
+        self.problema = problema
+        self.linea = linea
+
+    def __str__(self):
+        return f'{self.consulta}: {self.problema} ({self.linea})'
+
+
+def plan(queryset):
+    return queryset.explain()
+
+
+def analizar(nombre, texto, permitidos=(), vendor=None):
+    """Hallazgos de un plan ya obtenido"""
+    patrones = PATRONES.get(vendor or connection.vendor, [])
+    hallazgos = []
+    for linea in texto.splitlines():
+        linea = linea.strip()
+        if any(permitido in linea for permitido in permitidos):
+            continue
+        for patron, problema in patrones:
+            if patron.search(linea):
+                hallazgos.append(Hallazgo(nombre, problema, linea))
+    return hallazgos
+
+
+def auditar(nombres=None):
+    """Regresa [(nombre, plan, hallazgos)] de las consultas registradas"""
+    resultados = []
+    for nombre, (funcion, permitidos) in CONSULTAS.items():
+        if nombres and nombre not in nombres:
+            continue
+        texto = plan(funcion())
+        resultados.append((nombre, texto, analizar(nombre, texto, permitidos)))
+    return resultados
+
+
+# Consultas de las vistas y comandos. Los valores concretos (ids, fechas,
+# cursores) sólo importan para que la forma de la consulta sea la real.
+
+@consulta('lista_productos')
+def _lista_productos():
+    return despues_de(Producto.objects.all(), codificar_cursor('M', 1))[:51]
+
+
+@consulta('pos_grid_inicio')
+def _pos_grid_inicio():
+    return despues_de(Producto.objects.filter(activo=True))[:49]
+
+
+@consulta('pos_grid')
+def _pos_grid():
+    return despues_de(Producto.objects.filter(activo=True), codificar_cursor('M', 1))[:49]
+
+
+@consulta('admin_productos')
+def _admin_productos():
+    return Producto.objects.order_by('nombre', 'id')[:30]
+
+
+@consulta('bajo_stock')
+def _bajo_stock():
+    return reorden.productos_por_reordenar()
+
+
+@consulta('sincronizacion_catalogo')
+def _sincronizacion():
+    return sincronizacion.cambios(sincronizacion.codificar_cursor(timezone.now() - timedelta(days=1), 1))[:1000]
+
+
+@consulta('admin_ventas')
+def _admin_ventas():
+    return Venta.objects.order_by('-fecha', '-id')[:25]
+
+
+@consulta('ventas_por_estado')
+def _ventas_por_estado():
+    return Venta.objects.filter(estado='completada').order_by('-fecha', '-id')[:25]
+
+
+@consulta('ventas_rango_fechas')
+def _ventas_rango_fechas():
+    hoy = timezone.now()
+    return Venta.objects.filter(fecha__gte=hoy - timedelta(days=30), fecha__lt=hoy).order_by('fecha')
+
+
+# El índice entrega las ventas en orden; sólo se ordenan los detalles de cada venta
+@consulta('exportacion_ventas', permitidos=['RIGHT PART OF ORDER BY'])
+def _exportacion_ventas():
+    hoy = timezone.localdate()
+    return exportacion.detalles(hoy - timedelta(days=30), hoy, 'completada')
+
+
+@consulta('detalles_por_producto')
+def _detalles_por_producto():
+    return DetalleVenta.objects.filter(producto_id=1).order_by('venta_id')
+
+
+@consulta('movimientos_producto')
+def _movimientos_producto():
+    return MovimientoInventario.objects.filter(producto_id=1).order_by('-id')[:50]
+
+
+@consulta('resumen_producto')
+def _resumen_producto():
+    return ResumenProductoDiario.objects.filter(producto_id=1).order_by('-fecha')[:31]
+
+
+@consulta('cola_trabajos')
+def _cola_trabajos():
+    return trabajos.disponibles(timezone.now()).values_list('id', flat=True)[:10]
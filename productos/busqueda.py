@@ -0,0 +1,183 @@
+"""
+Backends de búsqueda de productos.
+
+El backend se elige con el setting PRODUCTOS_BUSQUEDA_BACKEND (ruta de la
+clase). Por defecto se usa un índice FTS5 con tokenizador trigram de SQLite,
+que acelera búsquedas por subcadena sin recorrer toda la tabla de productos.
+"""
+import unicodedata
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+BACKEND_POR_DEFECTO = 'productos.busqueda.FTS5Backend'
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'Jamón' -> 'jamon'"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+class BusquedaBackend(ABC):
+    """Interfaz común de los backends de búsqueda"""
+
+    @abstractmethod
+    def filtrar(self, queryset, termino):
+        """Filtra el queryset por el término, sin ordenar por relevancia"""
+
+    def buscar(self, queryset, termino, limite=100):
+        """Regresa hasta `limite` productos ordenados por relevancia"""
+        return self.filtrar(queryset, termino)[:limite]
+
+    def indexar(self, productos):
+        """Agrega o actualiza productos en el índice"""
+
+    def eliminar(self, producto_ids):
+        """Quita productos del índice"""
+
+    def reconstruir(self):
+        """Reconstruye el índice completo. Regresa los productos indexados"""
+        return 0
+
+
+class IcontainsBackend(BusquedaBackend):
+    """Búsqueda con LIKE '%...%' (recorre toda la tabla, sin índice)"""
+
+    def filtrar(self, queryset, termino):
+        return queryset.filter(
+            Q(nombre__icontains=termino) |
+            Q(codigo_barras__icontains=termino)
+        )
+
+    def buscar(self, queryset, termino, limite=100):
+        return self.filtrar(queryset, termino).order_by('nombre', 'id')[:limite]
+
+
+class FTS5Backend(BusquedaBackend):
+    """
+    Índice SQLite FTS5 (tokenizador trigram) sobre nombre, código y descripción
+    normalizados sin acentos. El rowid de la tabla virtual es el id del producto.
+    Palabras de menos de 3 letras no caben en un trigrama: se filtran con
+    icontains junto con las demás, y si todas son cortas se usa IcontainsBackend.
+    """
+    tabla = 'productos_busqueda'
+    # Pesos bm25 por columna: nombre, codigo_barras, descripcion
+    pesos = (10.0, 5.0, 1.0)
+
+    def __init__(self):
+        self.respaldo = IcontainsBackend()
+
+    def disponible(self):
+        return connection.vendor == 'sqlite'
+
+    def consulta_match(self, termino):
+        """Convierte el texto del usuario en una consulta MATCH de frases trigram"""
+        palabras = [p for p in normalizar(termino).split() if len(p) >= 3]
+        return ' '.join('"{}"'.format(p.replace('"', '""')) for p in palabras)
+
+    def palabras_cortas(self, termino):
+        """Palabras del término que no llegan a un trigrama, tal como se escribieron"""
+        return [p for p in termino.split() if len(normalizar(p)) < 3]
+
+    def filtrar_cortas(self, queryset, cortas):
+        for palabra in cortas:
+            queryset = queryset.filter(Q(nombre__icontains=palabra) | Q(codigo_barras__icontains=palabra))
+        return queryset
+
+    def filtrar(self, queryset, termino):
+        match = self.consulta_match(termino)
+        if not self.disponible() or not match:
+            return self.respaldo.filtrar(queryset, termino)
+        queryset = queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.tabla} WHERE {self.tabla} MATCH %s', [match])
+        )
+        return self.filtrar_cortas(queryset, self.palabras_cortas(termino))
+
+    def buscar(self, queryset, termino, limite=100):
+        match = self.consulta_match(termino)
+        if not self.disponible() or not match:
+            return self.respaldo.buscar(queryset, termino, limite)
+
+        condicion, parametros = '', []
+        cortas = self.palabras_cortas(termino)
+        if cortas:
+            # Dentro de la consulta, antes del LIMIT: si no, podrían quedar menos resultados
+            candidatos = self.filtrar_cortas(queryset, cortas).values('id')
+            sql, parametros = candidatos.query.sql_with_params()
+            condicion = f' AND rowid IN ({sql})'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.tabla} WHERE {self.tabla} MATCH %s{condicion} '
+                f'ORDER BY bm25({self.tabla}, %s, %s, %s) LIMIT %s',
+                [match, *parametros, *self.pesos, limite]
+            )
+            ids = [fila[0] for fila in cursor.fetchall()]
+
+        if not ids:
+            return queryset.none()
+        posicion = Case(
+            *[When(id=producto_id, then=i) for i, producto_id in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+        return queryset.filter(id__in=ids).order_by(posicion)
+
+    def filas(self, productos):
+        return [
+            (p.id, normalizar(p.nombre), p.codigo_barras, normalizar(p.descripcion))
+            for p in productos
+        ]
+
+    def indexar(self, productos):
+        if not self.disponible():
+            return
+        filas = self.filas(productos)
+        if not filas:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.tabla} WHERE rowid = %s', [(f[0],) for f in filas])
+            cursor.executemany(
+                f'INSERT INTO {self.tabla} (rowid, nombre, codigo_barras, descripcion) '
+                f'VALUES (%s, %s, %s, %s)',
+                filas
+            )
+
+    def eliminar(self, producto_ids):
+        if not self.disponible() or not producto_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.tabla} WHERE rowid = %s', [(i,) for i in producto_ids])
+
+    def reconstruir(self, tamano_lote=2000):
+        from .models import Producto
+
+        if not self.disponible():
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.tabla}')
+
+        total = 0
+        lote = []
+        productos = Producto.objects.only('id', 'nombre', 'codigo_barras', 'descripcion')
+        for producto in productos.iterator(chunk_size=tamano_lote):
+            lote.append(producto)
+            if len(lote) >= tamano_lote:
+                self.indexar(lote)
+                total += len(lote)
+                lote = []
+        self.indexar(lote)
+        return total + len(lote)
+
+
+@lru_cache(maxsize=None)
+def obtener_backend():
+    """Instancia del backend configurado en PRODUCTOS_BUSQUEDA_BACKEND"""
+    ruta = getattr(settings, 'PRODUCTOS_BUSQUEDA_BACKEND', BACKEND_POR_DEFECTO)
+    return import_string(ruta)()
@@ -0,0 +1,138 @@
+"""
+Versión global del catálogo para las cachés de páginas y fragmentos.
+
+La tabla de la lista pública y el grid del punto de venta se guardan en el
+alias PRODUCTOS_CACHE_ALIAS con la versión actual en la clave; las páginas
+JSON del grid la usan para su ETag. La versión vive en la base de datos
+(versiones.py), así que todos los procesos ven la misma aunque la caché
+sea local. Todo cambio visible de un producto (save/delete, acciones
+masivas del admin e importación) llama a invalidar(): las entradas
+anteriores dejan de usarse y expiran solas, así que nunca se sirve un
+fragmento desactualizado.
+
+El stock no forma parte de lo guardado: cambia con cada venta y no debe
+vaciar la caché. Los fragmentos llevan una marca <!--stock:ID:parte--> por
+cada lugar que lo muestra; rellenar_stock() la reemplaza en cada petición
+con el stock leído por id (stock_actual()), y los ETag lo incluyen.
+
+Las respuestas llevan además un Last-Modified con la última
+fecha_actualizacion de lo que muestran, para responder 304 sin renderizar.
+El detalle de un producto usa su propia fecha_actualizacion, que también
+cambia con los UPDATE de stock.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.template.loader import get_template
+
+from . import versiones
+from .models import Producto
+
+CLAVE_VERSION = 'catalogo'
+PREFIJO = 'catalogo'
+MARCA_STOCK = re.compile(r'<!--stock:(\d+):(\w+)-->')
+PLANTILLA_STOCK = 'productos/includes/stock.html'
+
+
+def _cache():
+    return caches[getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')]
+
+
+def version():
+    return versiones.leer(CLAVE_VERSION)
+
+
+def invalidar():
+    """
+    Incrementa la versión al confirmar la transacción actual (de inmediato
+    fuera de una). Antes del commit otra petición podría guardar los datos
+    viejos con la versión nueva.
+    """
+    versiones.incrementar(CLAVE_VERSION)
+
+
+def clave(nombre, *partes, version_actual=None):
+    if version_actual is None:
+        version_actual = version()
+    # Las partes vienen de la URL (cursores): se resumen para acotar la clave
+    resumen = hashlib.sha1(repr(partes).encode()).hexdigest()
+    return f'{PREFIJO}:{nombre}:{version_actual}:{resumen}'
+
+
+def obtener(nombre, partes, generar, version_actual=None):
+    """Valor guardado para (nombre, partes) en la versión actual; generar() si falta"""
+    cache = _cache()
+    llave = clave(nombre, *partes, version_actual=version_actual)
+    valor = cache.get(llave)
+    if valor is None:
+        valor = generar()
+        cache.set(llave, valor)
+    return valor
+
+
+def etag(nombre, *partes, extra='', stock=None, version_actual=None):
+    """
+    ETag fuerte; `extra` distingue respuestas que dependen de algo más (p. ej.
+    el usuario) y `stock` es {producto_id: ...} de los productos que muestran
+    """
+    base = clave(nombre, *partes, version_actual=version_actual) + extra
+    if stock:
+        base += repr(sorted(stock.items()))
+    return '"{}"'.format(hashlib.sha1(base.encode()).hexdigest())
+
+
+def etag_producto(producto_id, fecha_actualizacion, extra=''):
+    """ETag de la página de un solo producto: su fecha_actualizacion basta como versión"""
+    base = f'{PREFIJO}:producto:{producto_id}:{fecha_actualizacion.timestamp()}{extra}'
+    return '"{}"'.format(hashlib.sha1(base.encode()).hexdigest())
+
+
+def ultima_modificacion(version_actual=None):
+    """Última fecha_actualizacion del catálogo, calculada una vez por versión"""
+    # Con el catálogo vacío se guarda 0: None en el caché es una entrada ausente
+    return obtener(
+        'ultima_modificacion',
+        (),
+        lambda: Producto.objects.aggregate(ultima=Max('fecha_actualizacion'))['ultima'] or 0,
+        version_actual=version_actual,
+    ) or None
+
+
+def ids_stock(html):
+    """Ids de los productos con marca de stock en un fragmento"""
+    return {int(producto_id) for producto_id, _ in MARCA_STOCK.findall(html)}
+
+
+def stock_actual(producto_ids):
+    """{producto_id: (stock, stock_minimo, fecha_actualizacion)} leído de la base"""
+    if not producto_ids:
+        return {}
+    filas = Producto.objects.filter(id__in=producto_ids).values_list(
+        'id', 'stock', 'stock_minimo', 'fecha_actualizacion'
+    )
+    return {producto_id: resto for producto_id, *resto in filas}
+
+
+def rellenar_stock(html, stock):
+    """Reemplaza las marcas de stock del fragmento con el stock de stock_actual()"""
+    plantilla = get_template(PLANTILLA_STOCK)
+
+    def reemplazar(marca):
+        fila = stock.get(int(marca.group(1)))
+        if fila is None:
+            return ''
+        return plantilla.render({'parte': marca.group(2), 'stock': fila[0], 'stock_minimo': fila[1]}).strip()
+
+    return MARCA_STOCK.sub(reemplazar, html)
+
+
+def ultima_modificacion_stock(stock, version_actual=None):
+    """Última fecha_actualizacion entre el catálogo y los productos de stock_actual()"""
+    fechas = [fila[2] for fila in stock.values()]
+    ultima = ultima_modificacion(version_actual)
+    if ultima:
+        fechas.append(ultima)
+    return max(fechas, default=None)
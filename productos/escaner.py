@@ -0,0 +1,76 @@
+"""
+Caché de búsqueda por código de barras para los lectores del punto de venta.
+
+Guarda codigo_barras -> (id, nombre, precio_venta, stock, activo) en el alias
+de caché PRODUCTOS_CACHE_ALIAS. Con FileBasedCache (o cualquier backend
+compartido) todos los procesos ven las mismas entradas e invalidaciones.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Producto
+
+PREFIJO = 'escaner'
+# Los códigos inexistentes también se guardan, por menos tiempo
+TIEMPO_NEGATIVO = 60
+
+
+def _cache():
+    return caches[getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')]
+
+
+def _clave(codigo):
+    return f'{PREFIJO}:codigo:{codigo}'
+
+
+def _contar(contador):
+    cache = _cache()
+    clave = f'{PREFIJO}:{contador}'
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # add() no pisa el valor si otro proceso lo creó primero
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave)
+
+
+def buscar_codigo(codigo):
+    """Datos del producto con ese código, o None si no existe"""
+    cache = _cache()
+    datos = cache.get(_clave(codigo))
+    if datos is not None:
+        _contar('hits')
+        return datos or None
+
+    _contar('misses')
+    fila = (
+        Producto.objects
+        .filter(codigo_barras=codigo)
+        .values('id', 'nombre', 'precio_venta', 'stock', 'activo')
+        .first()
+    )
+    if fila is None:
+        cache.set(_clave(codigo), {}, timeout=TIEMPO_NEGATIVO)
+        return None
+    cache.set(_clave(codigo), fila)
+    return fila
+
+
+def invalidar(*codigos):
+    """Borra las entradas de los códigos indicados"""
+    codigos = [codigo for codigo in codigos if codigo]
+    if codigos:
+        _cache().delete_many([_clave(codigo) for codigo in codigos])
+
+
+def estadisticas():
+    """Contadores de aciertos y fallos acumulados"""
+    cache = _cache()
+    hits = cache.get(f'{PREFIJO}:hits', 0)
+    misses = cache.get(f'{PREFIJO}:misses', 0)
+    consultas = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'tasa_aciertos': round(hits / consultas, 4) if consultas else 0.0,
+    }
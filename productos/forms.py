@@ -2,7 +2,9 @@ from django import forms
 from django.contrib.auth.forms import AuthenticationForm
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from .models import Producto, Venta, DetalleVenta
+from .busqueda import obtener_backend
 
 
 class CustomLoginForm(AuthenticationForm):
@@ -79,4 +81,88 @@ class BusquedaProductoForm(forms.Form):
     
     def clean_buscar(self):
         buscar = self.cleaned_data.get('buscar', '')
-        return buscar.strip()
\ No newline at end of file
+        return buscar.strip()
+    
+    def filtrar(self, productos):
+        """Aplica el filtro de estado y la búsqueda (ordenada por relevancia)"""
+        buscar = self.cleaned_data.get('buscar')
+        activo = self.cleaned_data.get('activo')
+        
+        if activo == '1':
+            productos = productos.filter(activo=True)
+        elif activo == '0':
+            productos = productos.filter(activo=False)
+        
+        if buscar:
+            return obtener_backend().buscar(productos, buscar)
+        return productos.order_by('-activo', 'nombre')
+
+
+class ImportarProductosForm(forms.Form):
+    """Archivo CSV o XLSX para la importación masiva de productos"""
+    
+    archivo = forms.FileField(
+        label='Archivo',
+        help_text='CSV o XLSX con encabezados: codigo_barras, nombre, precio_compra, precio_venta, stock...'
+    )
+    
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith(('.csv', '.txt', '.xlsx')):
+            raise ValidationError('El archivo debe ser .csv o .xlsx')
+        return archivo
+
+
+class ExportarVentasForm(forms.Form):
+    """Filtros de la exportación de ventas"""
+    
+    desde = forms.DateField(required=True)
+    hasta = forms.DateField(required=False)
+    estado = forms.ChoiceField(
+        choices=[('', 'Todos')] + Venta.ESTADO_CHOICES,
+        required=False
+    )
+    formato = forms.ChoiceField(
+        choices=[('csv', 'CSV'), ('jsonl', 'JSONL')],
+        required=False
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('hasta'):
+            cleaned_data['hasta'] = timezone.localdate()
+        cleaned_data['formato'] = cleaned_data.get('formato') or 'csv'
+        desde = cleaned_data.get('desde')
+        if desde and desde > cleaned_data['hasta']:
+            raise ValidationError('La fecha inicial no puede ser posterior a la final')
+        return cleaned_data
+
+
+class AbrirTurnoForm(forms.Form):
+    """Apertura de un turno de caja"""
+    
+    caja = forms.CharField(
+        max_length=30,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Caja'})
+    )
+    fondo_inicial = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=0,
+        initial=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
+    )
+    
+    def clean_caja(self):
+        return self.cleaned_data['caja'].strip()
+
+
+class CerrarTurnoForm(forms.Form):
+    """Corte de caja: efectivo contado al cerrar el turno"""
+    
+    efectivo_contado = forms.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
+    )
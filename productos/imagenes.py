@@ -0,0 +1,121 @@
+"""
+Imágenes derivadas (miniaturas) de Producto.imagen.
+
+Por cada imagen original se generan versiones de 64, 200 y 600 px en WebP y
+JPEG, guardadas junto al original: productos/foto.jpg -> productos/foto.jpg_200px.webp.
+El nombre completo (con extensión) evita que foto.jpg y foto.png compartan derivadas.
+Las plantillas las sirven con srcset para no descargar la foto original.
+Producto.miniaturas indica si ya existen; mientras no (imagen recién subida
+antes de generar_miniaturas, o que Pillow no pudo abrir) fuentes() regresa
+la URL del original.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+TAMANOS = (64, 200, 600)
+FORMATOS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+CALIDAD = 80
+
+
+def ruta_derivada(nombre, tamano, extension):
+    return f'{nombre}_{tamano}px.{extension}'
+
+
+def rutas_derivadas(nombre):
+    return [
+        ruta_derivada(nombre, tamano, extension)
+        for tamano in TAMANOS
+        for extension in FORMATOS
+    ]
+
+
+def _guardar(ruta, contenido, storage):
+    # save() renombra si el archivo existe; se reemplaza el anterior
+    if storage.exists(ruta):
+        storage.delete(ruta)
+    storage.save(ruta, ContentFile(contenido))
+
+
+def generar_derivadas(nombre, storage=default_storage):
+    """
+    Genera todas las derivadas de la imagen guardada en `nombre`.
+    Regresa las rutas generadas; una lista vacía si el archivo no es una imagen.
+    """
+    try:
+        with storage.open(nombre, 'rb') as archivo:
+            original = Image.open(archivo)
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return []
+
+    original = ImageOps.exif_transpose(original)
+    if original.mode in ('RGBA', 'LA', 'P'):
+        # JPEG no tiene transparencia: se compone sobre fondo blanco
+        original = original.convert('RGBA')
+        fondo = Image.new('RGB', original.size, 'white')
+        fondo.paste(original, mask=original.getchannel('A'))
+        original = fondo
+    elif original.mode != 'RGB':
+        original = original.convert('RGB')
+
+    generadas = []
+    for tamano in TAMANOS:
+        miniatura = original.copy()
+        miniatura.thumbnail((tamano, tamano), Image.Resampling.LANCZOS)
+        for extension, formato in FORMATOS.items():
+            salida = BytesIO()
+            miniatura.save(salida, formato, quality=CALIDAD, optimize=True)
+            ruta = ruta_derivada(nombre, tamano, extension)
+            _guardar(ruta, salida.getvalue(), storage)
+            generadas.append(ruta)
+    return generadas
+
+
+def borrar_derivadas(nombre, storage=default_storage):
+    for ruta in rutas_derivadas(nombre):
+        if storage.exists(ruta):
+            storage.delete(ruta)
+
+
+def url_derivada(imagen, tamano, extension='jpg'):
+    return imagen.storage.url(ruta_derivada(imagen.name, tamano, extension))
+
+
+def srcset(imagen, extension='jpg'):
+    """Valor del atributo srcset con todas las derivadas de un formato"""
+    return ', '.join(
+        f'{url_derivada(imagen, tamano, extension)} {tamano}w'
+        for tamano in TAMANOS
+    )
+
+
+def fuentes(imagen, miniaturas, tamano=200):
+    """
+    src y srcset (WebP y JPEG) para un <picture>. Sin miniaturas los srcset
+    quedan vacíos y src es el original.
+    """
+    if not miniaturas:
+        return {'src': imagen.url, 'srcset_webp': '', 'srcset_jpg': ''}
+    return {
+        'src': url_derivada(imagen, tamano),
+        'srcset_webp': srcset(imagen, 'webp'),
+        'srcset_jpg': srcset(imagen, 'jpg'),
+    }
+
+
+def campos_json(imagen, miniaturas):
+    """Campos de imagen de las respuestas JSON del grid y del typeahead"""
+    if not imagen:
+        return {'imagen': None, 'imagen_srcset': None, 'imagen_srcset_jpg': None}
+    datos = fuentes(imagen, miniaturas)
+    return {
+        'imagen': datos['src'],
+        'imagen_srcset': datos['srcset_webp'] or None,
+        'imagen_srcset_jpg': datos['srcset_jpg'] or None,
+    }
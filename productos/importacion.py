@@ -0,0 +1,309 @@
+"""
+Importación masiva de productos desde CSV o XLSX.
+
+El archivo se lee fila por fila y se procesa en chunks: por cada chunk se
+traen los productos existentes por codigo_barras en una consulta, se compara
+la huella (sha1) de cada fila con la del producto guardado y sólo las filas
+nuevas o distintas se escriben con bulk_create/bulk_update. La memoria no
+depende del tamaño del archivo, sólo del tamaño del chunk.
+
+Las columnas reconocidas son las de COLUMNAS; sólo se actualizan las que
+vienen en el archivo. codigo_barras es obligatoria, y para productos nuevos
+también nombre, precio_compra y precio_venta. Cada fila se valida contra los
+límites de los campos del modelo (longitud, dígitos y decimales) antes de
+llegar a la base: un valor fuera de rango es un error de esa fila, no del chunk.
+"""
+import csv
+import hashlib
+import io
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import catalogo, escaner, inventario, typeahead
+from .busqueda import obtener_backend
+from .models import Producto
+
+TAMANO_CHUNK = 1000
+# Errores guardados en el reporte; el resto sólo se cuenta
+MAXIMO_ERRORES = 100
+
+COLUMNAS = (
+    'codigo_barras',
+    'nombre',
+    'descripcion',
+    'precio_compra',
+    'precio_venta',
+    'stock',
+    'stock_minimo',
+    'activo',
+)
+OBLIGATORIAS_ALTA = ('nombre', 'precio_compra', 'precio_venta')
+VERDADEROS = {'1', 'si', 'sí', 'true', 'verdadero', 'x', 's', 'y', 'yes'}
+FALSOS = {'0', 'no', 'false', 'falso', 'n', ''}
+LONGITUD_CODIGO = Producto._meta.get_field('codigo_barras').max_length
+LONGITUD_NOMBRE = Producto._meta.get_field('nombre').max_length
+# Mayor valor que aceptan los PositiveIntegerField en todas las bases
+MAXIMO_ENTERO = 2147483647
+
+
+class Reporte:
+    """Conteos de una importación"""
+
+    def __init__(self):
+        self.insertados = 0
+        self.actualizados = 0
+        self.sin_cambios = 0
+        self.num_errores = 0
+        self.errores = []
+
+    def error(self, linea, mensaje):
+        self.num_errores += 1
+        if len(self.errores) < MAXIMO_ERRORES:
+            self.errores.append(f'Línea {linea}: {mensaje}')
+
+    def __str__(self):
+        return (
+            f'{self.insertados} insertado(s), {self.actualizados} actualizado(s), '
+            f'{self.sin_cambios} sin cambios, {self.num_errores} error(es)'
+        )
+
+
+def _encabezados(fila):
+    return [str(columna or '').strip().lower() for columna in fila]
+
+
+def leer_csv(archivo):
+    """Itera (línea, {columna: texto}) de un archivo CSV binario o de texto"""
+    if isinstance(archivo.read(0), bytes):
+        archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = archivo.read(4096)
+    archivo.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+
+    lector = csv.reader(archivo, dialecto)
+    encabezados = _encabezados(next(lector, []))
+    for linea, fila in enumerate(lector, start=2):
+        if any(fila):
+            yield linea, dict(zip(encabezados, fila))
+
+
+def leer_xlsx(archivo):
+    """Itera (línea, {columna: valor}) de la primera hoja de un XLSX; requiere openpyxl"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError('Se necesita openpyxl para importar archivos XLSX (pip install openpyxl)')
+
+    # read_only recorre la hoja sin cargarla completa en memoria
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows()
+        encabezados = _encabezados(celda.value for celda in next(filas, ()))
+        for linea, celdas in enumerate(filas, start=2):
+            fila = {
+                columna: _codigo_celda(celda) if columna == 'codigo_barras' else celda.value
+                for columna, celda in zip(encabezados, celdas)
+            }
+            if any(valor not in (None, '') for valor in fila.values()):
+                yield linea, fila
+    finally:
+        libro.close()
+
+
+def _codigo_celda(celda):
+    """
+    Un código de barras capturado como número pierde los ceros a la
+    izquierda; si la celda tiene formato de ceros ('0000000000000'), se
+    rellenan hasta su longitud.
+    """
+    valor = celda.value
+    formato = getattr(celda, 'number_format', None) or ''
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool) and formato and set(formato) == {'0'}:
+        return str(int(valor)).zfill(len(formato))
+    return valor
+
+
+def leer(archivo, nombre):
+    """Elige el lector por la extensión del nombre de archivo"""
+    extension = os.path.splitext(nombre)[1].lower()
+    if extension == '.xlsx':
+        return leer_xlsx(archivo)
+    if extension in ('.csv', '.txt'):
+        return leer_csv(archivo)
+    raise ValueError(f'Formato no soportado: {extension or nombre} (usa .csv o .xlsx)')
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        # Excel guarda los códigos numéricos como float
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _decimal(valor, campo):
+    """Valida contra max_digits y decimal_places del campo del modelo"""
+    modelo = Producto._meta.get_field(campo)
+    try:
+        numero = Decimal(_texto(valor).replace('$', '').replace(',', ''))
+    except InvalidOperation:
+        raise ValueError(f'{campo} inválido: {valor!r}')
+    if not numero.is_finite():
+        raise ValueError(f'{campo} inválido: {valor!r}')
+    if numero < 0:
+        raise ValueError(f'{campo} no puede ser negativo')
+    if numero.adjusted() >= modelo.max_digits - modelo.decimal_places:
+        raise ValueError(f'{campo} excede {modelo.max_digits} dígitos')
+    redondeado = numero.quantize(Decimal(1).scaleb(-modelo.decimal_places))
+    if redondeado != numero:
+        raise ValueError(f'{campo} admite a lo más {modelo.decimal_places} decimales')
+    return redondeado
+
+
+def _entero(valor, campo):
+    try:
+        numero = int(Decimal(_texto(valor) or '0'))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f'{campo} inválido: {valor!r}')
+    if numero < 0:
+        raise ValueError(f'{campo} no puede ser negativo')
+    if numero > MAXIMO_ENTERO:
+        raise ValueError(f'{campo} excede {MAXIMO_ENTERO}')
+    return numero
+
+
+def _booleano(valor, campo):
+    texto = _texto(valor).lower()
+    if texto in VERDADEROS:
+        return True
+    if texto in FALSOS:
+        return False
+    raise ValueError(f'{campo} inválido: {valor!r}')
+
+
+CONVERTIDORES = {
+    'nombre': lambda valor, campo: _texto(valor),
+    'descripcion': lambda valor, campo: _texto(valor) or None,
+    'precio_compra': _decimal,
+    'precio_venta': _decimal,
+    'stock': _entero,
+    'stock_minimo': _entero,
+    'activo': _booleano,
+}
+
+
+def convertir(fila):
+    """Regresa (codigo_barras, {campo: valor}) con los campos presentes en la fila"""
+    codigo = _texto(fila.get('codigo_barras'))
+    if not codigo:
+        raise ValueError('codigo_barras vacío')
+    if len(codigo) > LONGITUD_CODIGO:
+        raise ValueError(f'codigo_barras excede {LONGITUD_CODIGO} caracteres')
+
+    valores = {}
+    for campo, convertidor in CONVERTIDORES.items():
+        if campo in fila:
+            valores[campo] = convertidor(fila[campo], campo)
+    if 'nombre' in valores and not valores['nombre']:
+        raise ValueError('nombre vacío')
+    if len(valores.get('nombre', '')) > LONGITUD_NOMBRE:
+        raise ValueError(f'nombre excede {LONGITUD_NOMBRE} caracteres')
+    return codigo, valores
+
+
+def huella(valores):
+    """sha1 de los valores en un orden fijo de campos"""
+    texto = '\x1f'.join(f'{campo}={valores[campo]}' for campo in sorted(valores))
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+
+def importar(filas, tamano_chunk=TAMANO_CHUNK, usuario=None):
+    """
+    Inserta o actualiza productos a partir de (línea, fila) iterables.
+    Cada chunk se aplica en su propia transacción. Regresa un Reporte.
+    """
+    reporte = Reporte()
+    chunk = {}
+    for linea, fila in filas:
+        try:
+            codigo, valores = convertir(fila)
+        except ValueError as e:
+            reporte.error(linea, e)
+            continue
+        # Un código repetido en el mismo chunk: gana la última fila
+        chunk[codigo] = (linea, valores)
+        if len(chunk) >= tamano_chunk:
+            _aplicar_chunk(chunk, reporte, usuario)
+            chunk = {}
+    if chunk:
+        _aplicar_chunk(chunk, reporte, usuario)
+    return reporte
+
+
+def _aplicar_chunk(chunk, reporte, usuario):
+    with transaction.atomic():
+        # Bloqueados hasta el commit: una venta o edición concurrente no puede
+        # cambiar el stock entre la comparación y el bulk_update
+        existentes = Producto.objects.select_for_update().in_bulk(list(chunk), field_name='codigo_barras')
+
+        nuevos = []
+        cambiados = []
+        campos = set()
+        ajustes = {}
+        for codigo, (linea, valores) in chunk.items():
+            producto = existentes.get(codigo)
+            if producto is None:
+                faltantes = [campo for campo in OBLIGATORIAS_ALTA if campo not in valores]
+                if faltantes:
+                    reporte.error(linea, f'producto nuevo sin {", ".join(faltantes)}')
+                    continue
+                nuevos.append(Producto(codigo_barras=codigo, **valores))
+                continue
+
+            actuales = {campo: getattr(producto, campo) for campo in valores}
+            if huella(actuales) == huella(valores):
+                reporte.sin_cambios += 1
+                continue
+
+            if valores.get('stock', producto.stock) != producto.stock:
+                ajustes[producto.pk] = valores['stock'] - producto.stock
+            for campo, valor in valores.items():
+                if actuales[campo] != valor:
+                    setattr(producto, campo, valor)
+                    campos.add(campo)
+            cambiados.append(producto)
+
+        ahora = timezone.now()
+        if nuevos:
+            Producto.objects.bulk_create(nuevos)
+            inventario.registrar(
+                'entrada',
+                {producto.pk: producto.stock for producto in nuevos},
+                usuario=usuario,
+                nota='Importación',
+            )
+        if cambiados:
+            # bulk_update no aplica auto_now
+            for producto in cambiados:
+                producto.fecha_actualizacion = ahora
+            Producto.objects.bulk_update(cambiados, sorted(campos) + ['fecha_actualizacion'])
+            inventario.registrar('ajuste', ajustes, usuario=usuario, nota='Importación')
+
+        # bulk_create/bulk_update no disparan señales: índice y caché a mano
+        escritos = nuevos + cambiados
+        if escritos:
+            obtener_backend().indexar(escritos)
+            codigos = [producto.codigo_barras for producto in escritos]
+            transaction.on_commit(lambda: escaner.invalidar(*codigos))
+            typeahead.invalidar()
+            catalogo.invalidar()
+
+    reporte.insertados += len(nuevos)
+    reporte.actualizados += len(cambiados)
@@ -0,0 +1,246 @@
+"""
+Bitácora de inventario.
+
+Cada cambio de stock (venta, devolución, ajuste o entrada) se registra como
+un MovimientoInventario de sólo inserción. Producto.stock es el valor
+materializado que usa el punto de venta; el stock según la bitácora es el
+último SnapshotInventario del producto más los movimientos posteriores.
+compactar() escribe snapshots nuevos para que ese cálculo sólo sume los
+movimientos recientes, y reporta los productos cuyo stock no coincide.
+
+Quien inserta movimientos actualiza antes, en la misma transacción, la fila
+del producto: así compactar() puede bloquear los productos con
+select_for_update() y saber que no queda ningún movimiento suyo sin confirmar
+por debajo del corte.
+"""
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import escaner
+from .models import DetalleVenta, MovimientoInventario, Producto, SnapshotInventario
+
+
+def descontar_stock(cantidades):
+    """
+    Descuenta stock con un solo UPDATE condicional:
+    SET stock = stock - n WHERE id = x AND stock >= n.
+    Regresa el número de productos actualizados. El catálogo en caché no
+    guarda el stock (ver catalogo.py): no hay que invalidarlo.
+    """
+    condicion = Q()
+    casos = []
+    for producto_id, cantidad in cantidades.items():
+        condicion |= Q(id=producto_id, stock__gte=cantidad)
+        casos.append(When(id=producto_id, then=F('stock') - cantidad))
+
+    return Producto.objects.filter(condicion).update(
+        stock=Case(*casos, default=F('stock'), output_field=models.PositiveIntegerField()),
+        fecha_actualizacion=timezone.now(),
+    )
+
+
+def incrementar_stock(cantidades):
+    """SET stock = stock + n para cada producto, en un solo UPDATE"""
+    casos = [When(id=producto_id, then=F('stock') + cantidad) for producto_id, cantidad in cantidades.items()]
+    return Producto.objects.filter(id__in=cantidades).update(
+        stock=Case(*casos, default=F('stock'), output_field=models.PositiveIntegerField()),
+        fecha_actualizacion=timezone.now(),
+    )
+
+
+def registrar(tipo, cantidades, venta_id=None, usuario=None, nota=''):
+    """
+    Inserta un movimiento por producto. `cantidades` es {producto_id: delta}
+    con signo (negativo para salidas).
+    """
+    return MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(
+            producto_id=producto_id,
+            tipo=tipo,
+            cantidad=cantidad,
+            venta_id=venta_id,
+            usuario=usuario,
+            nota=nota,
+        )
+        for producto_id, cantidad in cantidades.items()
+        if cantidad
+    ])
+
+
+def _detalles(venta_ids):
+    """[(venta_id, producto_id, unidades)] de las ventas indicadas"""
+    return list(
+        DetalleVenta.objects
+        .filter(venta_id__in=venta_ids)
+        .values('venta_id', 'producto_id')
+        .annotate(unidades=Sum('cantidad'))
+        .values_list('venta_id', 'producto_id', 'unidades')
+        .order_by()
+    )
+
+
+def _totales(detalles):
+    totales = defaultdict(int)
+    for _, producto_id, unidades in detalles:
+        totales[producto_id] += unidades
+    return totales
+
+
+def _movimientos_ventas(detalles, tipo, signo):
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(producto_id=producto_id, tipo=tipo, cantidad=signo * unidades, venta_id=venta_id)
+        for venta_id, producto_id, unidades in detalles
+    ])
+
+
+def _invalidar_escaner(producto_ids):
+    # El stock cambió sin pasar por save(): invalidar la caché del lector
+    codigos = list(Producto.objects.filter(id__in=producto_ids).values_list('codigo_barras', flat=True))
+    transaction.on_commit(lambda: escaner.invalidar(*codigos))
+
+
+def descontar_ventas(venta_ids):
+    """
+    Saca del inventario las unidades de ventas que pasan a completada.
+    Lanza ValueError si algún producto no tiene stock suficiente; debe
+    llamarse dentro de una transacción para que no quede nada a medias.
+    """
+    detalles = _detalles(venta_ids)
+    totales = _totales(detalles)
+    if totales and descontar_stock(totales) != len(totales):
+        raise ValueError('Stock insuficiente para completar la(s) venta(s)')
+    if totales:
+        _movimientos_ventas(detalles, 'venta', -1)
+        _invalidar_escaner(totales)
+    return totales
+
+
+def devolver_ventas(venta_ids):
+    """Regresa al inventario las unidades de ventas completadas que se cancelan"""
+    detalles = _detalles(venta_ids)
+    totales = _totales(detalles)
+    if totales:
+        incrementar_stock(totales)
+        _movimientos_ventas(detalles, 'devolucion', 1)
+        _invalidar_escaner(totales)
+    return totales
+
+
+def unidades_venta(venta_id):
+    """{producto_id: unidades} de una venta"""
+    return dict(_totales(_detalles([venta_id])))
+
+
+def ajustar_venta(venta_id, antes, despues):
+    """
+    Registra sólo la diferencia entre dos versiones de una venta completada
+    (`antes` y `despues` como los regresa unidades_venta()): una salida por
+    cada producto que aumentó y una devolución por cada uno que disminuyó.
+    Lanza ValueError si no hay stock para las salidas.
+    """
+    salidas, entradas = {}, {}
+    for producto_id in antes.keys() | despues.keys():
+        delta = despues.get(producto_id, 0) - antes.get(producto_id, 0)
+        if delta > 0:
+            salidas[producto_id] = delta
+        elif delta < 0:
+            entradas[producto_id] = -delta
+    if salidas and descontar_stock(salidas) != len(salidas):
+        raise ValueError('Stock insuficiente para completar la(s) venta(s)')
+    if entradas:
+        incrementar_stock(entradas)
+    registrar('venta', {producto_id: -n for producto_id, n in salidas.items()}, venta_id=venta_id)
+    registrar('devolucion', entradas, venta_id=venta_id)
+    if salidas or entradas:
+        _invalidar_escaner(salidas.keys() | entradas.keys())
+    return salidas, entradas
+
+
+def stock_calculado(productos=None, hasta=None):
+    """
+    Anota `stock_calculado` = stock del último snapshot + movimientos
+    posteriores (hasta el movimiento `hasta`, si se indica).
+    """
+    if productos is None:
+        productos = Producto.objects.all()
+    snapshot = SnapshotInventario.objects.filter(producto=OuterRef('pk')).order_by('-ultimo_movimiento_id')
+    movimientos = MovimientoInventario.objects.filter(
+        producto=OuterRef('pk'),
+        id__gt=OuterRef('_corte'),
+    )
+    if hasta is not None:
+        movimientos = movimientos.filter(id__lte=hasta)
+    delta = movimientos.values('producto').annotate(suma=Sum('cantidad')).values('suma')
+
+    return productos.annotate(
+        _corte=Coalesce(Subquery(snapshot.values('ultimo_movimiento_id')[:1]), Value(0)),
+        _stock_base=Coalesce(Subquery(snapshot.values('stock')[:1]), Value(0)),
+    ).annotate(
+        stock_calculado=F('_stock_base') + Coalesce(Subquery(delta), Value(0)),
+    )
+
+
+def compactar(reparar=False, tamano_lote=500):
+    """
+    Escribe un snapshot por producto con el stock hasta su último movimiento.
+    Trabaja por lotes de productos: cada lote bloquea sus filas de Producto
+    con select_for_update() antes de tomar el corte, de modo que ningún
+    movimiento por confirmar queda debajo de él. De los snapshots anteriores
+    sólo se conserva el vigente, que otras consultas pueden estar leyendo;
+    los movimientos nunca se borran.
+    Regresa (snapshots escritos, [(producto_id, stock, stock_calculado)] desfasados);
+    con reparar=True además corrige Producto.stock de los desfasados.
+    """
+    ids = list(Producto.objects.order_by('id').values_list('id', flat=True))
+    escritos = 0
+    desfasados = []
+    for inicio in range(0, len(ids), tamano_lote):
+        lote = ids[inicio:inicio + tamano_lote]
+        with transaction.atomic():
+            escritos_lote, desfasados_lote = _compactar_lote(lote, reparar)
+        escritos += escritos_lote
+        desfasados.extend(desfasados_lote)
+    return escritos, desfasados
+
+
+def _compactar_lote(producto_ids, reparar):
+    productos = Producto.objects.select_for_update().filter(id__in=producto_ids).order_by('id')
+    bloqueados = list(productos.values_list('id', flat=True))
+    ultimo = (
+        MovimientoInventario.objects.filter(producto_id__in=bloqueados)
+        .aggregate(ultimo=Max('id'))['ultimo'] or 0
+    )
+    vigente = SnapshotInventario.objects.filter(producto=OuterRef('pk')).order_by('-ultimo_movimiento_id')
+    filas = list(
+        stock_calculado(Producto.objects.filter(id__in=bloqueados), hasta=ultimo)
+        .annotate(_snapshot=Subquery(vigente.values('id')[:1]))
+        .values_list('id', 'stock', 'stock_calculado', '_snapshot')
+    )
+
+    # Los anteriores al vigente ya no los elige ninguna consulta
+    SnapshotInventario.objects.filter(producto_id__in=bloqueados).exclude(
+        id__in=[snapshot_id for *_, snapshot_id in filas if snapshot_id is not None]
+    ).delete()
+    SnapshotInventario.objects.bulk_create(
+        [
+            SnapshotInventario(producto_id=producto_id, stock=calculado, ultimo_movimiento_id=ultimo)
+            for producto_id, _, calculado, _ in filas
+        ],
+        batch_size=1000,
+    )
+
+    desfasados = [(producto_id, stock, calculado) for producto_id, stock, calculado, _ in filas if stock != calculado]
+    if reparar and desfasados:
+        Producto.objects.filter(id__in=[fila[0] for fila in desfasados]).update(
+            stock=Case(
+                *[When(id=producto_id, then=Value(max(calculado, 0))) for producto_id, _, calculado in desfasados],
+                default=F('stock'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            fecha_actualizacion=timezone.now(),
+        )
+    return len(filas), desfasados
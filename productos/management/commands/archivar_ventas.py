@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from productos import archivo
+from productos.routers import alias_archivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve las ventas completadas o canceladas más antiguas que el horizonte '
+        'a las tablas de archivo (con una base aparte, correr antes migrate --database archivo)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=archivo.DIAS_HORIZONTE,
+            help=f'Archivar ventas con más de estos días (default: {archivo.DIAS_HORIZONTE})'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=archivo.TAMANO_LOTE,
+            help=f'Ventas por transacción (default: {archivo.TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            help='Máximo de ventas a archivar en esta ejecución'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Sólo contar las ventas que se archivarían'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1 or options['lote'] < 1:
+            raise CommandError('--dias y --lote deben ser mayores que cero')
+
+        if options['dry_run']:
+            antes_de = timezone.now() - timedelta(days=options['dias'])
+            pendientes = archivo.por_archivar(antes_de).count()
+            self.stdout.write(f'{pendientes} venta(s) por archivar (base de archivo: {alias_archivo()})')
+            return
+
+        self.stdout.write(f'Archivando ventas con más de {options["dias"]} días en "{alias_archivo()}"...')
+        total = archivo.archivar(options['dias'], options['lote'], options['limite'])
+        self.stdout.write(self.style.SUCCESS(f'{total} venta(s) archivada(s)'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from productos import auditoria
+
+
+class Command(BaseCommand):
+    help = 'Revisa con EXPLAIN los planes de las consultas más usadas y marca recorridos completos y ordenamientos temporales'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--consulta',
+            action='append',
+            choices=sorted(auditoria.CONSULTAS),
+            help='Auditar sólo esta consulta (se puede repetir)'
+        )
+        parser.add_argument(
+            '--planes',
+            action='store_true',
+            help='Mostrar el plan completo de cada consulta'
+        )
+        parser.add_argument(
+            '--estricto',
+            action='store_true',
+            help='Terminar con error si hay hallazgos (para CI)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Auditando consultas en {connection.vendor}...')
+        
+        total = 0
+        for nombre, plan, hallazgos in auditoria.auditar(options['consulta']):
+            if hallazgos:
+                self.stdout.write(self.style.WARNING(f'{nombre}:'))
+                for hallazgo in hallazgos:
+                    self.stdout.write(self.style.WARNING(f'  {hallazgo.problema}: {hallazgo.linea}'))
+            else:
+                self.stdout.write(f'{nombre}: OK')
+            if options['planes']:
+                for linea in plan.splitlines():
+                    self.stdout.write(f'    {linea}')
+            total += len(hallazgos)
+        
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Todas las consultas usan índices'))
+        elif options['estricto']:
+            raise CommandError(f'{total} hallazgo(s) en los planes de consulta')
+        else:
+            self.stdout.write(self.style.WARNING(f'{total} hallazgo(s) en los planes de consulta'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from productos import inventario
+
+
+class Command(BaseCommand):
+    help = 'Escribe snapshots de inventario y verifica Producto.stock contra la bitácora'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar',
+            action='store_true',
+            help='Corrige el stock de los productos desfasados con el valor de la bitácora'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Compactando bitácora de inventario...')
+        
+        escritos, desfasados = inventario.compactar(reparar=options['reparar'])
+        for producto_id, stock, calculado in desfasados:
+            self.stdout.write(self.style.WARNING(
+                f'Producto #{producto_id}: stock {stock}, bitácora {calculado}'
+            ))
+        
+        self.stdout.write(self.style.SUCCESS(f'{escritos} snapshot(s) escrito(s)'))
+        if not desfasados:
+            self.stdout.write(self.style.SUCCESS('El stock coincide con la bitácora'))
+        elif options['reparar']:
+            self.stdout.write(self.style.SUCCESS(f'{len(desfasados)} producto(s) reparado(s)'))
+        else:
+            self.stdout.write(f'{len(desfasados)} producto(s) desfasado(s). Usa --reparar para corregirlos')
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from productos import turnos
+from productos.models import TurnoCaja
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los totales acumulados de los turnos de caja con la suma '
+        'completa de sus ventas (activas y archivadas)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=7,
+            help='Turnos abiertos en los últimos N días (default: 7)'
+        )
+        parser.add_argument(
+            '--turno',
+            type=int,
+            action='append',
+            help='Conciliar sólo este turno (se puede repetir)'
+        )
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Reemplaza los totales acumulados por los calculados'
+        )
+
+    def handle(self, *args, **options):
+        if options['turno']:
+            seleccion = TurnoCaja.objects.filter(id__in=options['turno'])
+        else:
+            if options['dias'] < 1:
+                raise CommandError('--dias debe ser mayor que cero')
+            seleccion = TurnoCaja.objects.filter(abierto__gte=timezone.now() - timedelta(days=options['dias']))
+
+        diferencias = turnos.conciliar(seleccion.order_by('id'), corregir=options['corregir'])
+        for turno, campos in diferencias:
+            for campo, (guardado, calculado) in campos.items():
+                self.stdout.write(self.style.WARNING(
+                    f'Turno #{turno.id} ({turno.caja}): {campo} {guardado} en el turno, {calculado} en las ventas'
+                ))
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('Todos los turnos coinciden con sus ventas'))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} turno(s) corregido(s)'))
+        else:
+            self.stdout.write(f'{len(diferencias)} turno(s) con diferencias. Usa --corregir para repararlos')
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantenimiento de la base de datos: ANALYZE y PRAGMA optimize en SQLite, '
+        'VACUUM ANALYZE en PostgreSQL. Programar con cron o usar --cada'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Alias de la base de datos'
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='En SQLite también ejecuta VACUUM (bloquea la base mientras corre)'
+        )
+        parser.add_argument(
+            '--cada',
+            type=int,
+            default=0,
+            help='Repetir cada N minutos en lugar de ejecutar una sola vez'
+        )
+
+    def handle(self, *args, **options):
+        if options['database'] not in connections:
+            raise CommandError(f"Base de datos desconocida: {options['database']}")
+        
+        while True:
+            self.mantenimiento(connections[options['database']], options['vacuum'])
+            if not options['cada']:
+                break
+            time.sleep(options['cada'] * 60)
+
+    def mantenimiento(self, connection, vacuum):
+        if connection.vendor == 'sqlite':
+            sentencias = ['ANALYZE', 'PRAGMA optimize']
+            if vacuum:
+                sentencias.append('VACUUM')
+            # Regresa el WAL al archivo principal y lo trunca
+            sentencias.append('PRAGMA wal_checkpoint(TRUNCATE)')
+        elif connection.vendor == 'postgresql':
+            sentencias = ['VACUUM (ANALYZE)']
+        else:
+            sentencias = ['ANALYZE']
+        
+        for sentencia in sentencias:
+            inicio = time.monotonic()
+            with connection.cursor() as cursor:
+                cursor.execute(sentencia)
+            duracion = time.monotonic() - inicio
+            self.stdout.write(self.style.SUCCESS(f'{sentencia}: {duracion:.2f}s'))
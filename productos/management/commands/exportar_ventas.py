@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from productos import exportacion
+from productos.replica import en_replica
+from productos.models import Venta
+
+
+class Command(BaseCommand):
+    help = 'Exporta los detalles de venta de un rango de fechas en CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD), por defecto hoy')
+        parser.add_argument(
+            '--estado',
+            choices=[clave for clave, _ in Venta.ESTADO_CHOICES],
+            help='Sólo ventas con este estado'
+        )
+        parser.add_argument('--formato', choices=exportacion.FORMATOS, default='csv')
+        parser.add_argument('--salida', help='Archivo de salida, por defecto la salida estándar')
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde'])
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+        
+        lineas = en_replica(exportacion.exportar(options['formato'], desde, hasta, options['estado']))
+        if not options['salida']:
+            for linea in lineas:
+                self.stdout.write(linea, ending='')
+            return
+        
+        escritas = 0
+        with open(options['salida'], 'w', encoding='utf-8', newline='') as archivo:
+            for linea in lineas:
+                archivo.write(linea)
+                escritas += 1
+        if options['formato'] == 'csv':
+            escritas -= 1
+        self.stdout.write(self.style.SUCCESS(f"{escritas} detalle(s) exportado(s) a {options['salida']}"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from productos import catalogo, typeahead
+from productos.imagenes import TAMANOS, generar_derivadas, ruta_derivada
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas de las imágenes de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--faltantes',
+            action='store_true',
+            help='Sólo productos cuyas miniaturas no existen'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Generando miniaturas...')
+        
+        productos = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True).only('id', 'imagen', 'miniaturas')
+        generadas = 0
+        omitidas = 0
+        cambiados = 0
+        for producto in productos.iterator(chunk_size=500):
+            imagen = producto.imagen
+            if options['faltantes'] and imagen.storage.exists(ruta_derivada(imagen.name, TAMANOS[-1], 'jpg')):
+                omitidas += 1
+                if not producto.miniaturas:
+                    Producto.objects.filter(id=producto.id).update(miniaturas=True)
+                    cambiados += 1
+                continue
+            miniaturas = bool(generar_derivadas(imagen.name, imagen.storage))
+            if miniaturas:
+                generadas += 1
+            else:
+                self.stdout.write(self.style.WARNING(f'Producto {producto.id}: imagen no válida ({imagen.name})'))
+            if miniaturas != producto.miniaturas:
+                Producto.objects.filter(id=producto.id).update(miniaturas=miniaturas)
+                cambiados += 1
+        
+        if cambiados:
+            # Las páginas en caché todavía apuntan a la imagen anterior
+            catalogo.invalidar()
+            typeahead.invalidar()
+        self.stdout.write(self.style.SUCCESS(f'{generadas} imagen(es) procesada(s), {omitidas} omitida(s)'))
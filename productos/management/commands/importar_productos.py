@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from productos import importacion
+
+
+class Command(BaseCommand):
+    help = 'Importa o actualiza productos desde un archivo CSV o XLSX (por codigo_barras)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument(
+            '--chunk',
+            type=int,
+            default=importacion.TAMANO_CHUNK,
+            help='Filas por transacción'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk'] < 1:
+            raise CommandError('--chunk debe ser mayor que cero')
+        
+        self.stdout.write(f"Importando {options['archivo']}...")
+        
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                filas = importacion.leer(archivo, options['archivo'])
+                reporte = importacion.importar(filas, options['chunk'])
+        except FileNotFoundError:
+            raise CommandError(f"No existe el archivo {options['archivo']}")
+        except (ImportError, ValueError) as e:
+            raise CommandError(str(e))
+        
+        for error in reporte.errores:
+            self.stdout.write(self.style.WARNING(error))
+        if reporte.num_errores > len(reporte.errores):
+            self.stdout.write(self.style.WARNING(
+                f'... y {reporte.num_errores - len(reporte.errores)} error(es) más'
+            ))
+        
+        self.stdout.write(self.style.SUCCESS(str(reporte)))
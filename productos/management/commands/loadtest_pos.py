@@ -0,0 +1,373 @@
+import http.cookiejar
+import json
+import logging
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from productos import importacion, inventario
+from productos.models import DetalleVenta, Producto
+
+PREFIJO_CODIGO = 'CARGA'
+USUARIO = 'cajero_carga'
+CONTRASENA = 'carga-pos-123'
+# Fracción de los productos que reciben la mitad de las ventas
+FRACCION_CALIENTES = 0.05
+# Segundos que un cajero espera a que los demás inicien sesión
+ESPERA_INICIO = 60
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not valores:
+        return None
+    indice = max(math.ceil(p / 100 * len(valores)) - 1, 0)
+    return valores[indice]
+
+
+class ClienteLocal:
+    """Cajero que llama a las vistas en el mismo proceso con el cliente de pruebas"""
+
+    def __init__(self):
+        self.cliente = Client(HTTP_HOST='localhost')
+
+    def login(self):
+        response = self.cliente.post(reverse('productos:login'), {
+            'username': USUARIO,
+            'password': CONTRASENA,
+        })
+        return response.status_code == 302
+
+    def vender(self, carrito):
+        response = self.cliente.post(
+            reverse('productos:procesar_venta'),
+            json.dumps(carrito),
+            content_type='application/json',
+        )
+        return response.status_code, response.json()
+
+    def cerrar(self):
+        # Cada hilo abre su propia conexión a la base de datos
+        connections.close_all()
+
+
+class ClienteHTTP:
+    """Cajero que habla con un servidor en marcha (--base-url) con cookies y CSRF"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def _csrf(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def _abrir(self, ruta, datos=None, encabezados=None):
+        peticion = urllib.request.Request(
+            self.base_url + ruta,
+            data=datos,
+            headers={'Referer': self.base_url + ruta, **(encabezados or {})},
+        )
+        try:
+            with self.opener.open(peticion, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self):
+        ruta = reverse('productos:login')
+        self._abrir(ruta)
+        datos = urllib.parse.urlencode({
+            'username': USUARIO,
+            'password': CONTRASENA,
+            'csrfmiddlewaretoken': self._csrf(),
+        }).encode()
+        self._abrir(ruta, datos)
+        return any(cookie.name == 'sessionid' for cookie in self.cookies)
+
+    def vender(self, carrito):
+        status, cuerpo = self._abrir(
+            reverse('productos:procesar_venta'),
+            json.dumps(carrito).encode(),
+            {'Content-Type': 'application/json', 'X-CSRFToken': self._csrf()},
+        )
+        try:
+            return status, json.loads(cuerpo)
+        except ValueError:
+            return status, {'error': cuerpo[:200].decode(errors='replace')}
+
+    def cerrar(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga del cobro del punto de venta: varios cajeros concurrentes '
+        'enviando ventas. Escribe productos y ventas en la base configurada; '
+        'úsese con una base de pruebas (POS_DB_PATH)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cajeros', type=int, default=20, help='Hilos concurrentes')
+        parser.add_argument('--duracion', type=float, default=30, help='Segundos de prueba')
+        parser.add_argument(
+            '--tasa',
+            type=float,
+            default=0,
+            help='Ventas por segundo entre todos los cajeros (0 = sin límite)'
+        )
+        parser.add_argument('--productos', type=int, default=200, help='Productos del catálogo de prueba')
+        parser.add_argument('--stock', type=int, default=1000, help='Stock inicial de cada producto')
+        parser.add_argument('--max-items', type=int, default=5, help='Productos distintos por carrito')
+        parser.add_argument('--base-url', help='Servidor en marcha (p. ej. http://localhost:8000); por defecto en proceso')
+        parser.add_argument('--salida', help='Archivo JSON de resultados')
+        parser.add_argument('--semilla', type=int, help='Semilla aleatoria para repetir la prueba')
+
+    def handle(self, *args, **options):
+        if options['cajeros'] < 1 or options['productos'] < 1 or options['max_items'] < 1:
+            raise CommandError('--cajeros, --productos y --max-items deben ser mayores que cero')
+
+        self.stdout.write(f"Preparando catálogo de {options['productos']} producto(s)...")
+        productos = self.preparar_catalogo(options['productos'], options['stock'])
+        self.preparar_usuario()
+        stock_inicial = dict(Producto.objects.filter(id__in=productos).values_list('id', 'stock'))
+
+        self.stdout.write(
+            f"{options['cajeros']} cajero(s) durante {options['duracion']} s"
+            + (f" contra {options['base_url']}" if options['base_url'] else ' (en proceso)')
+        )
+        resultados = []
+        # El reloj arranca cuando todos los cajeros iniciaron sesión
+        inicio = {}
+        barrera = threading.Barrier(
+            options['cajeros'],
+            action=lambda: inicio.setdefault('tiempo', time.perf_counter()),
+        )
+        hilos = [
+            threading.Thread(
+                target=self.cajero,
+                args=(numero, productos, options, barrera, inicio, resultados),
+            )
+            for numero in range(options['cajeros'])
+        ]
+        # Los 400 por stock agotado son esperados: no llenar la consola con ellos
+        registro = logging.getLogger('django.request')
+        nivel = registro.level
+        registro.setLevel(logging.ERROR)
+        try:
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        finally:
+            registro.setLevel(nivel)
+        if 'tiempo' not in inicio:
+            errores = sorted({r['error'] for r in resultados if r.get('error')})
+            raise CommandError(f"Los cajeros no pudieron iniciar sesión: {'; '.join(errores)}")
+        transcurrido = time.perf_counter() - inicio['tiempo']
+
+        reporte = self.reporte(resultados, transcurrido, options)
+        reporte['consistencia'] = self.verificar_stock(stock_inicial, resultados)
+        self.mostrar(reporte)
+
+        salida = options['salida'] or f"loadtest_pos-{timezone.localtime():%Y%m%d-%H%M%S}.json"
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {salida}'))
+
+    def preparar_catalogo(self, cantidad, stock):
+        """Crea o restablece los productos CARGA00000001... con el stock indicado"""
+        filas = (
+            (numero, {
+                'codigo_barras': f'{PREFIJO_CODIGO}{numero:08d}',
+                'nombre': f'Producto de carga {numero}',
+                'precio_compra': '10.00',
+                'precio_venta': '15.00',
+                'stock': stock,
+                'activo': '1',
+            })
+            for numero in range(1, cantidad + 1)
+        )
+        importacion.importar(filas)
+        return list(
+            Producto.objects
+            .filter(codigo_barras__startswith=PREFIJO_CODIGO)
+            .order_by('codigo_barras')
+            .values_list('id', flat=True)[:cantidad]
+        )
+
+    def preparar_usuario(self):
+        usuario, _ = User.objects.get_or_create(username=USUARIO)
+        usuario.set_password(CONTRASENA)
+        usuario.is_active = True
+        usuario.save()
+
+    def cajero(self, numero, productos, options, barrera, inicio, resultados):
+        aleatorio = random.Random(None if options['semilla'] is None else options['semilla'] + numero)
+        cliente = ClienteHTTP(options['base_url']) if options['base_url'] else ClienteLocal()
+        calientes = productos[:max(1, int(len(productos) * FRACCION_CALIENTES))]
+        intervalo = options['cajeros'] / options['tasa'] if options['tasa'] > 0 else 0
+        propios = []
+
+        try:
+            try:
+                sesion = cliente.login()
+            except Exception as e:
+                # Sin esto los demás cajeros esperarían en la barrera para siempre
+                barrera.abort()
+                propios.append({'resultado': 'login', 'latencia': 0, 'error': str(e)})
+                return
+            try:
+                barrera.wait(ESPERA_INICIO)
+            except threading.BrokenBarrierError:
+                propios.append({'resultado': 'login', 'latencia': 0, 'error': 'otro cajero no pudo iniciar'})
+                return
+            if not sesion:
+                propios.append({'resultado': 'login', 'latencia': 0})
+                return
+
+            siguiente = time.perf_counter()
+            while time.perf_counter() - inicio['tiempo'] < options['duracion']:
+                carrito = self.carrito(aleatorio, productos, calientes, options['max_items'])
+                comienzo = time.perf_counter()
+                try:
+                    status, datos = cliente.vender(carrito)
+                except Exception as e:
+                    status, datos = None, {'error': str(e)}
+                latencia = time.perf_counter() - comienzo
+                propios.append({
+                    'resultado': self.clasificar(status, datos),
+                    'latencia': latencia,
+                    'venta_id': datos.get('venta_id'),
+                    'status': status,
+                })
+
+                if intervalo:
+                    siguiente += intervalo
+                    espera = siguiente - time.perf_counter()
+                    if espera > 0:
+                        time.sleep(espera)
+        finally:
+            cliente.cerrar()
+            resultados.extend(propios)
+
+    def carrito(self, aleatorio, productos, calientes, max_items):
+        elegidos = set()
+        for _ in range(aleatorio.randint(1, max_items)):
+            # La mitad de las líneas van a los productos más vendidos
+            origen = calientes if aleatorio.random() < 0.5 else productos
+            elegidos.add(aleatorio.choice(origen))
+        return {
+            'clave_idempotencia': uuid.uuid4().hex,
+            'items': [
+                {'producto_id': producto_id, 'cantidad': aleatorio.randint(1, 3), 'precio_unitario': 15}
+                for producto_id in elegidos
+            ],
+        }
+
+    def clasificar(self, status, datos):
+        if status == 200:
+            return 'ok'
+        if status is None:
+            return 'conexion'
+        if status == 503:
+            return 'bloqueo'
+        if status == 400 and 'Stock insuficiente' in datos.get('error', ''):
+            return 'stock'
+        return f'http_{status}'
+
+    def reporte(self, resultados, transcurrido, options):
+        latencias = sorted(r['latencia'] * 1000 for r in resultados if r['resultado'] != 'login')
+        conteos = {}
+        for resultado in resultados:
+            conteos[resultado['resultado']] = conteos.get(resultado['resultado'], 0) + 1
+        exitosas = conteos.get('ok', 0)
+
+        return {
+            'fecha': timezone.now().isoformat(),
+            'configuracion': {
+                'cajeros': options['cajeros'],
+                'duracion': options['duracion'],
+                'tasa': options['tasa'],
+                'productos': options['productos'],
+                'stock': options['stock'],
+                'max_items': options['max_items'],
+                'base_url': options['base_url'],
+                'base_datos': connections['default'].vendor,
+            },
+            'segundos': round(transcurrido, 3),
+            'peticiones': len(latencias),
+            'ventas': exitosas,
+            'ventas_por_segundo': round(exitosas / transcurrido, 2) if transcurrido else 0,
+            'latencia_ms': {
+                'p50': percentil(latencias, 50),
+                'p95': percentil(latencias, 95),
+                'p99': percentil(latencias, 99),
+                'max': latencias[-1] if latencias else None,
+                'promedio': sum(latencias) / len(latencias) if latencias else None,
+            },
+            'resultados': conteos,
+        }
+
+    def verificar_stock(self, stock_inicial, resultados):
+        """stock final = inicial - vendido, sin negativos, y de acuerdo con la bitácora"""
+        venta_ids = [r['venta_id'] for r in resultados if r['resultado'] == 'ok']
+        vendido = dict(
+            DetalleVenta.objects
+            .filter(venta_id__in=venta_ids)
+            .values('producto_id')
+            .annotate(unidades=Sum('cantidad'))
+            .values_list('producto_id', 'unidades')
+            .order_by()
+        )
+        finales = inventario.stock_calculado(Producto.objects.filter(id__in=stock_inicial))
+        desfasados = []
+        for producto_id, stock, calculado in finales.values_list('id', 'stock', 'stock_calculado'):
+            esperado = stock_inicial[producto_id] - vendido.get(producto_id, 0)
+            if stock != esperado or calculado != stock:
+                desfasados.append({
+                    'producto_id': producto_id,
+                    'stock': stock,
+                    'esperado': esperado,
+                    'bitacora': calculado,
+                })
+        return {
+            'ok': not desfasados,
+            'unidades_vendidas': sum(vendido.values()),
+            'desfasados': desfasados,
+        }
+
+    def mostrar(self, reporte):
+        latencia = reporte['latencia_ms']
+        self.stdout.write(
+            f"{reporte['ventas']} venta(s) en {reporte['segundos']} s "
+            f"({reporte['ventas_por_segundo']} ventas/s)"
+        )
+        if latencia['p50'] is not None:
+            self.stdout.write(
+                f"Latencia p50 {latencia['p50']:.1f} ms, p95 {latencia['p95']:.1f} ms, "
+                f"p99 {latencia['p99']:.1f} ms, máx {latencia['max']:.1f} ms"
+            )
+        for resultado, cantidad in sorted(reporte['resultados'].items()):
+            estilo = self.style.SUCCESS if resultado == 'ok' else self.style.WARNING
+            self.stdout.write(estilo(f'  {resultado}: {cantidad}'))
+
+        consistencia = reporte['consistencia']
+        if consistencia['ok']:
+            self.stdout.write(self.style.SUCCESS('Stock consistente con las ventas y la bitácora'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"{len(consistencia['desfasados'])} producto(s) con stock inconsistente"
+            ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from productos.busqueda import obtener_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos'
+
+    def handle(self, *args, **kwargs):
+        backend = obtener_backend()
+        self.stdout.write(f'Reconstruyendo índice ({backend.__class__.__name__})...')
+        
+        total = backend.reconstruir()
+        
+        self.stdout.write(self.style.SUCCESS(f'{total} producto(s) indexado(s)'))
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from productos import resumenes
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios de ventas de un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD), por defecto hoy')
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde'])
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+        
+        self.stdout.write(f'Reconstruyendo resúmenes del {desde} al {hasta}...')
+        
+        dias, filas = resumenes.reconstruir(desde, hasta)
+        
+        self.stdout.write(self.style.SUCCESS(f'{dias} día(s) y {filas} resumen(es) por producto'))
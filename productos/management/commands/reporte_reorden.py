@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from productos import reorden
+from productos.replica import lecturas_replica
+
+
+class Command(BaseCommand):
+    help = 'Lista los productos por reordenar con la cantidad sugerida según la venta reciente'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=reorden.DIAS_VENTAS,
+            help='Días de ventas para calcular la velocidad'
+        )
+        parser.add_argument(
+            '--cobertura',
+            type=int,
+            default=reorden.DIAS_COBERTURA,
+            help='Días de venta que debe cubrir la compra'
+        )
+        parser.add_argument('--csv', action='store_true', help='Salida en CSV')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1 or options['cobertura'] < 1:
+            raise CommandError('--dias y --cobertura deben ser mayores que cero')
+        
+        with lecturas_replica():
+            grupos = reorden.reporte(options['dias'], options['cobertura'])
+        if options['csv']:
+            reorden.escribir_csv(self.stdout, grupos)
+            return
+        
+        for clave, nombre in reorden.GRUPOS:
+            filas = grupos[clave]
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{nombre} ({len(filas)})'))
+            for fila in filas:
+                self.stdout.write(
+                    f"  {fila['codigo_barras']:<13} {fila['nombre'][:40]:<40} "
+                    f"stock {fila['stock']:>4}/{fila['stock_minimo']:<4} "
+                    f"{fila['velocidad']:>6} u/día  comprar {fila['sugerido']}"
+                )
+        
+        total = sum(len(filas) for filas in grupos.values())
+        if total:
+            self.stdout.write(self.style.WARNING(f'{total} producto(s) por reordenar'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Ningún producto por reordenar'))
@@ -0,0 +1,92 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from productos import trabajos
+
+# Cada cuánto se buscan trabajos abandonados y se purga el historial
+SEGUNDOS_MANTENIMIENTO = 60
+
+
+def _ejecutar(trabajo):
+    # Cada hilo tiene su propia conexión: se cierra si quedó vieja o rota
+    close_old_connections()
+    try:
+        return trabajos.ejecutar(trabajo)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta los trabajos en segundo plano (resúmenes, tickets, avisos de stock) '
+        'con un pool de hilos hasta interrumpir con Ctrl+C'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=2,
+            help='Trabajos en paralelo (default: 2)'
+        )
+        parser.add_argument(
+            '--espera',
+            type=float,
+            default=1.0,
+            help='Segundos entre consultas cuando la cola está vacía (default: 1)'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Vaciar la cola y terminar'
+        )
+
+    def handle(self, *args, **options):
+        hilos = options['hilos']
+        if hilos < 1:
+            raise CommandError('--hilos debe ser al menos 1')
+        trabajador = f'{socket.gethostname()}:{os.getpid()}'
+        completados = fallidos = 0
+        mantenimiento = 0
+        en_curso = set()
+
+        self.stdout.write(f'Trabajador {trabajador} con {hilos} hilo(s)')
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            try:
+                while True:
+                    if time.monotonic() - mantenimiento > SEGUNDOS_MANTENIMIENTO:
+                        recuperados = trabajos.recuperar_abandonados()
+                        if recuperados:
+                            self.stdout.write(f'{recuperados} trabajo(s) abandonado(s) recuperado(s)')
+                        trabajos.purgar()
+                        mantenimiento = time.monotonic()
+
+                    libres = hilos - len(en_curso)
+                    tomados = trabajos.tomar(trabajador, libres) if libres else []
+                    en_curso.update(pool.submit(_ejecutar, trabajo) for trabajo in tomados)
+
+                    if not en_curso:
+                        if options['una_vez']:
+                            break
+                        time.sleep(options['espera'])
+                        continue
+                    # Espera a que se libere un hilo o a que pase el intervalo
+                    hechos, en_curso = wait(en_curso, timeout=options['espera'], return_when='FIRST_COMPLETED')
+                    for futuro in hechos:
+                        if futuro.result():
+                            completados += 1
+                        else:
+                            fallidos += 1
+            except KeyboardInterrupt:
+                self.stdout.write('Terminando los trabajos en curso...')
+                wait(en_curso)
+        close_old_connections()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{completados} trabajo(s) completado(s), {fallidos} con error'
+        ))
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from productos.replica import alias_replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia la base SQLite principal a la réplica (POS_REPLICA_DB_PATH) con la API '
+        'de respaldo de SQLite; en PostgreSQL la réplica se mantiene con replicación nativa'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            help='Repetir la copia cada N segundos hasta interrumpir con Ctrl+C'
+        )
+
+    def handle(self, *args, **options):
+        alias = alias_replica()
+        if not alias:
+            raise CommandError('No hay réplica configurada (POS_REPLICA_DB_PATH)')
+        origen = connections['default']
+        if origen.vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+            raise CommandError('Sólo para SQLite: en PostgreSQL usar una réplica de streaming')
+        destino = connections[alias].settings_dict['NAME']
+        if str(destino) == str(origen.settings_dict['NAME']):
+            raise CommandError('La réplica y la base principal son el mismo archivo')
+
+        while True:
+            inicio = time.perf_counter()
+            self.copiar(origen, destino)
+            self.stdout.write(self.style.SUCCESS(
+                f'Réplica {destino} sincronizada en {time.perf_counter() - inicio:.2f} s'
+            ))
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
+
+    def copiar(self, origen, destino):
+        """
+        backup() en un solo paso (pages=-1): la copia se hace en una lectura
+        consistente de la principal. Por pasos, cada escritura de un cajero
+        entre pasos reiniciaría la copia y con escrituras continuas no
+        terminaría nunca.
+        """
+        origen.ensure_connection()
+        conexion = sqlite3.connect(destino)
+        try:
+            origen.connection.backup(conexion, pages=-1)
+        finally:
+            conexion.close()
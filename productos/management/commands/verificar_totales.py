@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from productos.models import Venta
+
+
+class Command(BaseCommand):
+    help = 'Verifica que Venta.total coincida con la suma de sus detalles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar',
+            action='store_true',
+            help='Recalcula los totales desfasados'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Verificando totales de ventas...')
+        
+        desfasadas = Venta.objects.con_total_desfasado().order_by('id')
+        ids = []
+        for venta in desfasadas.values('id', 'total', 'total_calculado'):
+            ids.append(venta['id'])
+            self.stdout.write(self.style.WARNING(
+                f"Venta #{venta['id']}: total ${venta['total']}, "
+                f"detalles ${venta['total_calculado']}"
+            ))
+        
+        if not ids:
+            self.stdout.write(self.style.SUCCESS('Todos los totales son correctos'))
+            return
+        
+        if options['reparar']:
+            reparadas = Venta.objects.filter(id__in=ids).recalcular_totales()
+            self.stdout.write(self.style.SUCCESS(f'{reparadas} venta(s) reparada(s)'))
+        else:
+            self.stdout.write(f'{len(ids)} venta(s) con total desfasado. Usa --reparar para corregirlas')
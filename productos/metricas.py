@@ -0,0 +1,225 @@
+"""
+Métricas por vista: latencia, consultas, tiempo de base de datos y tamaño
+de respuesta, agrupadas por nombre de URL (productos:punto_venta,
+admin:productos_venta_changelist, ...).
+
+MetricasMiddleware mide cada petición con connection.execute_wrapper y
+acumula en un registro en memoria del proceso; la vista metricas_prometheus lo
+expone en formato de texto de Prometheus. Con varios workers cada uno
+tiene su propio registro y Prometheus los distingue por instancia.
+
+Una petición que ejecuta la misma sentencia SQL UMBRAL_DUPLICADAS veces o
+más se cuenta como posible N+1 y se reporta en el log productos.metricas.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.db import connections
+
+logger = logging.getLogger('productos.metricas')
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+UMBRAL_DUPLICADAS = 5
+SIN_RUTA = '<sin_ruta>'
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * len(buckets)
+        self.suma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        self.suma += valor
+        self.total += 1
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+
+    def acumulados(self):
+        """(límite, observaciones <= límite) como los espera Prometheus"""
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            yield limite, acumulado
+
+
+class MetricasVista:
+    def __init__(self):
+        self.latencia = Histograma(BUCKETS_LATENCIA)
+        self.consultas = Histograma(BUCKETS_CONSULTAS)
+        self.tiempo_db = 0.0
+        self.bytes = 0
+        self.respuestas = Counter()
+        self.n_mas_uno = 0
+
+
+class Registro:
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.vistas = {}
+
+    def registrar(self, vista, latencia, consultas, tiempo_db, tamano, status, n_mas_uno):
+        with self._candado:
+            metricas = self.vistas.get(vista)
+            if metricas is None:
+                metricas = self.vistas[vista] = MetricasVista()
+            metricas.latencia.observar(latencia)
+            metricas.consultas.observar(consultas)
+            metricas.tiempo_db += tiempo_db
+            metricas.bytes += tamano
+            metricas.respuestas[f'{status // 100}xx'] += 1
+            if n_mas_uno:
+                metricas.n_mas_uno += 1
+
+    def limpiar(self):
+        with self._candado:
+            self.vistas = {}
+
+    def copia(self):
+        with self._candado:
+            return dict(self.vistas)
+
+
+registro = Registro()
+
+
+class MedidorConsultas:
+    """execute_wrapper que cuenta, cronometra y agrupa las sentencias de una petición"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.sentencias = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.consultas += 1
+            # El SQL llega sin parámetros: las repeticiones de un N+1 son idénticas
+            self.sentencias[sql] += 1
+
+    def duplicadas(self):
+        return [(sql, veces) for sql, veces in self.sentencias.items() if veces >= UMBRAL_DUPLICADAS]
+
+
+def nombre_vista(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return SIN_RUTA
+    return coincidencia.view_name
+
+
+class MetricasMiddleware:
+    """
+    Funciona en modo síncrono y asíncrono. En las vistas asíncronas sólo se
+    miden las consultas hechas desde el hilo de la petición; las que el ORM
+    asíncrono ejecuta en otros hilos (sync_to_async) no se cuentan.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        medidor = MedidorConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medidor))
+            response = self.get_response(request)
+        self._registrar(request, response, medidor, time.perf_counter() - inicio)
+        return response
+
+    async def _acall(self, request):
+        medidor = MedidorConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medidor))
+            response = await self.get_response(request)
+        self._registrar(request, response, medidor, time.perf_counter() - inicio)
+        return response
+
+    def _registrar(self, request, response, medidor, latencia):
+        vista = nombre_vista(request)
+        duplicadas = medidor.duplicadas()
+        for sql, veces in duplicadas:
+            logger.warning('Posible N+1 en %s: %d ejecuciones de %s', vista, veces, sql[:300])
+
+        registro.registrar(
+            vista,
+            latencia,
+            medidor.consultas,
+            medidor.tiempo,
+            0 if response.streaming else len(response.content),
+            response.status_code,
+            bool(duplicadas),
+        )
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histograma(lineas, nombre, vista, histograma):
+    for limite, acumulado in histograma.acumulados():
+        lineas.append(f'{nombre}_bucket{{vista="{vista}",le="{limite}"}} {acumulado}')
+    lineas.append(f'{nombre}_bucket{{vista="{vista}",le="+Inf"}} {histograma.total}')
+    lineas.append(f'{nombre}_sum{{vista="{vista}"}} {histograma.suma}')
+    lineas.append(f'{nombre}_count{{vista="{vista}"}} {histograma.total}')
+
+
+def exportar_prometheus():
+    """Texto en formato de exposición de Prometheus (0.0.4)"""
+    vistas = sorted(registro.copia().items())
+    lineas = []
+
+    lineas.append('# HELP pos_peticion_segundos Latencia de las peticiones por vista')
+    lineas.append('# TYPE pos_peticion_segundos histogram')
+    for vista, metricas in vistas:
+        _histograma(lineas, 'pos_peticion_segundos', _etiqueta(vista), metricas.latencia)
+
+    lineas.append('# HELP pos_consultas_por_peticion Consultas SQL por petición')
+    lineas.append('# TYPE pos_consultas_por_peticion histogram')
+    for vista, metricas in vistas:
+        _histograma(lineas, 'pos_consultas_por_peticion', _etiqueta(vista), metricas.consultas)
+
+    lineas.append('# HELP pos_db_segundos_total Tiempo total en la base de datos')
+    lineas.append('# TYPE pos_db_segundos_total counter')
+    for vista, metricas in vistas:
+        lineas.append(f'pos_db_segundos_total{{vista="{_etiqueta(vista)}"}} {metricas.tiempo_db}')
+
+    lineas.append('# HELP pos_respuesta_bytes_total Bytes enviados (sin respuestas en streaming)')
+    lineas.append('# TYPE pos_respuesta_bytes_total counter')
+    for vista, metricas in vistas:
+        lineas.append(f'pos_respuesta_bytes_total{{vista="{_etiqueta(vista)}"}} {metricas.bytes}')
+
+    lineas.append('# HELP pos_respuestas_total Respuestas por clase de código HTTP')
+    lineas.append('# TYPE pos_respuestas_total counter')
+    for vista, metricas in vistas:
+        for clase, total in sorted(metricas.respuestas.items()):
+            lineas.append(f'pos_respuestas_total{{vista="{_etiqueta(vista)}",codigo="{clase}"}} {total}')
+
+    lineas.append(f'# HELP pos_n_mas_uno_total Peticiones con una sentencia repetida {UMBRAL_DUPLICADAS}+ veces')
+    lineas.append('# TYPE pos_n_mas_uno_total counter')
+    for vista, metricas in vistas:
+        lineas.append(f'pos_n_mas_uno_total{{vista="{_etiqueta(vista)}"}} {metricas.n_mas_uno}')
+
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS productos_busqueda "
+        "USING fts5(nombre, codigo_barras, descripcion, tokenize='trigram')"
+    )
+    from productos.busqueda import normalizar
+
+    Producto = apps.get_model('productos', 'Producto')
+    filas = [
+        (p.id, normalizar(p.nombre), p.codigo_barras, normalizar(p.descripcion))
+        for p in Producto.objects.only('id', 'nombre', 'codigo_barras', 'descripcion').iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO productos_busqueda (rowid, nombre, codigo_barras, descripcion) '
+            'VALUES (%s, %s, %s, %s)',
+            filas
+        )
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS productos_busqueda')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_producto_imagen'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
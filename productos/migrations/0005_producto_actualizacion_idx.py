@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='producto_actualizacion_idx'),
+        ),
+    ]
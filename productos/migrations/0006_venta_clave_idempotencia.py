@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_producto_actualizacion_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, editable=False, help_text='clave generada por la terminal para evitar ventas duplicadas', max_length=64, null=True, unique=True, verbose_name='clave de idempotencia'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_costos(apps, schema_editor):
+    """Los detalles existentes toman el precio de compra actual del producto"""
+    DetalleVenta = apps.get_model('productos', 'DetalleVenta')
+    Producto = apps.get_model('productos', 'Producto')
+    DetalleVenta.objects.filter(costo_unitario__isnull=True).update(
+        costo_unitario=models.Subquery(
+            Producto.objects.filter(pk=models.OuterRef('producto_id')).values('precio_compra')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0006_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentasDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='fecha')),
+                ('num_ventas', models.IntegerField(default=0, verbose_name='ventas')),
+                ('unidades', models.IntegerField(default=0, verbose_name='unidades vendidas')),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='ingresos')),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='costo')),
+                ('margen', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='margen')),
+            ],
+            options={
+                'verbose_name': 'resumen diario de ventas',
+                'verbose_name_plural': 'resúmenes diarios de ventas',
+                'db_table': 'ventas_resumen_diario',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='Precio de compra del producto al momento de la venta', max_digits=10, null=True, verbose_name='Costo Unitario'),
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='fecha')),
+                ('unidades', models.IntegerField(default=0, verbose_name='unidades vendidas')),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='ingresos')),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='costo')),
+                ('margen', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='margen')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='productos.producto', verbose_name='producto')),
+            ],
+            options={
+                'verbose_name': 'resumen diario por producto',
+                'verbose_name_plural': 'resúmenes diarios por producto',
+                'db_table': 'ventas_resumen_producto_diario',
+                'ordering': ['-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto'), name='resumen_producto_fecha_unico')],
+            },
+        ),
+        migrations.RunPython(copiar_costos, migrations.RunPython.noop),
+    ]
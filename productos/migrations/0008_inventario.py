@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def snapshot_inicial(apps, schema_editor):
+    """El stock actual es el punto de partida de la bitácora"""
+    Producto = apps.get_model('productos', 'Producto')
+    SnapshotInventario = apps.get_model('productos', 'SnapshotInventario')
+    SnapshotInventario.objects.bulk_create(
+        (
+            SnapshotInventario(producto_id=producto_id, stock=stock, ultimo_movimiento_id=0)
+            for producto_id, stock in Producto.objects.values_list('id', 'stock').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_resumenes_diarios'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('devolucion', 'Devolución'), ('ajuste', 'Ajuste'), ('entrada', 'Entrada')], max_length=20, verbose_name='tipo')),
+                ('cantidad', models.IntegerField(help_text='cambio en el stock (negativo para salidas)', verbose_name='cantidad')),
+                ('nota', models.CharField(blank=True, max_length=200, verbose_name='nota')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='fecha')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='productos.producto', verbose_name='producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='usuario')),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='productos.venta', verbose_name='venta')),
+            ],
+            options={
+                'verbose_name': 'movimiento de inventario',
+                'verbose_name_plural': 'movimientos de inventario',
+                'db_table': 'inventario_movimiento',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['producto', 'id'], name='movimiento_producto_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField(verbose_name='stock')),
+                ('ultimo_movimiento_id', models.BigIntegerField(default=0, verbose_name='último movimiento incluido')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='fecha')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='productos.producto', verbose_name='producto')),
+            ],
+            options={
+                'verbose_name': 'snapshot de inventario',
+                'verbose_name_plural': 'snapshots de inventario',
+                'db_table': 'inventario_snapshot',
+                'indexes': [models.Index(fields=['producto', '-ultimo_movimiento_id'], name='snapshot_producto_idx')],
+            },
+        ),
+        migrations.RunPython(snapshot_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0008_inventario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('stock_minimo'))), fields=['nombre'], name='producto_bajo_stock_idx'),
+        ),
+    ]
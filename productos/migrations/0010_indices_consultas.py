@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_producto_bajo_stock_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movimientoinventario',
+            name='movimiento_producto_idx',
+        ),
+        migrations.AddIndex(
+            model_name='detalleventa',
+            index=models.Index(fields=['producto', 'venta'], name='detalle_producto_venta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre'], name='producto_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'nombre'], name='producto_activo_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenproductodiario',
+            index=models.Index(fields=['producto', 'fecha'], name='resumen_producto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha'], name='venta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='id')),
+                ('fecha', models.DateTimeField(verbose_name='fecha de venta')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='total de la venta')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('completada', 'Completada'), ('cancelada', 'Cancelada')], max_length=20, verbose_name='estado')),
+                ('notas', models.TextField(blank=True, null=True, verbose_name='notas')),
+                ('clave_idempotencia', models.CharField(blank=True, max_length=64, null=True, verbose_name='clave de idempotencia')),
+                ('fecha_creacion', models.DateTimeField(verbose_name='Fecha de Creación')),
+                ('fecha_actualizacion', models.DateTimeField(verbose_name='Última Actualización')),
+                ('fecha_archivo', models.DateTimeField(default=django.utils.timezone.now, verbose_name='fecha de archivo')),
+            ],
+            options={
+                'verbose_name': 'venta archivada',
+                'verbose_name_plural': 'ventas archivadas',
+                'db_table': 'archivo_venta',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha'], name='archivo_venta_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleVentaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='id')),
+                ('producto_id', models.BigIntegerField(verbose_name='id del producto')),
+                ('producto_codigo_barras', models.CharField(max_length=13, verbose_name='código de barras')),
+                ('producto_nombre', models.CharField(max_length=200, verbose_name='producto')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio Unitario')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='subtotal')),
+                ('costo_unitario', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Costo Unitario')),
+                ('venta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='productos.ventaarchivada', verbose_name='venta')),
+            ],
+            options={
+                'verbose_name': 'detalle de venta archivada',
+                'verbose_name_plural': 'detalles de ventas archivadas',
+                'db_table': 'archivo_detalleventa',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_archivo_ventas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tarea', models.CharField(max_length=100, verbose_name='tarea')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='argumentos')),
+                ('clave_unica', models.CharField(blank=True, max_length=200, null=True, verbose_name='clave de deduplicación')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=20, verbose_name='estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='intentos')),
+                ('max_intentos', models.PositiveSmallIntegerField(default=5, verbose_name='máximo de intentos')),
+                ('disponible_en', models.DateTimeField(default=django.utils.timezone.now, help_text='no se ejecuta antes de esta fecha (espera entre reintentos)', verbose_name='disponible desde')),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now, verbose_name='creado')),
+                ('iniciado', models.DateTimeField(blank=True, null=True, verbose_name='iniciado')),
+                ('terminado', models.DateTimeField(blank=True, null=True, verbose_name='terminado')),
+                ('trabajador', models.CharField(blank=True, max_length=100, verbose_name='trabajador')),
+                ('error', models.TextField(blank=True, verbose_name='último error')),
+            ],
+            options={
+                'verbose_name': 'trabajo',
+                'verbose_name_plural': 'trabajos',
+                'db_table': 'trabajos_trabajo',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['estado', 'disponible_en', 'id'], name='trabajo_disponible_idx'), models.Index(fields=['estado', 'iniciado'], name='trabajo_estado_iniciado_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'en_proceso'])), fields=('clave_unica',), name='trabajo_clave_activa_uniq')],
+            },
+        ),
+    ]
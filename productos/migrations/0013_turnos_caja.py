@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_trabajos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='cajero',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='cajero'),
+        ),
+        migrations.AddField(
+            model_name='ventaarchivada',
+            name='cajero_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='id del cajero'),
+        ),
+        migrations.AddField(
+            model_name='ventaarchivada',
+            name='turno_id',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='id del turno de caja'),
+        ),
+        migrations.CreateModel(
+            name='TurnoCaja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caja', models.CharField(help_text='nombre o número de la caja registradora', max_length=30, verbose_name='caja')),
+                ('estado', models.CharField(choices=[('abierto', 'Abierto'), ('cerrado', 'Cerrado')], default='abierto', max_length=10, verbose_name='estado')),
+                ('abierto', models.DateTimeField(default=django.utils.timezone.now, verbose_name='apertura')),
+                ('cerrado', models.DateTimeField(blank=True, null=True, verbose_name='cierre')),
+                ('fondo_inicial', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='efectivo en la caja al abrir', max_digits=10, verbose_name='fondo inicial')),
+                ('efectivo_contado', models.DecimalField(blank=True, decimal_places=2, help_text='efectivo en la caja al cerrar', max_digits=12, null=True, verbose_name='efectivo contado')),
+                ('ventas_completadas', models.IntegerField(default=0, verbose_name='ventas completadas')),
+                ('total_completadas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='total completadas')),
+                ('ventas_canceladas', models.IntegerField(default=0, verbose_name='ventas canceladas')),
+                ('total_canceladas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='total canceladas')),
+                ('ventas_pendientes', models.IntegerField(default=0, verbose_name='ventas pendientes')),
+                ('total_pendientes', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='total pendientes')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='turnos_caja', to=settings.AUTH_USER_MODEL, verbose_name='cajero')),
+            ],
+            options={
+                'verbose_name': 'turno de caja',
+                'verbose_name_plural': 'turnos de caja',
+                'db_table': 'caja_turno',
+                'ordering': ['-abierto'],
+            },
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='turno',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ventas', to='productos.turnocaja', verbose_name='turno de caja'),
+        ),
+        migrations.AddIndex(
+            model_name='turnocaja',
+            index=models.Index(fields=['abierto'], name='turno_abierto_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='turnocaja',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'abierto')), fields=('caja',), name='turno_caja_abierto_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='turnocaja',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'abierto')), fields=('usuario',), name='turno_usuario_abierto_uniq'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:19
+
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def marcar_existentes(apps, schema_editor):
+    """Las imágenes con la derivada más grande ya generada usan miniaturas"""
+    def ruta_derivada(nombre):
+        # Esquema de rutas de esta migración; 0019 lo reemplaza
+        raiz, _ = os.path.splitext(nombre)
+        return f'{raiz}_600px.jpg'
+
+    Producto = apps.get_model('productos', 'Producto')
+    con_miniaturas = [
+        producto_id
+        for producto_id, nombre in Producto.objects.exclude(imagen='').exclude(imagen__isnull=True).values_list('id', 'imagen').iterator()
+        if default_storage.exists(ruta_derivada(nombre))
+    ]
+    for inicio in range(0, len(con_miniaturas), 500):
+        Producto.objects.filter(id__in=con_miniaturas[inicio:inicio + 500]).update(miniaturas=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_turnos_caja'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='miniaturas',
+            field=models.BooleanField(default=False, editable=False, help_text='las derivadas de la imagen existen; si no, se sirve el original', verbose_name='miniaturas generadas'),
+        ),
+        migrations.RunPython(marcar_existentes, migrations.RunPython.noop),
+    ]
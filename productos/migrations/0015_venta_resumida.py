@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:40
+
+from django.db import migrations, models
+
+
+def marcar_resumidas(apps, schema_editor):
+    """
+    Las ventas completadas ya están en los resúmenes, salvo las que esperan
+    su trabajo aplicar_resumenes (o post_venta) en la cola.
+    """
+    Venta = apps.get_model('productos', 'Venta')
+    Trabajo = apps.get_model('productos', 'Trabajo')
+    en_cola = set()
+    for tarea, argumentos in (
+        Trabajo.objects
+        .filter(estado__in=['pendiente', 'en_proceso'], tarea__in=['post_venta', 'aplicar_resumenes'])
+        .values_list('tarea', 'argumentos')
+    ):
+        if tarea == 'post_venta':
+            en_cola.add(argumentos['venta_id'])
+        else:
+            en_cola.update(argumentos['venta_ids'])
+    Venta.objects.filter(estado='completada').exclude(id__in=en_cola).update(resumida=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0014_miniaturas_producto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='resumida',
+            field=models.BooleanField(default=False, editable=False, help_text='su contribución ya está sumada en los resúmenes diarios (ver resumenes.py)', verbose_name='en los resúmenes'),
+        ),
+        migrations.RunPython(marcar_resumidas, migrations.RunPython.noop),
+    ]
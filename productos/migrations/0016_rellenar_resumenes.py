@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+CERO = Decimal('0.00')
+
+
+def rellenar_resumenes(apps, schema_editor):
+    """
+    0007 creó las tablas de resumen vacías: sin esto los reportes no
+    muestran las ventas anteriores y cancelar una de ellas deja días en
+    negativo. Sólo corre si los resúmenes siguen vacíos.
+
+    Repite el cálculo de resumenes.reconstruir con los modelos históricos,
+    para que cambios futuros a ese módulo no alteren esta migración.
+    """
+    Venta = apps.get_model('productos', 'Venta')
+    DetalleVenta = apps.get_model('productos', 'DetalleVenta')
+    ResumenVentasDiario = apps.get_model('productos', 'ResumenVentasDiario')
+    ResumenProductoDiario = apps.get_model('productos', 'ResumenProductoDiario')
+    if ResumenVentasDiario.objects.exists():
+        return
+
+    Venta.objects.exclude(estado='completada').update(resumida=False)
+    Venta.objects.filter(estado='completada').update(resumida=True)
+    ventas = Venta.objects.filter(estado='completada')
+
+    por_dia = {}
+    dias = ventas.annotate(dia=TruncDate('fecha')).values('dia').annotate(num_ventas=Count('id')).order_by()
+    for fila in dias:
+        por_dia[fila['dia']] = ResumenVentasDiario(
+            fecha=fila['dia'], num_ventas=fila['num_ventas'], ingresos=CERO, costo=CERO,
+        )
+
+    productos = (
+        DetalleVenta.objects
+        .filter(venta__estado='completada')
+        .annotate(dia=TruncDate('venta__fecha'))
+        .values('dia', 'producto_id')
+        .annotate(
+            unidades=Sum('cantidad'),
+            ingresos=Sum('subtotal'),
+            costo=Sum(
+                F('cantidad') * Coalesce('costo_unitario', 'producto__precio_compra'),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+        .order_by()
+    )
+    resumenes_producto = []
+    for fila in productos.iterator(chunk_size=2000):
+        costo = fila['costo'] or CERO
+        resumenes_producto.append(ResumenProductoDiario(
+            fecha=fila['dia'],
+            producto_id=fila['producto_id'],
+            unidades=fila['unidades'],
+            ingresos=fila['ingresos'],
+            costo=costo,
+            margen=fila['ingresos'] - costo,
+        ))
+        dia = por_dia[fila['dia']]
+        dia.unidades += fila['unidades']
+        dia.ingresos += fila['ingresos']
+        dia.costo += costo
+    for dia in por_dia.values():
+        dia.margen = dia.ingresos - dia.costo
+
+    ResumenVentasDiario.objects.bulk_create(por_dia.values())
+    ResumenProductoDiario.objects.bulk_create(resumenes_producto, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0015_venta_resumida'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_resumenes, migrations.RunPython.noop),
+    ]
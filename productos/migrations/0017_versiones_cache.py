@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0016_rellenar_resumenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCache',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='nombre')),
+                ('valor', models.BigIntegerField(verbose_name='versión')),
+            ],
+            options={
+                'verbose_name': 'versión de caché',
+                'verbose_name_plural': 'versiones de caché',
+                'db_table': 'cache_version',
+            },
+        ),
+    ]
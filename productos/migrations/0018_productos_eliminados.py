@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0017_versiones_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(verbose_name='id del producto')),
+                ('fecha_eliminacion', models.DateTimeField(default=django.utils.timezone.now, verbose_name='fecha de eliminación')),
+            ],
+            options={
+                'verbose_name': 'producto eliminado',
+                'verbose_name_plural': 'productos eliminados',
+                'db_table': 'productos_eliminado',
+                'indexes': [models.Index(fields=['fecha_eliminacion', 'producto_id'], name='eliminado_cursor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def reiniciar_miniaturas(apps, schema_editor):
+    """
+    Las derivadas cambiaron de ruta (foto_200px.webp -> foto.jpg_200px.webp).
+    Se marcan como faltantes para servir el original hasta que
+    generar_miniaturas --faltantes las genere en la ruta nueva.
+    """
+    Producto = apps.get_model('productos', 'Producto')
+    Producto.objects.filter(miniaturas=True).update(miniaturas=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0018_productos_eliminados'),
+    ]
+
+    operations = [
+        migrations.RunPython(reiniciar_miniaturas, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,47 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+# Ventas cuyo total quedó pendiente dentro de un bloque recalculo_diferido()
+_ventas_pendientes = ContextVar('ventas_pendientes', default=None)
+
+
+@contextmanager
+def recalculo_diferido():
+    """
+    Difiere el recálculo de Venta.total: cada DetalleVenta guardado o borrado
+    dentro del bloque sólo registra su venta, y al salir se recalculan todas
+    con un único UPDATE usando Sum(). Los bloques anidados se unen al externo.
+    """
+    if _ventas_pendientes.get() is not None:
+        yield
+        return
+
+    pendientes = set()
+    token = _ventas_pendientes.set(pendientes)
+    try:
+        yield
+    finally:
+        _ventas_pendientes.reset(token)
+    if pendientes:
+        Venta.objects.filter(id__in=pendientes).recalcular_totales()
+
+
+class ProductoQuerySet(models.QuerySet):
+    def bajo_stock(self):
+        """Productos con stock <= stock_mínimo, filtrados en la base de datos"""
+        return self.filter(stock__lte=F('stock_minimo'))
+
+    def agotados(self):
+        return self.filter(stock=0)
+
+
 class Producto(models.Model):
     codigo_barras = models.CharField(
         max_length=13,
@@ -28,6 +69,12 @@ class Producto(models.Model):
         verbose_name="imagen del producto",
         help_text="imagen del producto"
     )
+    miniaturas = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="miniaturas generadas",
+        help_text="las derivadas de la imagen existen; si no, se sirve el original"
+    )
     precio_compra = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -72,12 +119,15 @@ class Producto(models.Model):
 
     def __str__(self):
         return f"{self.codigo_barras} - {self.nombre}"
+
+    objects = ProductoQuerySet.as_manager()
     
     def calcular_ganancia(self):
         return self.precio_venta - self.precio_compra
 
     
     def necesita_reordenar(self):
+        # Para filtrar muchos productos usar Producto.objects.bajo_stock()
         return self.stock <= self.stock_minimo
     def tiene_imagen(self):
         return bool(self.imagen)
@@ -87,6 +137,176 @@ class Producto(models.Model):
         verbose_name_plural = "productos"
         ordering = ['nombre']
         db_table = 'productos_producto'
+        indexes = [
+            # Cursor de sincronización del catálogo (fecha_actualizacion, id)
+            models.Index(fields=['fecha_actualizacion', 'id'], name='producto_actualizacion_idx'),
+            # Lista y admin ordenan por nombre; el POS filtra activos y ordena por nombre
+            models.Index(fields=['nombre'], name='producto_nombre_idx'),
+            models.Index(fields=['activo', 'nombre'], name='producto_activo_nombre_idx'),
+            # Índice parcial: sólo contiene los productos por reordenar
+            models.Index(
+                fields=['nombre'],
+                condition=Q(stock__lte=F('stock_minimo')),
+                name='producto_bajo_stock_idx',
+            ),
+        ]
+
+
+class TurnoCaja(models.Model):
+    """
+    Turno de un cajero en una caja. Los contadores por estado se mantienen
+    con F() al registrar, cambiar de estado o borrar ventas del turno (ver
+    turnos.py), así el corte de caja lee una sola fila.
+    """
+    ESTADO_CHOICES = [
+        ('abierto', 'Abierto'),
+        ('cerrado', 'Cerrado'),
+    ]
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        related_name='turnos_caja',
+        verbose_name="cajero"
+    )
+    caja = models.CharField(
+        max_length=30,
+        verbose_name="caja",
+        help_text="nombre o número de la caja registradora"
+    )
+    estado = models.CharField(
+        max_length=10,
+        choices=ESTADO_CHOICES,
+        default='abierto',
+        verbose_name="estado"
+    )
+    abierto = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="apertura"
+    )
+    cerrado = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="cierre"
+    )
+    fondo_inicial = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="fondo inicial",
+        help_text="efectivo en la caja al abrir"
+    )
+    efectivo_contado = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="efectivo contado",
+        help_text="efectivo en la caja al cerrar"
+    )
+    ventas_completadas = models.IntegerField(
+        default=0,
+        verbose_name="ventas completadas"
+    )
+    total_completadas = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="total completadas"
+    )
+    ventas_canceladas = models.IntegerField(
+        default=0,
+        verbose_name="ventas canceladas"
+    )
+    total_canceladas = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="total canceladas"
+    )
+    ventas_pendientes = models.IntegerField(
+        default=0,
+        verbose_name="ventas pendientes"
+    )
+    total_pendientes = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="total pendientes"
+    )
+
+    def __str__(self):
+        return f"Turno #{self.id} - caja {self.caja} - {self.abierto.strftime('%d/%m/%y %H:%M')}"
+
+    @property
+    def efectivo_esperado(self):
+        return self.fondo_inicial + self.total_completadas
+
+    @property
+    def diferencia(self):
+        """Sobrante (positivo) o faltante (negativo) del corte"""
+        if self.efectivo_contado is None:
+            return None
+        return self.efectivo_contado - self.efectivo_esperado
+
+    class Meta:
+        verbose_name = "turno de caja"
+        verbose_name_plural = "turnos de caja"
+        ordering = ['-abierto']
+        db_table = 'caja_turno'
+        constraints = [
+            # Un solo turno abierto por caja y por cajero; también sirve para buscarlo
+            models.UniqueConstraint(
+                fields=['caja'],
+                condition=Q(estado='abierto'),
+                name='turno_caja_abierto_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['usuario'],
+                condition=Q(estado='abierto'),
+                name='turno_usuario_abierto_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['abierto'], name='turno_abierto_idx'),
+        ]
+
+
+class VentaQuerySet(models.QuerySet):
+    def con_total_calculado(self):
+        """Anota total_calculado = suma de subtotales de los detalles"""
+        return self.annotate(
+            total_calculado=Coalesce(
+                Sum('detalles__subtotal'),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+
+    def con_total_desfasado(self):
+        """Ventas cuyo total no coincide con la suma de sus detalles"""
+        return self.con_total_calculado().exclude(total=F('total_calculado'))
+
+    def recalcular_totales(self):
+        """Recalcula el total de todas las ventas del queryset con un solo UPDATE"""
+        suma_detalles = (
+            DetalleVenta.objects
+            .filter(venta=OuterRef('pk'))
+            .order_by()
+            .values('venta')
+            .annotate(suma=Sum('subtotal'))
+            .values('suma')
+        )
+        return self.update(
+            total=Coalesce(
+                Subquery(suma_detalles),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            fecha_actualizacion=timezone.now(),
+        )
+
+
 class Venta(models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
@@ -122,6 +342,41 @@ class Venta(models.Model):
         verbose_name="notas",
         help_text="observaciones o notas de la venta"
     )
+
+    clave_idempotencia = models.CharField(
+        max_length=64,
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="clave de idempotencia",
+        help_text="clave generada por la terminal para evitar ventas duplicadas"
+    )
+
+    turno = models.ForeignKey(
+        TurnoCaja,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='ventas',
+        verbose_name="turno de caja"
+    )
+
+    cajero = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="cajero"
+    )
+
+    resumida = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="en los resúmenes",
+        help_text="su contribución ya está sumada en los resúmenes diarios (ver resumenes.py)"
+    )
     
     fecha_creacion = models.DateTimeField(
         auto_now_add=True,
@@ -136,10 +391,12 @@ class Venta(models.Model):
     def __str__(self):
         return f"Venta #{self.id} - {self.fecha.strftime('%d/%m/%y %H:%M')} - ${self.total}"
     
+    objects = VentaQuerySet.as_manager()
+
     def calcular_total(self):
-        total = sum(detalle.subtotal for detalle in self.detalles.all())
+        total = self.detalles.aggregate(total=Sum('subtotal'))['total'] or Decimal('0.00')
         self.total = total
-        self.save()
+        self.save(update_fields=['total', 'fecha_actualizacion'])
         return total
     
     def cantidad_productos(self):
@@ -153,6 +410,11 @@ class Venta(models.Model):
         verbose_name_plural = "Ventas"
         ordering = ['-fecha']
         db_table = 'ventas_venta'
+        indexes = [
+            # Admin y reportes ordenan por fecha; el filtro por estado la acompaña
+            models.Index(fields=['fecha'], name='venta_fecha_idx'),
+            models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+        ]
 
 
 class DetalleVenta(models.Model):
@@ -188,17 +450,510 @@ class DetalleVenta(models.Model):
         verbose_name="subtotal",
         help_text="total de la cantidad por c/u"
     )
+    costo_unitario = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Costo Unitario",
+        help_text="Precio de compra del producto al momento de la venta"
+    )
     
     def __str__(self):
         return f"{self.cantidad}x {self.producto.nombre} - ${self.subtotal}"
     
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
+        if self.costo_unitario is None:
+            self.costo_unitario = self.producto.precio_compra
         super().save(*args, **kwargs)
-        self.venta.calcular_total()
+        self._actualizar_total_venta()
+    
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        self._actualizar_total_venta()
+        return resultado
+    
+    def _actualizar_total_venta(self):
+        pendientes = _ventas_pendientes.get()
+        if pendientes is not None:
+            pendientes.add(self.venta_id)
+        else:
+            self.venta.calcular_total()
     
     class Meta:
         verbose_name = "detalle de venta"
         verbose_name_plural = "detalles de la venta"
         db_table = 'ventas_detalleventa'
+        indexes = [
+            # Ventas de un producto en orden de venta
+            models.Index(fields=['producto', 'venta'], name='detalle_producto_venta_idx'),
+        ]
+
+
+class ResumenVentasDiario(models.Model):
+    """Totales de ventas completadas por día, mantenidos de forma incremental"""
+    fecha = models.DateField(
+        unique=True,
+        verbose_name="fecha"
+    )
+    num_ventas = models.IntegerField(
+        default=0,
+        verbose_name="ventas"
+    )
+    unidades = models.IntegerField(
+        default=0,
+        verbose_name="unidades vendidas"
+    )
+    ingresos = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="ingresos"
+    )
+    costo = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="costo"
+    )
+    margen = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="margen"
+    )
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} - ${self.ingresos}"
+
+    class Meta:
+        verbose_name = "resumen diario de ventas"
+        verbose_name_plural = "resúmenes diarios de ventas"
+        ordering = ['-fecha']
+        db_table = 'ventas_resumen_diario'
+
+
+class ResumenProductoDiario(models.Model):
+    """Totales de ventas completadas por producto y día"""
+    fecha = models.DateField(
+        verbose_name="fecha"
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='resumenes_diarios',
+        verbose_name="producto"
+    )
+    unidades = models.IntegerField(
+        default=0,
+        verbose_name="unidades vendidas"
+    )
+    ingresos = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="ingresos"
+    )
+    costo = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="costo"
+    )
+    margen = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="margen"
+    )
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} - {self.producto_id} - {self.unidades}u"
+
+    class Meta:
+        verbose_name = "resumen diario por producto"
+        verbose_name_plural = "resúmenes diarios por producto"
+        ordering = ['-fecha']
+        db_table = 'ventas_resumen_producto_diario'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto'], name='resumen_producto_fecha_unico'),
+        ]
+        indexes = [
+            # Historial de un producto (velocidad de venta del reporte de reorden)
+            models.Index(fields=['producto', 'fecha'], name='resumen_producto_idx'),
+        ]
+
+
+class MovimientoInventario(models.Model):
+    """
+    Bitácora de inventario de sólo inserción. Cada movimiento es un delta de
+    stock (negativo para salidas); Producto.stock es el valor materializado.
+    """
+    TIPO_CHOICES = [
+        ('venta', 'Venta'),
+        ('devolucion', 'Devolución'),
+        ('ajuste', 'Ajuste'),
+        ('entrada', 'Entrada'),
+    ]
+
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.PROTECT,
+        related_name='movimientos',
+        verbose_name="producto"
+    )
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPO_CHOICES,
+        verbose_name="tipo"
+    )
+    cantidad = models.IntegerField(
+        verbose_name="cantidad",
+        help_text="cambio en el stock (negativo para salidas)"
+    )
+    venta = models.ForeignKey(
+        Venta,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='movimientos',
+        verbose_name="venta"
+    )
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="usuario"
+    )
+    nota = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name="nota"
+    )
+    fecha = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="fecha"
+    )
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} - producto {self.producto_id}"
+
+    class Meta:
+        verbose_name = "movimiento de inventario"
+        verbose_name_plural = "movimientos de inventario"
+        ordering = ['-id']
+        db_table = 'inventario_movimiento'
+
+
+class SnapshotInventario(models.Model):
+    """Stock de un producto después de aplicar los movimientos hasta ultimo_movimiento_id"""
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='snapshots',
+        verbose_name="producto"
+    )
+    stock = models.IntegerField(
+        verbose_name="stock"
+    )
+    ultimo_movimiento_id = models.BigIntegerField(
+        default=0,
+        verbose_name="último movimiento incluido"
+    )
+    fecha = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="fecha"
+    )
+
+    def __str__(self):
+        return f"Producto {self.producto_id}: {self.stock} (hasta movimiento {self.ultimo_movimiento_id})"
+
+    class Meta:
+        verbose_name = "snapshot de inventario"
+        verbose_name_plural = "snapshots de inventario"
+        db_table = 'inventario_snapshot'
+        indexes = [
+            models.Index(fields=['producto', '-ultimo_movimiento_id'], name='snapshot_producto_idx'),
+        ]
+
+
+class VentaArchivada(models.Model):
+    """
+    Venta cerrada movida fuera de ventas_venta por archivar_ventas. Conserva
+    el id original, así que los tickets y reportes la encuentran por el mismo
+    número. Con PRODUCTOS_ARCHIVO_DB vive en otra base de datos (ver routers).
+    """
+    id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="id"
+    )
+    fecha = models.DateTimeField(
+        verbose_name="fecha de venta"
+    )
+    total = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="total de la venta"
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=Venta.ESTADO_CHOICES,
+        verbose_name="estado"
+    )
+    notas = models.TextField(
+        blank=True,
+        null=True,
+        verbose_name="notas"
+    )
+    clave_idempotencia = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        verbose_name="clave de idempotencia"
+    )
+    # Sin llaves foráneas: el archivo puede estar en otra base de datos
+    turno_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name="id del turno de caja"
+    )
+    cajero_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="id del cajero"
+    )
+    fecha_creacion = models.DateTimeField(
+        verbose_name="Fecha de Creación"
+    )
+    fecha_actualizacion = models.DateTimeField(
+        verbose_name="Última Actualización"
+    )
+    fecha_archivo = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="fecha de archivo"
+    )
+
+    def __str__(self):
+        return f"Venta #{self.id} - {self.fecha.strftime('%d/%m/%y %H:%M')} - ${self.total} (archivada)"
+
+    class Meta:
+        verbose_name = "venta archivada"
+        verbose_name_plural = "ventas archivadas"
+        ordering = ['-fecha']
+        db_table = 'archivo_venta'
+        indexes = [
+            models.Index(fields=['fecha'], name='archivo_venta_fecha_idx'),
+        ]
+
+
+class DetalleVentaArchivada(models.Model):
+    """
+    Detalle de una venta archivada. El producto se guarda como copia
+    (id, código y nombre al archivar) en lugar de una llave foránea: la
+    tabla puede estar en otra base de datos y el producto puede borrarse.
+    """
+    id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="id"
+    )
+    venta = models.ForeignKey(
+        VentaArchivada,
+        on_delete=models.CASCADE,
+        related_name='detalles',
+        verbose_name="venta"
+    )
+    producto_id = models.BigIntegerField(
+        verbose_name="id del producto"
+    )
+    producto_codigo_barras = models.CharField(
+        max_length=13,
+        verbose_name="código de barras"
+    )
+    producto_nombre = models.CharField(
+        max_length=200,
+        verbose_name="producto"
+    )
+    cantidad = models.PositiveIntegerField(
+        verbose_name="Cantidad"
+    )
+    precio_unitario = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Precio Unitario"
+    )
+    subtotal = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="subtotal"
+    )
+    costo_unitario = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Costo Unitario"
+    )
+
+    @property
+    def producto(self):
+        """Producto sin guardar con los datos copiados, para reutilizar las plantillas del ticket"""
+        return Producto(
+            id=self.producto_id,
+            codigo_barras=self.producto_codigo_barras,
+            nombre=self.producto_nombre,
+        )
+
+    def __str__(self):
+        return f"{self.cantidad}x {self.producto_nombre} - ${self.subtotal}"
+
+    class Meta:
+        verbose_name = "detalle de venta archivada"
+        verbose_name_plural = "detalles de ventas archivadas"
+        db_table = 'archivo_detalleventa'
+
 
+class Trabajo(models.Model):
+    """
+    Trabajo en segundo plano de la cola en base de datos (ver trabajos.py).
+    Mientras está pendiente o en proceso, clave_unica no se repite: encolar
+    dos veces lo mismo deja un solo trabajo.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    tarea = models.CharField(
+        max_length=100,
+        verbose_name="tarea"
+    )
+    argumentos = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="argumentos"
+    )
+    clave_unica = models.CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        verbose_name="clave de deduplicación"
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='pendiente',
+        verbose_name="estado"
+    )
+    intentos = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="intentos"
+    )
+    max_intentos = models.PositiveSmallIntegerField(
+        default=5,
+        verbose_name="máximo de intentos"
+    )
+    disponible_en = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="disponible desde",
+        help_text="no se ejecuta antes de esta fecha (espera entre reintentos)"
+    )
+    creado = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="creado"
+    )
+    iniciado = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="iniciado"
+    )
+    terminado = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="terminado"
+    )
+    trabajador = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="trabajador"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="último error"
+    )
+
+    def __str__(self):
+        return f"{self.tarea} #{self.id} ({self.get_estado_display()})"
+
+    class Meta:
+        verbose_name = "trabajo"
+        verbose_name_plural = "trabajos"
+        ordering = ['-id']
+        db_table = 'trabajos_trabajo'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['clave_unica'],
+                condition=Q(estado__in=['pendiente', 'en_proceso']),
+                name='trabajo_clave_activa_uniq',
+            ),
+        ]
+        indexes = [
+            # Siguiente trabajo disponible: igualdad en estado y orden por disponible_en
+            models.Index(fields=['estado', 'disponible_en', 'id'], name='trabajo_disponible_idx'),
+            models.Index(fields=['estado', 'iniciado'], name='trabajo_estado_iniciado_idx'),
+        ]
+
+
+class VersionCache(models.Model):
+    """
+    Versión compartida de una caché (ver versiones.py). Todos los procesos
+    leen la misma fila: un incremento invalida la caché en todos ellos.
+    """
+    nombre = models.CharField(
+        max_length=50,
+        primary_key=True,
+        verbose_name="nombre"
+    )
+    valor = models.BigIntegerField(
+        verbose_name="versión"
+    )
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    class Meta:
+        verbose_name = "versión de caché"
+        verbose_name_plural = "versiones de caché"
+        db_table = 'cache_version'
+
+
+class ProductoEliminado(models.Model):
+    """
+    Baja definitiva de un producto. La fila del producto ya no existe, así
+    que la sincronización de las terminales (ver sincronizacion.py) toma las
+    bajas de aquí, en el mismo orden de cursor que los productos.
+    """
+    producto_id = models.BigIntegerField(
+        verbose_name="id del producto"
+    )
+    fecha_eliminacion = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="fecha de eliminación"
+    )
+
+    def __str__(self):
+        return f"Producto {self.producto_id} eliminado el {self.fecha_eliminacion:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = "producto eliminado"
+        verbose_name_plural = "productos eliminados"
+        db_table = 'productos_eliminado'
+        indexes = [
+            models.Index(fields=['fecha_eliminacion', 'producto_id'], name='eliminado_cursor_idx'),
+        ]
@@ -0,0 +1,51 @@
+"""
+Paginación por cursor (keyset) sobre (nombre, id).
+
+A diferencia de OFFSET, cada página es un rango del índice sin importar qué
+tan adentro del catálogo esté, así que el costo es constante por página.
+"""
+import base64
+import json
+
+
+def codificar_cursor(nombre, producto_id):
+    datos = json.dumps([nombre, producto_id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Regresa (nombre, id) o None si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        nombre, producto_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return str(nombre), int(producto_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def despues_de(queryset, cursor=None):
+    """Queryset ordenado por (nombre, id) a partir de la posición del cursor"""
+    queryset = queryset.order_by('nombre', 'id')
+    posicion = decodificar_cursor(cursor)
+    if posicion is not None:
+        nombre, producto_id = posicion
+        # (nombre >= x) menos (nombre = x AND id <= y): un solo rango del índice,
+        # a diferencia del OR, que obliga a ordenar en una tabla temporal
+        queryset = queryset.filter(nombre__gte=nombre).exclude(nombre=nombre, id__lte=producto_id)
+    return queryset
+
+
+def paginar_keyset(queryset, cursor=None, tamano=50):
+    """
+    Regresa (pagina, siguiente_cursor) con hasta `tamano` elementos
+    posteriores al cursor. siguiente_cursor es None en la última página.
+    """
+    pagina = list(despues_de(queryset, cursor)[:tamano + 1])
+    siguiente = None
+    if len(pagina) > tamano:
+        pagina = pagina[:tamano]
+        ultimo = pagina[-1]
+        siguiente = codificar_cursor(ultimo.nombre, ultimo.id)
+    return pagina, siguiente
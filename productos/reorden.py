@@ -0,0 +1,95 @@
+"""
+Reporte de reorden: productos activos con stock <= stock_mínimo, agrupados
+en agotados y bajos, con una cantidad sugerida de compra.
+
+La velocidad de venta sale de ResumenProductoDiario (unidades de los
+últimos `dias` días), así que el reporte no recorre los detalles de venta.
+La sugerencia cubre `cobertura` días de venta por encima del mínimo:
+    sugerido = stock_minimo + ceil(velocidad * cobertura) - stock
+y siempre alcanza para salir del mínimo.
+"""
+import csv
+import math
+from datetime import timedelta
+
+from django.db import models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Producto, ResumenProductoDiario
+
+DIAS_VENTAS = 30
+DIAS_COBERTURA = 14
+
+GRUPOS = (
+    ('agotado', 'Agotados'),
+    ('bajo', 'Stock bajo'),
+)
+
+
+def productos_por_reordenar(dias=DIAS_VENTAS):
+    """Queryset de productos por reordenar con `vendidas` en los últimos `dias` días"""
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    vendidas = (
+        ResumenProductoDiario.objects
+        .filter(producto=OuterRef('pk'), fecha__gte=desde)
+        .values('producto')
+        .annotate(total=Sum('unidades'))
+        .values('total')
+    )
+    return (
+        Producto.objects
+        .bajo_stock()
+        .filter(activo=True)
+        .only('id', 'codigo_barras', 'nombre', 'stock', 'stock_minimo', 'precio_compra')
+        .annotate(vendidas=Coalesce(Subquery(vendidas, output_field=models.IntegerField()), Value(0)))
+        .order_by('nombre')
+    )
+
+
+def cantidad_sugerida(stock, stock_minimo, velocidad, cobertura=DIAS_COBERTURA):
+    objetivo = max(stock_minimo + math.ceil(velocidad * cobertura), stock_minimo + 1)
+    return max(objetivo - stock, 0)
+
+
+def reporte(dias=DIAS_VENTAS, cobertura=DIAS_COBERTURA):
+    """
+    {'agotado': [...], 'bajo': [...]} con un dict por producto: datos del
+    producto, vendidas, velocidad (unidades/día), dias_restantes, sugerido
+    y costo estimado de la compra.
+    """
+    grupos = {clave: [] for clave, _ in GRUPOS}
+    for producto in productos_por_reordenar(dias):
+        velocidad = producto.vendidas / dias
+        sugerido = cantidad_sugerida(producto.stock, producto.stock_minimo, velocidad, cobertura)
+        grupos['agotado' if producto.stock == 0 else 'bajo'].append({
+            'id': producto.id,
+            'codigo_barras': producto.codigo_barras,
+            'nombre': producto.nombre,
+            'stock': producto.stock,
+            'stock_minimo': producto.stock_minimo,
+            'vendidas': producto.vendidas,
+            'velocidad': round(velocidad, 2),
+            'dias_restantes': round(producto.stock / velocidad, 1) if velocidad else None,
+            'sugerido': sugerido,
+            'costo_estimado': sugerido * producto.precio_compra,
+        })
+    # Primero lo que más se vende / lo que antes se acaba
+    grupos['agotado'].sort(key=lambda fila: -fila['velocidad'])
+    grupos['bajo'].sort(key=lambda fila: (fila['dias_restantes'] is None, fila['dias_restantes'] or 0))
+    return grupos
+
+
+COLUMNAS_CSV = (
+    'codigo_barras', 'nombre', 'stock', 'stock_minimo', 'vendidas',
+    'velocidad', 'dias_restantes', 'sugerido', 'costo_estimado',
+)
+
+
+def escribir_csv(archivo, grupos):
+    escritor = csv.writer(archivo)
+    escritor.writerow(('grupo',) + COLUMNAS_CSV)
+    for clave, _ in GRUPOS:
+        for fila in grupos[clave]:
+            escritor.writerow([clave] + ['' if fila[columna] is None else fila[columna] for columna in COLUMNAS_CSV])
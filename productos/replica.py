@@ -0,0 +1,131 @@
+"""
+Lecturas en la réplica.
+
+Los reportes, las exportaciones y las listas del admin leen mucho y no
+necesitan el último segundo de datos; dentro de lecturas_replica() el
+router (routers.ReplicaRouter) manda sus consultas de solo lectura al alias
+PRODUCTOS_REPLICA_DB. Todo lo demás, incluido el checkout, usa la primaria.
+
+Lee lo que escribiste: en cuanto la petición escribe algo, el resto de sus
+lecturas va a la primaria. ReplicaMiddleware además deja una cookie por
+SEGUNDOS_FIJADO segundos para que la siguiente petición (el redirect
+después de guardar en el admin) tampoco lea una réplica atrasada.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+COOKIE_FIJADO = 'pos_primaria'
+SEGUNDOS_FIJADO = 30
+
+_usar_replica = ContextVar('usar_replica', default=False)
+_fijada = ContextVar('fijada_primaria', default=False)
+_escribio = ContextVar('escribio', default=False)
+# Sólo dentro de ReplicaMiddleware: fuera de una petición (comandos, hilos
+# de run_workers) nadie restablecería la fijación
+_en_peticion = ContextVar('en_peticion', default=False)
+
+
+def alias_replica():
+    return getattr(settings, 'PRODUCTOS_REPLICA_DB', None)
+
+
+@contextmanager
+def lecturas_replica():
+    """Contexto (o decorador) cuyas lecturas de productos van a la réplica"""
+    token = _usar_replica.set(True)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+
+def en_replica(iterable):
+    """Recorre un generador (p. ej. de una respuesta en streaming) leyendo de la réplica"""
+    with lecturas_replica():
+        yield from iterable
+
+
+def usar_replica():
+    if not alias_replica() or not _usar_replica.get() or _fijada.get():
+        return False
+    # Dentro de una transacción de la primaria se leen sus propios cambios
+    return not connections['default'].in_atomic_block
+
+
+def fijar_primaria():
+    """Lee lo que escribiste: el resto de la petición (y las siguientes) va a la primaria"""
+    if not _en_peticion.get():
+        return
+    _fijada.set(True)
+    _escribio.set(True)
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        tokens = self._iniciar(request)
+        try:
+            response = self.get_response(request)
+            self._fijar_siguientes(response)
+        finally:
+            self._terminar(tokens)
+        return response
+
+    async def _acall(self, request):
+        tokens = self._iniciar(request)
+        try:
+            response = await self.get_response(request)
+            self._fijar_siguientes(response)
+        finally:
+            self._terminar(tokens)
+        return response
+
+    def _iniciar(self, request):
+        return (
+            _fijada.set(COOKIE_FIJADO in request.COOKIES),
+            _escribio.set(False),
+            _en_peticion.set(True),
+        )
+
+    def _terminar(self, tokens):
+        _fijada.reset(tokens[0])
+        _escribio.reset(tokens[1])
+        _en_peticion.reset(tokens[2])
+
+    def _fijar_siguientes(self, response):
+        if _escribio.get() and alias_replica():
+            response.set_cookie(
+                COOKIE_FIJADO, '1',
+                max_age=getattr(settings, 'PRODUCTOS_REPLICA_SEGUNDOS_FIJADO', SEGUNDOS_FIJADO),
+                httponly=True, samesite='Lax',
+            )
+
+
+class LecturaReplicaAdminMixin:
+    """
+    La lista del admin (GET) lee de la réplica; las acciones y list_editable
+    (POST) escriben y leen en la primaria.
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in ('GET', 'HEAD'):
+            return super().changelist_view(request, extra_context)
+        with lecturas_replica():
+            response = super().changelist_view(request, extra_context)
+            # TemplateResponse evalúa los querysets al renderizar: hacerlo aquí dentro
+            if hasattr(response, 'render'):
+                response.render()
+        return response
@@ -0,0 +1,201 @@
+"""
+Tablas de resumen de ventas por día y por producto-día.
+
+aplicar_ventas(ids, +1) suma la contribución de esas ventas y
+aplicar_ventas(ids, -1) la resta. Venta.resumida registra si la venta ya
+está sumada, en la misma transacción que cambia los resúmenes, así que
+ambas operaciones son idempotentes por venta:
+
+- El checkout no las suma: encola tareas.aplicar_resumenes, que corre en
+  run_workers. Hasta entonces la venta no aparece en los reportes.
+- Cancelar, editar o borrar una venta (servicios.cambiar_estado, admin)
+  resta sólo si ya estaba sumada y vuelve a sumar en la misma transacción;
+  el trabajo que llegue después la encuentra sumada (o borrada) y no hace
+  nada.
+
+reconstruir() recalcula un rango de fechas desde los detalles, marca sus
+ventas completadas como resumidas y es idempotente.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DetalleVenta, ResumenProductoDiario, ResumenVentasDiario, Venta
+
+CERO = Decimal('0.00')
+DECIMAL = models.DecimalField(max_digits=14, decimal_places=2)
+
+
+def _totales_por_producto(detalles):
+    """Agrupa los detalles por (día local, producto) con unidades, ingresos y costo"""
+    return (
+        detalles
+        .annotate(dia=TruncDate('venta__fecha'))
+        .values('dia', 'producto_id')
+        .annotate(
+            unidades=Sum('cantidad'),
+            ingresos=Sum('subtotal'),
+            costo=Sum(
+                F('cantidad') * Coalesce('costo_unitario', 'producto__precio_compra'),
+                output_field=DECIMAL,
+            ),
+        )
+        .order_by()
+    )
+
+
+def _ventas_por_dia(ventas):
+    return (
+        ventas
+        .annotate(dia=TruncDate('fecha'))
+        .values('dia')
+        .annotate(num_ventas=Count('id'))
+        .order_by()
+    )
+
+
+def _incremento(campo, valores, signo, output_field=DECIMAL):
+    """F(campo) + CASE producto_id WHEN x THEN valor ... END"""
+    return F(campo) + Case(
+        *[When(producto_id=k, then=Value(signo * v)) for k, v in valores.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def aplicar_ventas(venta_ids, signo=1):
+    """
+    Suma (signo=1) las ventas indicadas que están completadas y sin sumar,
+    o resta (signo=-1) las que están sumadas, y actualiza Venta.resumida.
+    Las demás se ignoran.
+    """
+    venta_ids = list(venta_ids)
+    if not venta_ids:
+        return
+
+    with transaction.atomic():
+        candidatas = Venta.objects.filter(id__in=venta_ids, resumida=signo < 0)
+        if signo > 0:
+            candidatas = candidatas.filter(estado='completada')
+        venta_ids = list(candidatas.select_for_update().values_list('id', flat=True))
+        if not venta_ids:
+            return
+        _aplicar(venta_ids, signo)
+        Venta.objects.filter(id__in=venta_ids).update(resumida=signo > 0)
+
+
+def _aplicar(venta_ids, signo):
+    productos = list(_totales_por_producto(DetalleVenta.objects.filter(venta_id__in=venta_ids)))
+    dias = list(_ventas_por_dia(Venta.objects.filter(id__in=venta_ids)))
+
+    por_dia = defaultdict(lambda: {'num_ventas': 0, 'unidades': 0, 'ingresos': CERO, 'costo': CERO})
+    for fila in dias:
+        por_dia[fila['dia']]['num_ventas'] = fila['num_ventas']
+    por_producto = defaultdict(dict)
+    for fila in productos:
+        fila['costo'] = fila['costo'] or CERO
+        por_producto[fila['dia']][fila['producto_id']] = fila
+        acumulado = por_dia[fila['dia']]
+        acumulado['unidades'] += fila['unidades']
+        acumulado['ingresos'] += fila['ingresos']
+        acumulado['costo'] += fila['costo']
+
+    with transaction.atomic():
+        ResumenVentasDiario.objects.bulk_create(
+            [ResumenVentasDiario(fecha=dia) for dia in por_dia],
+            ignore_conflicts=True,
+        )
+        ResumenProductoDiario.objects.bulk_create(
+            [
+                ResumenProductoDiario(fecha=dia, producto_id=producto_id)
+                for dia, filas in por_producto.items()
+                for producto_id in filas
+            ],
+            ignore_conflicts=True,
+        )
+
+        for dia, totales in por_dia.items():
+            margen = totales['ingresos'] - totales['costo']
+            ResumenVentasDiario.objects.filter(fecha=dia).update(
+                num_ventas=F('num_ventas') + signo * totales['num_ventas'],
+                unidades=F('unidades') + signo * totales['unidades'],
+                ingresos=F('ingresos') + signo * totales['ingresos'],
+                costo=F('costo') + signo * totales['costo'],
+                margen=F('margen') + signo * margen,
+            )
+
+        for dia, filas in por_producto.items():
+            unidades = {k: f['unidades'] for k, f in filas.items()}
+            ingresos = {k: f['ingresos'] for k, f in filas.items()}
+            costo = {k: f['costo'] for k, f in filas.items()}
+            margen = {k: f['ingresos'] - f['costo'] for k, f in filas.items()}
+            ResumenProductoDiario.objects.filter(fecha=dia, producto_id__in=filas).update(
+                unidades=_incremento('unidades', unidades, signo, models.IntegerField()),
+                ingresos=_incremento('ingresos', ingresos, signo),
+                costo=_incremento('costo', costo, signo),
+                margen=_incremento('margen', margen, signo),
+            )
+
+
+def limites(desde, hasta):
+    """Datetimes locales [desde 00:00, hasta+1 00:00) para filtrar Venta.fecha"""
+    zona = timezone.get_current_timezone()
+    inicio = timezone.make_aware(datetime.combine(desde, time.min), zona)
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min), zona)
+    return inicio, fin
+
+
+def reconstruir(desde, hasta):
+    """
+    Recalcula los resúmenes de [desde, hasta] a partir de las ventas
+    completadas y las marca como resumidas. Regresa (días, filas de
+    producto) escritos.
+    """
+    inicio, fin = limites(desde, hasta)
+    with transaction.atomic():
+        en_rango = Venta.objects.filter(fecha__gte=inicio, fecha__lt=fin)
+        # Se marcan antes de sumar: una venta que se confirme después queda sin
+        # marcar y fuera de la suma, y su trabajo aplicar_resumenes la agrega
+        en_rango.exclude(estado='completada').update(resumida=False)
+        en_rango.filter(estado='completada').update(resumida=True)
+        return _reconstruir(desde, hasta, en_rango.filter(estado='completada', resumida=True))
+
+
+def _reconstruir(desde, hasta, ventas):
+    detalles = DetalleVenta.objects.filter(venta__in=ventas)
+
+    por_dia = {}
+    for fila in _ventas_por_dia(ventas):
+        por_dia[fila['dia']] = ResumenVentasDiario(
+            fecha=fila['dia'], num_ventas=fila['num_ventas'], ingresos=CERO, costo=CERO,
+        )
+
+    resumenes_producto = []
+    for fila in _totales_por_producto(detalles).iterator(chunk_size=2000):
+        costo = fila['costo'] or CERO
+        resumenes_producto.append(ResumenProductoDiario(
+            fecha=fila['dia'],
+            producto_id=fila['producto_id'],
+            unidades=fila['unidades'],
+            ingresos=fila['ingresos'],
+            costo=costo,
+            margen=fila['ingresos'] - costo,
+        ))
+        dia = por_dia[fila['dia']]
+        dia.unidades += fila['unidades']
+        dia.ingresos += fila['ingresos']
+        dia.costo += costo
+    for dia in por_dia.values():
+        dia.margen = dia.ingresos - dia.costo
+
+    ResumenVentasDiario.objects.filter(fecha__range=(desde, hasta)).delete()
+    ResumenProductoDiario.objects.filter(fecha__range=(desde, hasta)).delete()
+    ResumenVentasDiario.objects.bulk_create(por_dia.values())
+    ResumenProductoDiario.objects.bulk_create(resumenes_producto, batch_size=1000)
+
+    return len(por_dia), len(resumenes_producto)
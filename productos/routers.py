@@ -0,0 +1,88 @@
+"""
+Routers de base de datos.
+
+ArchivoRouter: las ventas archivadas (VentaArchivada y DetalleVentaArchivada)
+se leen y escriben en el alias PRODUCTOS_ARCHIVO_DB; todo lo demás en
+'default'. Sin ese ajuste el alias es 'default' y las tablas de archivo
+quedan junto a las demás, lo que ya mantiene chicas ventas_venta y
+ventas_detalleventa.
+
+ReplicaRouter: dentro de replica.lecturas_replica() las lecturas de los
+modelos de productos van a PRODUCTOS_REPLICA_DB (ver replica.py). Sesiones
+y usuarios siempre se leen de la primaria: una réplica atrasada no debe
+cerrar la sesión de nadie. Tampoco las versiones de caché (VersionCache):
+una versión atrasada volvería a servir datos viejos.
+"""
+from django.conf import settings
+
+from . import replica
+
+MODELOS_ARCHIVO = {'ventaarchivada', 'detalleventaarchivada'}
+MODELOS_PRIMARIA = {'versioncache'}
+
+
+def alias_archivo():
+    return getattr(settings, 'PRODUCTOS_ARCHIVO_DB', 'default')
+
+
+def es_archivo(model):
+    return model._meta.app_label == 'productos' and model._meta.model_name in MODELOS_ARCHIVO
+
+
+class ArchivoRouter:
+    def db_for_read(self, model, **hints):
+        if es_archivo(model):
+            return alias_archivo()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if es_archivo(model):
+            return alias_archivo()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if es_archivo(obj1) or es_archivo(obj2):
+            # Entre modelos de archivo sí; con el resto sólo si comparten base
+            return es_archivo(obj1) == es_archivo(obj2) or alias_archivo() == 'default'
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        archivo = alias_archivo()
+        if archivo == 'default':
+            return None
+        if app_label == 'productos' and model_name in MODELOS_ARCHIVO:
+            return db == archivo
+        # La base de archivo sólo lleva las tablas de archivo
+        if db == archivo:
+            return False
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'productos' or model._meta.model_name in MODELOS_PRIMARIA:
+            return None
+        if not replica.usar_replica():
+            return None
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            # Relaciones de un objeto ya cargado: de la misma base que él
+            return instancia._state.db
+        return replica.alias_replica()
+
+    def db_for_write(self, model, **hints):
+        replica.fijar_primaria()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica es una copia de 'default': sus objetos se pueden mezclar
+        bases = {'default', replica.alias_replica()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # El esquema llega a la réplica con la copia (o la replicación)
+        if db == replica.alias_replica():
+            return False
+        return None
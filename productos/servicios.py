@@ -0,0 +1,248 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import escaner, inventario, resumenes, trabajos, turnos
+from .models import Producto, Venta, DetalleVenta
+
+
+# Ventas por transacción al procesar un lote
+TAMANO_CHUNK = 20
+LONGITUD_CLAVE = 64
+
+
+def clave_valida(clave):
+    """La clave de idempotencia debe ser texto no vacío de hasta LONGITUD_CLAVE caracteres"""
+    return isinstance(clave, str) and 0 < len(clave) <= LONGITUD_CLAVE
+
+
+def _positivo(valor, tipo):
+    """valor convertido con tipo si es un número mayor que cero; None si no"""
+    if isinstance(valor, bool):
+        return None
+    try:
+        numero = tipo(str(valor))
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    return numero if numero > 0 else None
+
+
+def validar_items(items):
+    """Regresa la lista de errores de estructura del carrito"""
+    if not items:
+        return ['El carrito está vacío']
+    if not isinstance(items, list):
+        return ['Formato de carrito inválido']
+    
+    errores = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            errores.append(f'Item {idx + 1}: formato inválido')
+            continue
+        if _positivo(item.get('producto_id'), int) is None:
+            errores.append(f'Item {idx + 1}: ID de producto faltante')
+        if _positivo(item.get('cantidad'), int) is None:
+            errores.append(f'Item {idx + 1}: Cantidad inválida')
+        if _positivo(item.get('precio_unitario'), Decimal) is None:
+            errores.append(f'Item {idx + 1}: Precio inválido')
+    return errores
+
+
+def agrupar_items(items):
+    """
+    Agrupa las líneas del carrito por producto (cantidad acumulada). Lanza
+    ValueError si un producto aparece con precios distintos: cobrar uno solo
+    cambiaría el total que envió la terminal.
+    """
+    agrupados = {}
+    for item in items:
+        producto_id = int(item['producto_id'])
+        cantidad = int(item['cantidad'])
+        precio_unitario = Decimal(str(item['precio_unitario']))
+        if producto_id in agrupados:
+            if agrupados[producto_id]['precio_unitario'] != precio_unitario:
+                raise ValueError(f'Producto ID {producto_id} con precios distintos en el carrito')
+            agrupados[producto_id]['cantidad'] += cantidad
+        else:
+            agrupados[producto_id] = {
+                'cantidad': cantidad,
+                'precio_unitario': precio_unitario,
+            }
+    return agrupados
+
+
+def procesar_checkout(items, clave_idempotencia=None, cajero=None, turno_id=None):
+    """
+    Registra una venta completa con un número fijo de consultas:
+    un SELECT ... FOR UPDATE de todos los productos, un INSERT de la venta,
+    un UPDATE de los contadores del turno de caja (si hay turno), un
+    bulk_create de los detalles, un bulk_create de los movimientos de
+    inventario y un UPDATE condicional del stock.
+    Regresa la venta y sus detalles. Lanza ValueError si algún producto
+    no existe o no tiene stock suficiente o si el turno ya se cerró, e
+    IntegrityError si ya existe una venta con la misma clave de idempotencia.
+    """
+    agrupados = agrupar_items(items)
+
+    with transaction.atomic():
+        productos = (
+            Producto.objects
+            .select_for_update()
+            .only('id', 'nombre', 'codigo_barras', 'stock', 'precio_compra')
+            .in_bulk(list(agrupados))
+        )
+
+        for producto_id, linea in agrupados.items():
+            producto = productos.get(producto_id)
+            if producto is None:
+                raise ValueError(f'Producto ID {producto_id} no encontrado')
+            if producto.stock < linea['cantidad']:
+                raise ValueError(
+                    f'Stock insuficiente para {producto.nombre}. '
+                    f'Disponible: {producto.stock}, Solicitado: {linea["cantidad"]}'
+                )
+
+        total = sum(
+            (linea['cantidad'] * linea['precio_unitario'] for linea in agrupados.values()),
+            Decimal('0.00'),
+        )
+        venta = Venta.objects.create(
+            estado='completada',
+            total=total,
+            clave_idempotencia=clave_idempotencia or None,
+            cajero=cajero,
+            turno_id=turno_id,
+        )
+        if turno_id:
+            turnos.registrar_venta(turno_id, venta.estado, total)
+
+        detalles = [
+            DetalleVenta(
+                venta=venta,
+                producto_id=producto_id,
+                cantidad=linea['cantidad'],
+                precio_unitario=linea['precio_unitario'],
+                subtotal=linea['cantidad'] * linea['precio_unitario'],
+                costo_unitario=productos[producto_id].precio_compra,
+            )
+            for producto_id, linea in agrupados.items()
+        ]
+        DetalleVenta.objects.bulk_create(detalles)
+
+        cantidades = {producto_id: linea['cantidad'] for producto_id, linea in agrupados.items()}
+        if inventario.descontar_stock(cantidades) != len(cantidades):
+            # Otro cajero vendió el mismo producto entre la lectura y el UPDATE
+            raise ValueError('Stock insuficiente: el inventario cambió durante la venta')
+        inventario.registrar(
+            'venta',
+            {producto_id: -cantidad for producto_id, cantidad in cantidades.items()},
+            venta_id=venta.id,
+        )
+
+        # El stock cambió sin pasar por save(): invalidar la caché del lector
+        codigos = [producto.codigo_barras for producto in productos.values()]
+        transaction.on_commit(lambda: escaner.invalidar(*codigos))
+        # Resúmenes, ticket y avisos de stock corren fuera de la petición (run_workers)
+        trabajos.encolar('post_venta', venta_id=venta.id)
+
+    return venta, detalles
+
+
+def cambiar_estado(ventas, estado):
+    """
+    Cambia el estado de las ventas del queryset y ajusta los resúmenes
+    diarios, los turnos de caja y el inventario: las que pasan a completada suman y descuentan
+    stock, las completadas que se cancelan (o regresan a pendiente) restan
+    y devuelven el stock. Regresa las ventas cambiadas; lanza ValueError
+    (sin cambiar nada) si no hay stock para completar alguna o si alguna es
+    de un turno de caja cerrado.
+    """
+    with transaction.atomic():
+        cambios = dict(
+            ventas
+            .exclude(estado=estado)
+            .select_for_update()
+            .values_list('id', 'estado')
+        )
+        if not cambios:
+            return 0
+        
+        turnos.verificar_abiertos(cambios)
+        turnos.aplicar_ventas(cambios, -1)
+        Venta.objects.filter(id__in=cambios).update(estado=estado, fecha_actualizacion=timezone.now())
+        turnos.aplicar_ventas(cambios, 1)
+        if estado == 'completada':
+            inventario.descontar_ventas(cambios)
+            resumenes.aplicar_ventas(cambios, 1)
+        else:
+            completadas = [venta_id for venta_id, anterior in cambios.items() if anterior == 'completada']
+            inventario.devolver_ventas(completadas)
+            resumenes.aplicar_ventas(completadas, -1)
+    return len(cambios)
+
+
+def procesar_lote(ventas, tamano_chunk=TAMANO_CHUNK, cajero=None, turno_id=None):
+    """
+    Procesa varias ventas con clave de idempotencia. Cada chunk corre en una
+    transacción y cada venta en su propio savepoint, así una venta con error
+    no descarta las demás. Las claves ya registradas se reportan como
+    'duplicada' sin volver a descontar stock.
+    Regresa un resultado por venta, en el mismo orden.
+    """
+    resultados = []
+    for inicio in range(0, len(ventas), tamano_chunk):
+        chunk = ventas[inicio:inicio + tamano_chunk]
+        claves = [
+            datos['clave_idempotencia'] for datos in chunk
+            if isinstance(datos, dict) and clave_valida(datos.get('clave_idempotencia'))
+        ]
+        existentes = dict(
+            Venta.objects
+            .filter(clave_idempotencia__in=claves)
+            .values_list('clave_idempotencia', 'id')
+        )
+        
+        with transaction.atomic():
+            for datos in chunk:
+                resultados.append(_procesar_venta_lote(datos, existentes, cajero, turno_id))
+    return resultados
+
+
+def _procesar_venta_lote(datos, existentes, cajero, turno_id):
+    if not isinstance(datos, dict):
+        return {'clave_idempotencia': None, 'estado': 'error', 'error': 'Formato de venta inválido'}
+    clave = datos.get('clave_idempotencia')
+    resultado = {'clave_idempotencia': clave}
+    
+    if not clave_valida(clave):
+        resultado.update(estado='error', error='Clave de idempotencia inválida')
+        return resultado
+    if clave in existentes:
+        resultado.update(estado='duplicada', venta_id=existentes[clave])
+        return resultado
+    
+    errores = validar_items(datos.get('items'))
+    if errores:
+        resultado.update(estado='error', error=', '.join(errores))
+        return resultado
+    
+    try:
+        venta, detalles = procesar_checkout(datos['items'], clave, cajero, turno_id)
+    except ValueError as e:
+        resultado.update(estado='error', error=str(e))
+        return resultado
+    except IntegrityError:
+        # Otra petición registró la misma clave al mismo tiempo
+        venta_id = Venta.objects.filter(clave_idempotencia=clave).values_list('id', flat=True).first()
+        resultado.update(estado='duplicada', venta_id=venta_id)
+        return resultado
+    
+    existentes[clave] = venta.id
+    resultado.update(
+        estado='creada',
+        venta_id=venta.id,
+        total=str(venta.total),
+        cantidad_items=len(detalles),
+    )
+    return resultado
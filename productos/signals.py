@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import catalogo, escaner, imagenes, inventario, typeahead
+from .busqueda import obtener_backend
+from .models import Producto, ProductoEliminado
+
+
+@receiver(pre_save, sender=Producto)
+def recordar_valores_anteriores(sender, instance, **kwargs):
+    """Guarda el código, la imagen y el stock anteriores para detectar cambios"""
+    instance._codigo_barras_anterior = None
+    instance._imagen_anterior = None
+    instance._stock_anterior = None
+    if instance.pk:
+        anterior = (
+            Producto.objects
+            .filter(pk=instance.pk)
+            .values_list('codigo_barras', 'imagen', 'stock')
+            .first()
+        )
+        if anterior is not None:
+            (
+                instance._codigo_barras_anterior,
+                instance._imagen_anterior,
+                instance._stock_anterior,
+            ) = anterior
+
+
+@receiver(post_save, sender=Producto)
+def invalidar_escaner(sender, instance, **kwargs):
+    # Después del commit: antes, un escaneo concurrente volvería a guardar la fila vieja
+    codigos = (instance.codigo_barras, getattr(instance, '_codigo_barras_anterior', None))
+    transaction.on_commit(lambda: escaner.invalidar(*codigos))
+
+
+@receiver(post_delete, sender=Producto)
+def invalidar_escaner_borrado(sender, instance, **kwargs):
+    codigo = instance.codigo_barras
+    transaction.on_commit(lambda: escaner.invalidar(codigo))
+
+
+@receiver(post_delete, sender=Producto)
+def registrar_eliminado(sender, instance, **kwargs):
+    """Deja la baja para las terminales: la fila del producto ya no existe"""
+    ProductoEliminado.objects.create(producto_id=instance.pk)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_catalogo(sender, instance, **kwargs):
+    # Después del commit, para que los demás procesos reconstruyan con el cambio
+    catalogo.invalidar()
+    typeahead.invalidar()
+
+
+@receiver(post_save, sender=Producto)
+def registrar_movimiento_stock(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Un cambio de stock hecho con save() (alta, formulario o list_editable
+    del admin) queda en la bitácora como entrada o ajuste. El usuario se
+    toma de instance._usuario_movimiento si quien guarda lo asignó.
+    """
+    if raw or (update_fields is not None and 'stock' not in update_fields):
+        return
+    anterior = 0 if created else getattr(instance, '_stock_anterior', None)
+    if anterior is None or instance.stock == anterior:
+        return
+    inventario.registrar(
+        'entrada' if created else 'ajuste',
+        {instance.pk: instance.stock - anterior},
+        usuario=getattr(instance, '_usuario_movimiento', None),
+    )
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    """Mantiene el índice de búsqueda al día con cada cambio de producto"""
+    obtener_backend().indexar([instance])
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    obtener_backend().eliminar([instance.pk])
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_miniaturas(sender, instance, **kwargs):
+    """Regenera las miniaturas cuando la imagen cambia y borra las anteriores"""
+    anterior = getattr(instance, '_imagen_anterior', None) or ''
+    actual = instance.imagen.name or ''
+    if anterior == actual:
+        return
+    if anterior:
+        imagenes.borrar_derivadas(anterior, instance.imagen.storage)
+    # Si Pillow no pudo abrirla las plantillas sirven el original
+    instance.miniaturas = bool(actual and imagenes.generar_derivadas(actual, instance.imagen.storage))
+    Producto.objects.filter(pk=instance.pk).update(miniaturas=instance.miniaturas)
+
+
+@receiver(post_delete, sender=Producto)
+def borrar_miniaturas(sender, instance, **kwargs):
+    if instance.imagen:
+        imagenes.borrar_derivadas(instance.imagen.name, instance.imagen.storage)
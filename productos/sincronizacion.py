@@ -0,0 +1,144 @@
+"""
+Sincronización incremental del catálogo para las terminales del POS.
+
+La primera petición (sin cursor) regresa una copia completa de los productos
+activos; las siguientes sólo los productos modificados después del cursor
+(fecha_actualizacion, id). Los productos desactivados se envían como bajas
+para que la terminal los quite de su copia local, igual que los borrados,
+que se toman de ProductoEliminado con el mismo cursor.
+"""
+import base64
+import hashlib
+import json
+from datetime import timedelta
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Producto, ProductoEliminado
+
+VERSION = 1
+TAMANO_LOTE = 1000
+# Cambios más recientes que esto todavía pueden pertenecer a una transacción
+# sin confirmar con una fecha anterior; se entregan en la siguiente consulta.
+MARGEN = timedelta(seconds=2)
+
+CAMPOS = ('id', 'codigo_barras', 'nombre', 'precio_venta', 'stock', 'activo', 'fecha_actualizacion')
+
+
+def codificar_cursor(fecha, producto_id):
+    datos = json.dumps([VERSION, fecha.isoformat(), producto_id]).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Regresa (fecha, id) o None si el cursor no es válido o de otra versión"""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        version, fecha, producto_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        fecha = parse_datetime(fecha)
+    except (ValueError, TypeError):
+        return None
+    if version != VERSION or fecha is None:
+        return None
+    return fecha, int(producto_id)
+
+
+def _limite():
+    return timezone.now() - MARGEN
+
+
+def cambios(cursor=None, limite=None):
+    """Queryset de productos a enviar después del cursor, en orden de cursor"""
+    productos = Producto.objects.filter(fecha_actualizacion__lt=limite or _limite())
+    posicion = decodificar_cursor(cursor)
+    if posicion is None:
+        # Copia completa: las bajas no interesan a una terminal vacía
+        productos = productos.filter(activo=True)
+    else:
+        fecha, producto_id = posicion
+        # Misma forma que paginacion.paginar_keyset: un rango del índice, sin OR
+        productos = (
+            productos
+            .filter(fecha_actualizacion__gte=fecha)
+            .exclude(fecha_actualizacion=fecha, id__lte=producto_id)
+        )
+    return productos.order_by('fecha_actualizacion', 'id')
+
+
+def borrados(cursor=None, limite=None):
+    """Queryset de productos borrados después del cursor, en orden de cursor"""
+    posicion = decodificar_cursor(cursor)
+    if posicion is None:
+        return ProductoEliminado.objects.none()
+    fecha, producto_id = posicion
+    return (
+        ProductoEliminado.objects
+        .filter(fecha_eliminacion__lt=limite or _limite(), fecha_eliminacion__gte=fecha)
+        .exclude(fecha_eliminacion=fecha, producto_id__lte=producto_id)
+        .order_by('fecha_eliminacion', 'producto_id')
+    )
+
+
+def etag(cursor=None):
+    """ETag de la respuesta para el cursor, sin cargar los productos"""
+    limite = _limite()
+    partes = [str(VERSION), str(cursor)]
+    for queryset, campo in (
+        (cambios(cursor, limite), 'fecha_actualizacion'),
+        (borrados(cursor, limite), 'fecha_eliminacion'),
+    ):
+        resumen = queryset.aggregate(ultima=Max(campo), total=Count('id'))
+        if resumen['total'] == 0:
+            partes.append('vacio')
+        else:
+            partes.append(f"{resumen['ultima'].isoformat()}:{resumen['total']}")
+    return hashlib.sha1(':'.join(partes).encode()).hexdigest()
+
+
+def obtener_lote(cursor=None, tamano=TAMANO_LOTE):
+    """Siguiente lote de cambios con su cursor de continuación"""
+    # Un solo límite para ambas consultas: con dos, un borrado entre ellos
+    # podría quedar detrás del cursor sin haberse entregado
+    limite = _limite()
+    filas = list(cambios(cursor, limite).values(*CAMPOS)[:tamano + 1])
+    filas.extend(
+        {'id': producto_id, 'activo': False, 'fecha_actualizacion': fecha}
+        for producto_id, fecha in borrados(cursor, limite).values_list(
+            'producto_id', 'fecha_eliminacion',
+        )[:tamano + 1]
+    )
+    filas.sort(key=lambda fila: (fila['fecha_actualizacion'], fila['id']))
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+
+    productos = []
+    eliminados = []
+    for fila in filas:
+        if fila['activo']:
+            productos.append({
+                'id': fila['id'],
+                'codigo_barras': fila['codigo_barras'],
+                'nombre': fila['nombre'],
+                'precio_venta': str(fila['precio_venta']),
+                'stock': fila['stock'],
+            })
+        else:
+            eliminados.append(fila['id'])
+
+    if filas:
+        nuevo_cursor = codificar_cursor(filas[-1]['fecha_actualizacion'], filas[-1]['id'])
+    else:
+        nuevo_cursor = cursor
+
+    return {
+        'version': VERSION,
+        'completo': decodificar_cursor(cursor) is None,
+        'productos': productos,
+        'eliminados': eliminados,
+        'cursor': nuevo_cursor,
+        'hay_mas': hay_mas,
+    }
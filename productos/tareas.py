@@ -0,0 +1,63 @@
+"""
+Tareas en segundo plano (ver trabajos.py).
+
+El checkout sólo registra la venta y el stock, y al confirmar encola un
+único trabajo post_venta; éste reparte el resto (resúmenes, ticket, avisos
+de stock) en trabajos separados para que cada uno se reintente solo.
+"""
+import logging
+
+from django.http import Http404
+
+from . import resumenes, tickets
+from .models import Producto
+from .trabajos import encolar, tarea
+
+logger = logging.getLogger('productos.inventario')
+
+
+@tarea()
+def post_venta(venta_id):
+    encolar('aplicar_resumenes', clave=f'resumenes:venta:{venta_id}', venta_ids=[venta_id])
+    encolar('prerenderizar_ticket', clave=f'ticket:{venta_id}', venta_id=venta_id)
+    bajos = (
+        Producto.objects
+        .filter(ventas__venta_id=venta_id, activo=True)
+        .bajo_stock()
+        .values_list('id', flat=True)
+    )
+    for producto_id in bajos:
+        # Uno por producto mientras el aviso anterior no haya corrido
+        encolar('avisar_bajo_stock', clave=f'bajo_stock:{producto_id}', producto_id=producto_id)
+
+
+@tarea()
+def aplicar_resumenes(venta_ids):
+    """
+    Suma las ventas a los resúmenes diarios. Las que ya se sumaron (p. ej.
+    al editarlas en el admin), se cancelaron o se borraron antes de que
+    corriera el trabajo se ignoran (Venta.resumida).
+    """
+    resumenes.aplicar_ventas(venta_ids, 1)
+
+
+@tarea(max_intentos=2)
+def prerenderizar_ticket(venta_id):
+    """Deja el ticket HTML en caché para imprimirlo sin esperar el render"""
+    try:
+        version = tickets.version(venta_id)
+    except Http404:
+        # La venta se borró antes de que corriera el trabajo
+        return
+    tickets.obtener(venta_id, version, 'html')
+
+
+@tarea()
+def avisar_bajo_stock(producto_id):
+    """Reporta en el log productos.inventario un producto que sigue en o bajo el mínimo"""
+    producto = Producto.objects.bajo_stock().filter(id=producto_id, activo=True).first()
+    if producto is not None:
+        logger.warning(
+            'Producto %s (%s) con stock bajo: %d (mínimo %d)',
+            producto.nombre, producto.codigo_barras, producto.stock, producto.stock_minimo,
+        )
@@ -0,0 +1,16 @@
+from django import template
+
+from productos.imagenes import fuentes
+
+register = template.Library()
+
+
+@register.inclusion_tag('productos/includes/imagen_producto.html')
+def imagen_producto(producto, tamano=200, sizes=None):
+    """<picture> con derivadas WebP/JPEG de la imagen del producto (o el original)"""
+    return {
+        'alt': producto.nombre,
+        **fuentes(producto.imagen, producto.miniaturas, tamano),
+        'sizes': sizes or f'{tamano}px',
+        'tamano': tamano,
+    }
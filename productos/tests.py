@@ -1,3 +1,1517 @@
-from django.test import TestCase
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    archivo, auditoria, catalogo, escaner, exportacion, imagenes, importacion, inventario, metricas, models,
+    paginacion, reorden, replica, sincronizacion, tickets, trabajos, turnos, typeahead,
+)
+from .models import (
+    DetalleVenta, DetalleVentaArchivada, MovimientoInventario, Producto, ProductoEliminado,
+    ResumenProductoDiario, ResumenVentasDiario, SnapshotInventario, Trabajo, TurnoCaja, Venta, VentaArchivada,
+)
+from .busqueda import FTS5Backend, obtener_backend
+from .servicios import cambiar_estado, procesar_checkout
+
+
+class PresupuestoConsultasAdminTest(TestCase):
+    """Ningún changelist del admin debe crecer en consultas con el número de filas"""
+
+    # Sesión, usuario, conteos de paginación, filtros y la página en sí
+    MAXIMO_CONSULTAS = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        productos = [
+            Producto.objects.create(
+                codigo_barras=f'750100000{i:04d}',
+                nombre=f'Producto {i}',
+                precio_compra=10,
+                precio_venta=15,
+                stock=1000,
+            )
+            for i in range(30)
+        ]
+        for i in range(30):
+            procesar_checkout([
+                {'producto_id': productos[i].id, 'cantidad': 1, 'precio_unitario': 15},
+                {'producto_id': productos[(i + 1) % 30].id, 'cantidad': 2, 'precio_unitario': 15},
+            ])
+        cls.admin = User.objects.create_superuser('admin_test', 'admin@ejemplo.com', 'admin123')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertPresupuesto(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(
+            len(consultas),
+            self.MAXIMO_CONSULTAS,
+            f'{url} ejecutó {len(consultas)} consultas:\n' +
+            '\n'.join(q['sql'] for q in consultas.captured_queries)
+        )
+
+    def test_changelists(self):
+        for modelo in admin.site._registry:
+            url = reverse(f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}_changelist')
+            with self.subTest(modelo=modelo._meta.label):
+                self.assertPresupuesto(url)
+
+    def test_changelist_ventas_ordenado_por_anotaciones(self):
+        url = reverse('admin:productos_venta_changelist')
+        # Columnas 5 y 6 de list_display: cantidad_items y cantidad_productos
+        for orden in ('5', '-6'):
+            with self.subTest(orden=orden):
+                self.assertPresupuesto(f'{url}?o={orden}')
+
+
+class PlanesConsultaTest(TestCase):
+    """Las consultas registradas en auditoria no deben recorrer tablas ni ordenar en temporales"""
+
+    def test_consultas_usan_indices(self):
+        for nombre, plan, hallazgos in auditoria.auditar():
+            with self.subTest(consulta=nombre):
+                self.assertEqual([], [str(hallazgo) for hallazgo in hallazgos], plan)
+
+
+class CheckoutTest(TestCase):
+    """procesar_venta: cobro, reintentos con la misma clave y carritos inválidos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cajero = User.objects.create_user('cajero_test', password='cajero123')
+        cls.producto = Producto.objects.create(
+            codigo_barras='7501000000001',
+            nombre='Arroz',
+            precio_compra=10,
+            precio_venta=15,
+            stock=10,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.cajero)
+
+    def vender(self, items, clave=None):
+        return self.client.post(
+            reverse('productos:procesar_venta'),
+            json.dumps({'items': items, 'clave_idempotencia': clave}),
+            content_type='application/json',
+        )
+
+    def linea(self, cantidad, precio=15):
+        return {'producto_id': self.producto.id, 'cantidad': cantidad, 'precio_unitario': precio}
+
+    def test_venta_descuenta_stock_y_registra_movimiento(self):
+        response = self.vender([self.linea(2), self.linea(1)])
+        self.assertEqual(response.status_code, 200)
+
+        venta = Venta.objects.get(id=response.json()['venta_id'])
+        self.assertEqual(venta.total, 45)
+        self.assertEqual(venta.cajero, self.cajero)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 7)
+        self.assertEqual(
+            list(MovimientoInventario.objects.filter(venta=venta).values_list('tipo', 'cantidad')),
+            [('venta', -3)],
+        )
+
+    def test_reintento_con_la_misma_clave_no_cobra_dos_veces(self):
+        primera = self.vender([self.linea(2)], clave='terminal-1-0001')
+        segunda = self.vender([self.linea(2)], clave='terminal-1-0001')
+
+        self.assertEqual(segunda.status_code, 200)
+        self.assertFalse(primera.json()['duplicada'])
+        self.assertTrue(segunda.json()['duplicada'])
+        self.assertEqual(primera.json()['venta_id'], segunda.json()['venta_id'])
+        self.assertEqual(Venta.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 8)
+
+    def test_precios_distintos_del_mismo_producto(self):
+        response = self.vender([self.linea(1, 15), self.linea(1, 12)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('precios distintos', response.json()['error'])
+        self.assertFalse(Venta.objects.exists())
+
+    def test_stock_insuficiente_no_deja_nada(self):
+        response = self.vender([self.linea(11)])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(MovimientoInventario.objects.filter(tipo='venta').exists())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 10)
+
+
+class LoteVentasTest(TestCase):
+    """procesar_lote_ventas: una venta con error no descarta las demás del lote"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cajero = User.objects.create_user('cajero_lote', password='cajero123')
+        cls.producto = Producto.objects.create(
+            codigo_barras='7501000000002',
+            nombre='Frijol',
+            precio_compra=10,
+            precio_venta=20,
+            stock=5,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.cajero)
+
+    def venta(self, clave, cantidad):
+        return {
+            'clave_idempotencia': clave,
+            'items': [{'producto_id': self.producto.id, 'cantidad': cantidad, 'precio_unitario': 20}],
+        }
+
+    def enviar(self, ventas):
+        response = self.client.post(
+            reverse('productos:procesar_lote'),
+            json.dumps({'ventas': ventas}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return [resultado['estado'] for resultado in response.json()['resultados']]
+
+    def test_errores_por_venta(self):
+        estados = self.enviar([
+            self.venta('lote-1', 2),
+            'no es una venta',
+            {'clave_idempotencia': ['lista'], 'items': []},
+            self.venta('lote-2', 99),
+            {'clave_idempotencia': 'lote-3', 'items': 'x'},
+            self.venta('lote-1', 2),
+            self.venta('lote-4', 3),
+        ])
+
+        self.assertEqual(estados, ['creada', 'error', 'error', 'error', 'error', 'duplicada', 'creada'])
+        self.assertEqual(
+            set(Venta.objects.values_list('clave_idempotencia', flat=True)),
+            {'lote-1', 'lote-4'},
+        )
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 0)
+        # La venta sin stock se revirtió en su savepoint, sin dejar movimientos
+        self.assertEqual(MovimientoInventario.objects.filter(tipo='venta').count(), 2)
+
+    def test_reenvio_del_lote(self):
+        lote = [self.venta('reenvio-1', 1), self.venta('reenvio-2', 1)]
+        self.assertEqual(self.enviar(lote), ['creada', 'creada'])
+        self.assertEqual(self.enviar(lote), ['duplicada', 'duplicada'])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 3)
+
+
+class BitacoraInventarioTest(TestCase):
+    """El stock según la bitácora (snapshot + movimientos) coincide con Producto.stock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.producto = Producto.objects.create(
+            codigo_barras='7501000000003',
+            nombre='Azúcar',
+            precio_compra=10,
+            precio_venta=18,
+            stock=20,
+        )
+
+    def vender(self, cantidad):
+        venta, _ = procesar_checkout([
+            {'producto_id': self.producto.id, 'cantidad': cantidad, 'precio_unitario': 18},
+        ])
+        return venta
+
+    def assertStockCoincide(self, esperado):
+        fila = inventario.stock_calculado(Producto.objects.filter(id=self.producto.id)).get()
+        self.assertEqual(fila.stock, esperado)
+        self.assertEqual(fila.stock_calculado, esperado)
+
+    def test_ventas_ajustes_y_cancelaciones(self):
+        self.vender(3)
+        venta = self.vender(2)
+        producto = Producto.objects.get(id=self.producto.id)
+        producto.stock = 30
+        producto.save()
+        self.assertStockCoincide(30)
+
+        cambiar_estado(Venta.objects.filter(id=venta.id), 'cancelada')
+        self.assertStockCoincide(32)
+        self.assertEqual(
+            list(MovimientoInventario.objects.filter(venta=venta).order_by('id').values_list('tipo', 'cantidad')),
+            [('venta', -2), ('devolucion', 2)],
+        )
+
+    def test_ajustar_venta_registra_solo_la_diferencia(self):
+        venta = self.vender(2)
+        inventario.ajustar_venta(venta.id, {self.producto.id: 2}, {self.producto.id: 2})
+        self.assertEqual(MovimientoInventario.objects.filter(venta=venta).count(), 1)
+
+        inventario.ajustar_venta(venta.id, {self.producto.id: 2}, {self.producto.id: 5})
+        self.assertEqual(
+            list(MovimientoInventario.objects.filter(venta=venta).order_by('id').values_list('tipo', 'cantidad')),
+            [('venta', -2), ('venta', -3)],
+        )
+        self.assertStockCoincide(15)
+
+        with self.assertRaises(ValueError):
+            inventario.ajustar_venta(venta.id, {}, {self.producto.id: 100})
+
+    def test_compactar(self):
+        self.vender(4)
+        escritos, desfasados = inventario.compactar()
+        self.assertEqual((escritos, desfasados), (1, []))
+        self.assertStockCoincide(16)
+
+        # Movimientos después del snapshot: se suman a él
+        self.vender(1)
+        self.assertStockCoincide(15)
+
+        # Un UPDATE fuera de la bitácora se detecta y se repara
+        Producto.objects.filter(id=self.producto.id).update(stock=50)
+        _, desfasados = inventario.compactar()
+        self.assertEqual(desfasados, [(self.producto.id, 50, 15)])
+        inventario.compactar(reparar=True)
+        self.assertStockCoincide(15)
+
+        # De los anteriores sólo queda el que estaba vigente
+        self.assertEqual(SnapshotInventario.objects.filter(producto=self.producto).count(), 2)
+
+
+class ArchivoVentasTest(TestCase):
+    """archivar(): las ventas viejas pasan al archivo y se siguen consultando"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cajero = User.objects.create_user('cajero_archivo', password='cajero123')
+        cls.producto = Producto.objects.create(
+            codigo_barras='7501000000004',
+            nombre='Café',
+            precio_compra=40,
+            precio_venta=60,
+            stock=10,
+        )
+
+    def vender(self, dias_atras):
+        venta, _ = procesar_checkout(
+            [{'producto_id': self.producto.id, 'cantidad': 2, 'precio_unitario': 60}],
+            cajero=self.cajero,
+        )
+        Venta.objects.filter(id=venta.id).update(fecha=timezone.now() - timedelta(days=dias_atras))
+        return venta
+
+    def test_ida_y_vuelta(self):
+        vieja = self.vender(200)
+        reciente = self.vender(1)
+
+        self.assertEqual(archivo.archivar(dias=180), 1)
+
+        self.assertEqual(list(Venta.objects.values_list('id', flat=True)), [reciente.id])
+        self.assertFalse(DetalleVenta.objects.filter(venta_id=vieja.id).exists())
+        archivada = archivo.obtener_venta(vieja.id)
+        self.assertIsInstance(archivada, VentaArchivada)
+        self.assertEqual((archivada.total, archivada.estado, archivada.cajero_id), (vieja.total, 'completada', self.cajero.id))
+        detalles = archivo.detalles_archivados(vieja.id)
+        self.assertEqual(
+            [(d.producto_id, d.producto_nombre, d.cantidad, d.subtotal) for d in detalles],
+            [(self.producto.id, 'Café', 2, 120)],
+        )
+        # La bitácora conserva el número de venta en la nota
+        self.assertEqual(
+            list(MovimientoInventario.objects.filter(tipo='venta', venta__isnull=True).values_list('nota', flat=True)),
+            [f'Venta #{vieja.id} (archivada)'],
+        )
+
+        self.client.force_login(self.cajero)
+        response = self.client.get(reverse('productos:ticket_venta', args=[vieja.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_lote_interrumpido_se_repite_sin_duplicar(self):
+        venta = self.vender(200)
+        antes_de = timezone.now() - timedelta(days=180)
+        # Falla después de copiar al archivo y antes de borrar de las tablas activas
+        with mock.patch('productos.archivo.Concat', side_effect=RuntimeError('interrumpido')):
+            with self.assertRaises(RuntimeError):
+                archivo.archivar_lote([venta.id], antes_de)
+        self.assertTrue(Venta.objects.filter(id=venta.id).exists())
+
+        self.assertEqual(archivo.archivar(dias=180), 1)
+        self.assertFalse(Venta.objects.filter(id=venta.id).exists())
+        self.assertEqual(VentaArchivada.objects.filter(id=venta.id).count(), 1)
+        self.assertEqual(DetalleVentaArchivada.objects.filter(venta_id=venta.id).count(), 1)
+
+    def test_copia_anterior_se_reemplaza(self):
+        venta = self.vender(200)
+        detalle = DetalleVenta.objects.get(venta=venta)
+        # Copia de un lote interrumpido con el archivo en otra base, anterior a una edición
+        copia = VentaArchivada.objects.create(
+            id=venta.id, fecha=venta.fecha, total=1, estado='completada',
+            fecha_creacion=venta.fecha_creacion, fecha_actualizacion=venta.fecha_actualizacion,
+        )
+        DetalleVentaArchivada.objects.create(
+            id=detalle.id, venta=copia, producto_id=self.producto.id, producto_codigo_barras='x',
+            producto_nombre='viejo', cantidad=1, precio_unitario=1, subtotal=1,
+        )
+        DetalleVentaArchivada.objects.create(
+            id=detalle.id + 1000, venta=copia, producto_id=self.producto.id, producto_codigo_barras='x',
+            producto_nombre='borrado', cantidad=1, precio_unitario=1, subtotal=1,
+        )
+
+        self.assertEqual(archivo.archivar(dias=180), 1)
+        self.assertEqual(VentaArchivada.objects.get(id=venta.id).total, Decimal('120.00'))
+        self.assertEqual(
+            [(d.id, d.producto_nombre, d.subtotal) for d in archivo.detalles_archivados(venta.id)],
+            [(detalle.id, 'Café', Decimal('120.00'))],
+        )
+
+    def test_venta_modificada_despues_de_elegir_el_lote(self):
+        reabierta = self.vender(200)
+        editada = self.vender(201)
+        antes_de = timezone.now() - timedelta(days=180)
+        ids = list(archivo.por_archivar(antes_de).values_list('id', flat=True))
+        self.assertEqual(sorted(ids), sorted([reabierta.id, editada.id]))
+
+        # Cambios entre la elección del lote y su bloqueo
+        Venta.objects.filter(id=reabierta.id).update(estado='pendiente')
+        Venta.objects.filter(id=editada.id).update(notas='corregida')
+
+        self.assertEqual(archivo.archivar_lote(ids, antes_de), 1)
+        # La que ya no es archivable sigue activa y completa
+        self.assertTrue(Venta.objects.filter(id=reabierta.id).exists())
+        self.assertTrue(DetalleVenta.objects.filter(venta_id=reabierta.id).exists())
+        self.assertFalse(VentaArchivada.objects.filter(id=reabierta.id).exists())
+        # La copia sale de la lectura bloqueada, no de una anterior
+        self.assertEqual(VentaArchivada.objects.get(id=editada.id).notas, 'corregida')
+
+
+class ColaTrabajosTest(TestCase):
+    """trabajos.py: encolado al confirmar, toma única, reintentos y deduplicación"""
+
+    def setUp(self):
+        self.llamadas = []
+        tareas = {
+            'anotar': (lambda valor: self.llamadas.append(valor), 3),
+            'fallar': (self.fallar, 2),
+        }
+        parche = mock.patch.dict(trabajos.TAREAS, tareas)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def fallar(self):
+        raise RuntimeError('falla de prueba')
+
+    def encolar(self, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            trabajos.encolar(*args, **kwargs)
+
+    def test_encolar_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                trabajos.encolar('anotar', valor=1)
+                self.assertFalse(Trabajo.objects.exists())
+        self.assertEqual(Trabajo.objects.get().argumentos, {'valor': 1})
+
+    def test_encolar_revertido_no_deja_trabajo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    trabajos.encolar('anotar', valor=1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(Trabajo.objects.exists())
+
+    def test_deduplicacion_por_clave(self):
+        self.encolar('anotar', clave='unico', valor=1)
+        self.encolar('anotar', clave='unico', valor=2)
+        self.assertEqual(Trabajo.objects.count(), 1)
+
+        # Ya terminado, la misma clave vuelve a encolarse
+        trabajos.ejecutar(trabajos.tomar('t1')[0])
+        self.encolar('anotar', clave='unico', valor=3)
+        self.assertEqual(Trabajo.objects.filter(estado='pendiente').count(), 1)
+
+    def test_toma_unica(self):
+        self.encolar('anotar', valor=1)
+        primero = trabajos.tomar('t1', cantidad=5)
+        self.assertEqual(len(primero), 1)
+        self.assertEqual(trabajos.tomar('t2', cantidad=5), [])
+
+        self.assertTrue(trabajos.ejecutar(primero[0]))
+        trabajo = Trabajo.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.intentos, trabajo.trabajador), ('completado', 1, 't1'))
+        self.assertEqual(self.llamadas, [1])
+
+    def test_reintentos_hasta_fallido(self):
+        self.encolar('fallar')
+        with self.assertLogs('productos.trabajos', 'WARNING'):
+            self.assertFalse(trabajos.ejecutar(trabajos.tomar('t1')[0]))
+        trabajo = Trabajo.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('pendiente', 1))
+        self.assertGreater(trabajo.disponible_en, timezone.now())
+        # Todavía en espera: nadie lo toma
+        self.assertEqual(trabajos.tomar('t1'), [])
+
+        Trabajo.objects.update(disponible_en=timezone.now())
+        with self.assertLogs('productos.trabajos', 'ERROR'):
+            self.assertFalse(trabajos.ejecutar(trabajos.tomar('t1')[0]))
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('fallido', 2))
+        self.assertIn('falla de prueba', trabajo.error)
+
+        self.assertEqual(trabajos.reintentar(Trabajo.objects.all()), 1)
+        self.assertEqual(len(trabajos.tomar('t1')), 1)
+
+    def test_abandonados_regresan_a_la_cola(self):
+        self.encolar('anotar', valor=1)
+        trabajos.tomar('t1')
+        Trabajo.objects.update(iniciado=timezone.now() - timedelta(hours=1))
+        self.assertEqual(trabajos.recuperar_abandonados(), 1)
+        self.assertEqual(Trabajo.objects.get().estado, 'pendiente')
+
+
+class ResumenesPorColaTest(TestCase):
+    """Los resúmenes diarios se aplican una sola vez por venta aunque el trabajo se repita"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.producto = Producto.objects.create(
+            codigo_barras='7501000000005',
+            nombre='Aceite',
+            precio_compra=20,
+            precio_venta=35,
+            stock=10,
+        )
+
+    def vender(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            venta, _ = procesar_checkout([
+                {'producto_id': self.producto.id, 'cantidad': 2, 'precio_unitario': 35},
+            ])
+        return venta
+
+    def encolar_resumen(self, venta):
+        with self.captureOnCommitCallbacks(execute=True):
+            trabajos.encolar('aplicar_resumenes', venta_ids=[venta.id])
+
+    def correr_cola(self):
+        while True:
+            tomados = trabajos.tomar('prueba', cantidad=10)
+            if not tomados:
+                return
+            for trabajo in tomados:
+                with self.captureOnCommitCallbacks(execute=True):
+                    trabajos.ejecutar(trabajo)
+
+    def test_aplicar_una_vez(self):
+        venta = self.vender()
+        self.correr_cola()
+        # Un trabajo repetido (p. ej. reintento después de un commit) no vuelve a sumar
+        self.encolar_resumen(venta)
+        self.correr_cola()
+
+        resumen = ResumenVentasDiario.objects.get()
+        self.assertEqual((resumen.num_ventas, resumen.unidades, resumen.ingresos), (1, 2, 70))
+
+    def test_cancelada_antes_del_trabajo(self):
+        venta = self.vender()
+        cambiar_estado(Venta.objects.filter(id=venta.id), 'cancelada')
+        self.correr_cola()
+        self.assertFalse(ResumenVentasDiario.objects.filter(num_ventas__gt=0).exists())
+
+
+class TurnosCajaTest(TestCase):
+    """Los contadores del turno siguen a sus ventas; un turno cerrado no cambia"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cajero = User.objects.create_user('cajero_turno', password='cajero123')
+        cls.producto = Producto.objects.create(
+            codigo_barras='7501000000006',
+            nombre='Sal',
+            precio_compra=5,
+            precio_venta=8,
+            stock=50,
+        )
+
+    def setUp(self):
+        self.turno = turnos.abrir(self.cajero, 'Caja 1')
+
+    def vender(self, cantidad):
+        venta, _ = procesar_checkout(
+            [{'producto_id': self.producto.id, 'cantidad': cantidad, 'precio_unitario': 8}],
+            cajero=self.cajero,
+            turno_id=self.turno.id,
+        )
+        return venta
+
+    def contadores(self):
+        turno = TurnoCaja.objects.get(id=self.turno.id)
+        return {campo: getattr(turno, campo) for par in turnos.CAMPOS.values() for campo in par}
+
+    def test_contadores_con_cambios_de_estado(self):
+        primera = self.vender(1)
+        segunda = self.vender(2)
+        cambiar_estado(Venta.objects.filter(id=segunda.id), 'cancelada')
+        cambiar_estado(Venta.objects.filter(id=primera.id), 'pendiente')
+        cambiar_estado(Venta.objects.filter(id=primera.id), 'completada')
+
+        contadores = self.contadores()
+        self.assertEqual((contadores['ventas_completadas'], contadores['total_completadas']), (1, 8))
+        self.assertEqual((contadores['ventas_canceladas'], contadores['total_canceladas']), (1, 16))
+        self.assertEqual((contadores['ventas_pendientes'], contadores['total_pendientes']), (0, 0))
+        self.assertEqual(contadores, turnos.totales([self.turno.id])[self.turno.id])
+        self.assertEqual(turnos.conciliar(TurnoCaja.objects.filter(id=self.turno.id)), [])
+
+    def test_turno_cerrado_no_cambia(self):
+        venta = self.vender(1)
+        turnos.cerrar(self.turno.id, 8)
+        antes = self.contadores()
+
+        with self.assertRaisesMessage(ValueError, 'turnos de caja cerrados'):
+            cambiar_estado(Venta.objects.filter(id=venta.id), 'cancelada')
+        with self.assertRaises(ValueError):
+            self.vender(1)
+        self.assertEqual(self.contadores(), antes)
+        self.assertEqual(Venta.objects.get(id=venta.id).estado, 'completada')
+
+        admin_ventas = admin.site._registry[Venta]
+        request = mock.Mock(user=User.objects.create_superuser('admin_turno', 'admin@ejemplo.com', 'admin123'))
+        self.assertFalse(admin_ventas.has_change_permission(request, venta))
+        self.assertFalse(admin_ventas.has_delete_permission(request, venta))
+
+    def test_conciliar_corrige(self):
+        self.vender(3)
+        TurnoCaja.objects.filter(id=self.turno.id).update(ventas_completadas=7)
+
+        diferencias = turnos.conciliar(TurnoCaja.objects.filter(id=self.turno.id), corregir=True)
+        self.assertEqual([campos for _, campos in diferencias], [{'ventas_completadas': (7, 1)}])
+        self.assertEqual(self.contadores()['ventas_completadas'], 1)
+
+
+class TotalesVentaTest(TestCase):
+    """Venta.total = suma de los subtotales de sus detalles"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_totales', 'admin@ejemplo.com', 'admin123')
+        cls.productos = [
+            Producto.objects.create(
+                codigo_barras=f'750200000000{i}',
+                nombre=f'Producto totales {i}',
+                precio_compra=5,
+                precio_venta=10,
+                stock=100,
+            )
+            for i in range(3)
+        ]
+
+    def test_inline_recalcula_una_vez(self):
+        self.client.force_login(self.admin)
+        ahora = timezone.localtime()
+        datos = {
+            'fecha_0': ahora.strftime('%Y-%m-%d'),
+            'fecha_1': ahora.strftime('%H:%M:%S'),
+            'estado': 'pendiente',
+            'notas': '',
+            'detalles-TOTAL_FORMS': '3',
+            'detalles-INITIAL_FORMS': '0',
+            'detalles-MIN_NUM_FORMS': '0',
+            'detalles-MAX_NUM_FORMS': '1000',
+        }
+        for i, producto in enumerate(self.productos):
+            datos[f'detalles-{i}-producto'] = str(producto.id)
+            datos[f'detalles-{i}-cantidad'] = str(i + 1)
+            datos[f'detalles-{i}-precio_unitario'] = '10.50'
+
+        with mock.patch.object(Venta, 'calcular_total') as por_detalle, \
+                mock.patch.object(
+                    models.VentaQuerySet, 'recalcular_totales',
+                    autospec=True, side_effect=models.VentaQuerySet.recalcular_totales,
+                ) as recalculos:
+            response = self.client.post(reverse('admin:productos_venta_add'), datos)
+
+        self.assertEqual(response.status_code, 302)
+        por_detalle.assert_not_called()
+        self.assertEqual(recalculos.call_count, 1)
+        venta = Venta.objects.con_total_calculado().get()
+        self.assertEqual(venta.detalles.count(), 3)
+        self.assertEqual(venta.total, Decimal('63.00'))
+        self.assertEqual(venta.total, venta.total_calculado)
+
+    def test_verificar_totales_reparar(self):
+        venta, _ = procesar_checkout([
+            {'producto_id': self.productos[0].id, 'cantidad': 2, 'precio_unitario': 10},
+        ])
+        Venta.objects.filter(id=venta.id).update(total=999)
+
+        salida = io.StringIO()
+        call_command('verificar_totales', stdout=salida)
+        self.assertIn(f'Venta #{venta.id}', salida.getvalue())
+        self.assertEqual(Venta.objects.get(id=venta.id).total, 999)
+
+        call_command('verificar_totales', '--reparar', stdout=io.StringIO())
+        self.assertEqual(Venta.objects.get(id=venta.id).total, 20)
+        self.assertFalse(Venta.objects.con_total_desfasado().exists())
+
+
+class BusquedaTest(TestCase):
+    """FTS5Backend: sin acentos, palabras cortas con icontains y búsqueda del admin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for codigo, nombre in (
+            ('7503000000001', 'Café de olla'),
+            ('7503000000002', 'Pan blanco'),
+            ('7503000000003', 'Pan con jamón'),
+            ('7503000000004', 'Jamón de pavo'),
+        ):
+            Producto.objects.create(codigo_barras=codigo, nombre=nombre, precio_compra=10, precio_venta=15)
+        cls.admin = User.objects.create_superuser('admin_busqueda', 'admin@ejemplo.com', 'admin123')
+
+    def setUp(self):
+        self.backend = FTS5Backend()
+
+    def nombres(self, productos):
+        return sorted(producto.nombre for producto in productos)
+
+    def test_sin_acentos(self):
+        self.assertEqual(self.nombres(self.backend.filtrar(Producto.objects.all(), 'cafe')), ['Café de olla'])
+        self.assertEqual(self.nombres(self.backend.buscar(Producto.objects.all(), 'JAMON')), ['Jamón de pavo', 'Pan con jamón'])
+
+    def test_palabra_corta_en_consulta_mixta(self):
+        for metodo in (self.backend.filtrar, self.backend.buscar):
+            with self.subTest(metodo=metodo.__name__):
+                self.assertEqual(self.nombres(metodo(Producto.objects.all(), 'pan ja')), ['Pan con jamón'])
+
+    def test_solo_palabras_cortas(self):
+        self.assertEqual(self.nombres(self.backend.buscar(Producto.objects.all(), 'ja')), ['Jamón de pavo', 'Pan con jamón'])
+        self.assertEqual(self.nombres(self.backend.filtrar(Producto.objects.all(), '7503000000002')), ['Pan blanco'])
+
+    def test_indice_al_guardar_y_borrar(self):
+        producto = Producto.objects.get(nombre='Pan blanco')
+        producto.nombre = 'Tortilla de maíz'
+        producto.save()
+        self.assertEqual(self.nombres(self.backend.filtrar(Producto.objects.all(), 'maiz')), ['Tortilla de maíz'])
+        producto.delete()
+        self.assertFalse(self.backend.filtrar(Producto.objects.all(), 'maiz').exists())
+
+    def test_busqueda_del_admin(self):
+        self.assertIsInstance(obtener_backend(), FTS5Backend)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:productos_producto_changelist'), {'q': 'cafe'})
+        self.assertEqual(self.nombres(response.context['cl'].result_list), ['Café de olla'])
+
+
+class EscanerTest(TestCase):
+    """Caché del lector: aciertos, fallos e invalidación al confirmar cambios del producto"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_escaner', 'admin@ejemplo.com', 'admin123')
+        cls.producto = Producto.objects.create(
+            codigo_barras='7504000000001',
+            nombre='Atún',
+            precio_compra=12,
+            precio_venta=20,
+            stock=8,
+        )
+
+    def setUp(self):
+        caches[settings.PRODUCTOS_CACHE_ALIAS].clear()
+        self.client.force_login(self.admin)
+
+    def escanear(self, codigo):
+        return self.client.get(reverse('productos:escanear', args=[codigo]))
+
+    def guardar(self, **cambios):
+        producto = Producto.objects.get(id=self.producto.id)
+        for campo, valor in cambios.items():
+            setattr(producto, campo, valor)
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+
+    def test_aciertos_y_fallos(self):
+        self.assertEqual(self.escanear('7504000000001').json()['precio_venta'], '20.00')
+        self.escanear('7504000000001')
+        self.assertEqual(self.escanear('0000').status_code, 404)
+        self.assertEqual(self.escanear('0000').status_code, 404)
+
+        estadisticas = self.client.get(reverse('productos:estadisticas_escaner')).json()
+        self.assertEqual(estadisticas, {'hits': 2, 'misses': 2, 'tasa_aciertos': 0.5})
+
+    def test_invalidacion_despues_del_commit(self):
+        self.escanear('7504000000001')
+        producto = Producto.objects.get(id=self.producto.id)
+        producto.precio_venta = 25
+        with self.captureOnCommitCallbacks() as callbacks:
+            producto.save()
+            # Antes del commit la entrada sigue ahí: un escaneo no puede guardar la fila vieja otra vez
+            self.assertIsNotNone(caches[settings.PRODUCTOS_CACHE_ALIAS].get('escaner:codigo:7504000000001'))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.escanear('7504000000001').json()['precio_venta'], '25.00')
+
+    def test_cambio_de_codigo_y_borrado(self):
+        self.escanear('7504000000001')
+        self.guardar(codigo_barras='7504000000009', activo=False)
+        self.assertEqual(self.escanear('7504000000001').status_code, 404)
+        self.assertFalse(self.escanear('7504000000009').json()['activo'])
+
+        # Sin stock no tiene movimientos en la bitácora y se puede borrar
+        sin_movimientos = Producto.objects.create(
+            codigo_barras='7504000000002', nombre='Sardina', precio_compra=8, precio_venta=14,
+        )
+        self.escanear('7504000000002')
+        with self.captureOnCommitCallbacks(execute=True):
+            sin_movimientos.delete()
+        self.assertEqual(self.escanear('7504000000002').status_code, 404)
+
+    def test_venta_invalida_el_stock(self):
+        self.escanear('7504000000001')
+        with self.captureOnCommitCallbacks(execute=True):
+            procesar_checkout([{'producto_id': self.producto.id, 'cantidad': 3, 'precio_unitario': 20}])
+        self.assertEqual(self.escanear('7504000000001').json()['stock'], 5)
+
+
+class PaginacionKeysetTest(TestCase):
+    """Recorrer el catálogo por cursor no debe saltar ni repetir filas con nombres iguales"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Nombres repetidos que caen justo en el límite entre páginas
+        for i, nombre in enumerate(['Agua', 'Jugo', 'Jugo', 'Jugo', 'Jugo', 'Leche', 'Leche']):
+            Producto.objects.create(
+                codigo_barras=f'750500000000{i}',
+                nombre=nombre,
+                precio_compra=10,
+                precio_venta=15,
+            )
+
+    def recorrer(self, tamano):
+        vistos, cursor, paginas = [], None, 0
+        while True:
+            pagina, cursor = paginacion.paginar_keyset(Producto.objects.all(), cursor, tamano)
+            vistos.extend(p.id for p in pagina)
+            paginas += 1
+            if cursor is None:
+                return vistos, paginas
+
+    def test_recorrido_completo_sin_huecos_ni_repetidos(self):
+        esperados = list(Producto.objects.order_by('nombre', 'id').values_list('id', flat=True))
+        for tamano in (1, 2, 3, 7, 50):
+            with self.subTest(tamano=tamano):
+                vistos, paginas = self.recorrer(tamano)
+                self.assertEqual(vistos, esperados)
+                self.assertEqual(paginas, max(1, -(-len(esperados) // tamano)))
+
+    def test_cursor_a_mitad_de_nombres_iguales(self):
+        jugos = list(Producto.objects.filter(nombre='Jugo').order_by('id'))
+        cursor = paginacion.codificar_cursor('Jugo', jugos[1].id)
+        leche = Producto.objects.filter(nombre='Leche').order_by('id').first()
+        pagina, _ = paginacion.paginar_keyset(Producto.objects.all(), cursor, 3)
+        self.assertEqual([p.id for p in pagina], [jugos[2].id, jugos[3].id, leche.id])
+
+    def test_cursor_invalido_empieza_desde_el_principio(self):
+        self.assertIsNone(paginacion.decodificar_cursor('no-es-un-cursor'))
+        pagina, _ = paginacion.paginar_keyset(Producto.objects.all(), 'no-es-un-cursor', 1)
+        self.assertEqual(pagina[0].nombre, 'Agua')
+
+
+class SincronizacionTest(TestCase):
+    """Catálogo incremental de las terminales: cursor, margen, ETag y bajas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_sync', 'admin@ejemplo.com', 'admin123')
+        cls.productos = [
+            Producto.objects.create(
+                codigo_barras=f'750600000000{i}',
+                nombre=f'Refresco {i}',
+                precio_compra=10,
+                precio_venta=15,
+            )
+            for i in range(3)
+        ]
+
+    def envejecer(self):
+        """Saca del margen los cambios recientes, con la misma fecha para probar el desempate por id"""
+        fecha = timezone.now() - timedelta(minutes=1)
+        Producto.objects.filter(fecha_actualizacion__gt=fecha).update(fecha_actualizacion=fecha)
+        ProductoEliminado.objects.filter(fecha_eliminacion__gt=fecha).update(fecha_eliminacion=fecha)
+
+    def test_cursor_por_lotes(self):
+        self.envejecer()
+        primero = sincronizacion.obtener_lote(tamano=2)
+        self.assertTrue(primero['completo'])
+        self.assertTrue(primero['hay_mas'])
+        self.assertEqual([p['id'] for p in primero['productos']], [p.id for p in self.productos[:2]])
+
+        segundo = sincronizacion.obtener_lote(primero['cursor'], tamano=2)
+        self.assertFalse(segundo['completo'])
+        self.assertFalse(segundo['hay_mas'])
+        self.assertEqual([p['id'] for p in segundo['productos']], [self.productos[2].id])
+
+        vacio = sincronizacion.obtener_lote(segundo['cursor'], tamano=2)
+        self.assertEqual(vacio['productos'], [])
+        self.assertEqual(vacio['cursor'], segundo['cursor'])
+
+    def test_margen_retiene_cambios_recientes(self):
+        self.envejecer()
+        cursor = sincronizacion.obtener_lote()['cursor']
+        Producto.objects.filter(id=self.productos[0].id).update(
+            precio_venta=18, fecha_actualizacion=timezone.now(),
+        )
+        self.assertEqual(sincronizacion.obtener_lote(cursor)['productos'], [])
+
+        despues = timezone.now() + sincronizacion.MARGEN + timedelta(seconds=1)
+        with mock.patch.object(sincronizacion.timezone, 'now', return_value=despues):
+            lote = sincronizacion.obtener_lote(cursor)
+        self.assertEqual([p['precio_venta'] for p in lote['productos']], ['18.00'])
+
+    def test_etag_y_304(self):
+        self.envejecer()
+        self.client.force_login(self.admin)
+        url = reverse('productos:catalogo_pos')
+        cursor = sincronizacion.obtener_lote()['cursor']
+        respuesta = self.client.get(url, {'desde': cursor})
+        self.assertEqual(respuesta.status_code, 200)
+        etag = respuesta['ETag']
+        self.assertEqual(self.client.get(url, {'desde': cursor}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        producto = Producto.objects.get(id=self.productos[1].id)
+        producto.precio_venta = 17
+        producto.save()
+        self.envejecer()
+        respuesta = self.client.get(url, {'desde': cursor}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual([p['id'] for p in respuesta.json()['productos']], [self.productos[1].id])
+
+    def test_borrados_y_desactivados_llegan_como_eliminados(self):
+        self.envejecer()
+        cursor = sincronizacion.obtener_lote()['cursor']
+        borrado, desactivado = self.productos[0], self.productos[2]
+        Producto.objects.get(id=borrado.id).delete()
+        producto = Producto.objects.get(id=desactivado.id)
+        producto.activo = False
+        producto.save()
+        self.envejecer()
+
+        lote = sincronizacion.obtener_lote(cursor)
+        self.assertEqual(lote['productos'], [])
+        self.assertEqual(lote['eliminados'], [borrado.id, desactivado.id])
+        # La baja no se repite con el cursor nuevo ni aparece en una copia completa
+        self.assertEqual(sincronizacion.obtener_lote(lote['cursor'])['eliminados'], [])
+        self.assertNotIn(borrado.id, [p['id'] for p in sincronizacion.obtener_lote()['productos']])
+
+
+class ImagenesTest(TestCase):
+    """Las derivadas de dos imágenes con el mismo nombre y distinta extensión no se pisan"""
+
+    def subir(self, storage, nombre, formato, color):
+        contenido = io.BytesIO()
+        Image.new('RGB', (800, 600), color).save(contenido, formato)
+        storage.save(nombre, ContentFile(contenido.getvalue()))
+
+    def test_misma_raiz_distinta_extension(self):
+        storage = InMemoryStorage()
+        self.subir(storage, 'productos/foto.jpg', 'JPEG', 'red')
+        self.subir(storage, 'productos/foto.png', 'PNG', 'blue')
+        de_jpg = imagenes.generar_derivadas('productos/foto.jpg', storage)
+        de_png = imagenes.generar_derivadas('productos/foto.png', storage)
+        self.assertEqual(len(de_jpg), len(imagenes.TAMANOS) * len(imagenes.FORMATOS))
+        self.assertFalse(set(de_jpg) & set(de_png))
+        self.assertIn('productos/foto.png_200px.webp', de_png)
+
+        with storage.open(imagenes.ruta_derivada('productos/foto.jpg', 64, 'jpg'), 'rb') as archivo:
+            rojo, _, azul = Image.open(archivo).convert('RGB').getpixel((0, 0))
+        self.assertGreater(rojo, azul)
+
+        # Borrar las de una no toca las de la otra
+        imagenes.borrar_derivadas('productos/foto.jpg', storage)
+        self.assertFalse(any(storage.exists(ruta) for ruta in de_jpg))
+        self.assertTrue(all(storage.exists(ruta) for ruta in de_png))
+
+
+class TicketsTest(TestCase):
+    """La clave de caché, el ETag y el contenido del ticket son de la misma versión de la venta"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_ticket', 'admin@ejemplo.com', 'admin123')
+        producto = Producto.objects.create(
+            codigo_barras='7507000000001',
+            nombre='Galletas',
+            precio_compra=10,
+            precio_venta=18,
+            stock=10,
+        )
+        cls.venta, _ = procesar_checkout([{'producto_id': producto.id, 'cantidad': 1, 'precio_unitario': 18}])
+
+    def setUp(self):
+        caches[settings.PRODUCTOS_CACHE_ALIAS].clear()
+        self.client.force_login(self.admin)
+
+    def editar_venta(self):
+        """Cambia la venta y su fecha_actualizacion, como una edición desde el admin"""
+        Venta.objects.filter(id=self.venta.id).update(
+            estado='cancelada', fecha_actualizacion=timezone.now() + timedelta(seconds=1),
+        )
+        return Venta.objects.get(id=self.venta.id).fecha_actualizacion
+
+    def test_etag_y_304(self):
+        url = reverse('productos:ticket_venta_formato', args=[self.venta.id, 'escpos'])
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+
+        self.editar_venta()
+        nueva = self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(nueva.status_code, 200)
+        self.assertIn('Cancelada'.encode('cp850'), nueva.content)
+
+    def test_venta_editada_despues_de_leer_la_version(self):
+        anterior = tickets.version(self.venta.id)
+        nueva = self.editar_venta()
+
+        contenido, version = tickets.obtener(self.venta.id, anterior, 'escpos')
+        self.assertEqual(version, nueva)
+        self.assertIn('Cancelada'.encode('cp850'), contenido)
+        # El contenido nuevo no queda guardado bajo la versión anterior
+        cache = caches[settings.PRODUCTOS_CACHE_ALIAS]
+        self.assertIsNone(cache.get(tickets.clave(self.venta.id, anterior, 'escpos')))
+        self.assertEqual(cache.get(tickets.clave(self.venta.id, nueva, 'escpos')), contenido)
+
+    def test_vista_envia_el_etag_de_lo_renderizado(self):
+        anterior = tickets.version(self.venta.id)
+        nueva = self.editar_venta()
+        with mock.patch.object(tickets, 'version', return_value=anterior):
+            respuesta = self.client.get(reverse('productos:ticket_venta_formato', args=[self.venta.id, 'escpos']))
+        self.assertEqual(respuesta['ETag'], tickets.etag(self.venta.id, nueva, 'escpos'))
+
+
+class ImportacionTest(TestCase):
+    """Importación de productos: conteos por fila, errores por fila y ceros a la izquierda"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Producto.objects.create(
+            codigo_barras='7508000000001',
+            nombre='Arroz',
+            precio_compra=20,
+            precio_venta=28,
+            stock=10,
+        )
+        Producto.objects.create(
+            codigo_barras='7508000000002',
+            nombre='Frijol',
+            precio_compra=25,
+            precio_venta=35,
+            stock=4,
+        )
+
+    def importar(self, texto, **kwargs):
+        return importacion.importar(importacion.leer_csv(io.StringIO(texto)), **kwargs)
+
+    def test_sin_cambios_altas_y_actualizaciones(self):
+        reporte = self.importar(
+            'codigo_barras,nombre,precio_compra,precio_venta,stock\n'
+            '7508000000001,Arroz,20,28,10\n'
+            '7508000000002,Frijol,25,38,6\n'
+            '7508000000003,Lenteja,22,30,5\n',
+            tamano_chunk=2,
+        )
+        self.assertEqual((reporte.sin_cambios, reporte.actualizados, reporte.insertados), (1, 1, 1))
+        self.assertEqual(reporte.num_errores, 0)
+
+        frijol = Producto.objects.get(codigo_barras='7508000000002')
+        self.assertEqual((frijol.precio_venta, frijol.stock), (Decimal('38.00'), 6))
+        self.assertEqual(inventario.stock_calculado(Producto.objects.filter(id=frijol.id)).get().stock_calculado, 6)
+        self.assertEqual(Producto.objects.get(codigo_barras='7508000000003').stock, 5)
+
+        # La misma importación otra vez no escribe nada
+        reporte = self.importar(
+            'codigo_barras,precio_venta\n7508000000002,38\n7508000000003,30.00\n'
+        )
+        self.assertEqual((reporte.sin_cambios, reporte.actualizados, reporte.insertados), (2, 0, 0))
+
+    def test_errores_por_fila(self):
+        reporte = self.importar(
+            'codigo_barras,nombre,precio_compra,precio_venta,stock\n'
+            ',Sin código,1,2,0\n'
+            '7508000000004,Precio malo,abc,2,0\n'
+            '7508000000005,Muy caro,1,123456789012,0\n'
+            '7508000000006,Stock negativo,1,2,-3\n'
+            '7508000000007,Válido,1,2,0\n'
+        )
+        self.assertEqual((reporte.insertados, reporte.num_errores), (1, 4))
+        self.assertEqual(
+            [error.split(':')[0] for error in reporte.errores],
+            ['Línea 2', 'Línea 3', 'Línea 4', 'Línea 5'],
+        )
+        self.assertTrue(Producto.objects.filter(codigo_barras='7508000000007').exists())
+
+        reporte = self.importar('codigo_barras,nombre\n7508000000008,Sin precios\n')
+        self.assertEqual(reporte.errores, ['Línea 2: producto nuevo sin precio_compra, precio_venta'])
+
+    def test_ceros_a_la_izquierda_en_celdas_xlsx(self):
+        # Celdas con la forma de las de openpyxl, que no se instala con el proyecto
+        casos = [
+            (7501234, '0000000000000', '0000007501234'),
+            (7501234.0, '00000000', '07501234'),
+            (7501234, 'General', 7501234),
+            ('0075', '@', '0075'),
+        ]
+        for valor, formato, esperado in casos:
+            with self.subTest(valor=valor, formato=formato):
+                celda = SimpleNamespace(value=valor, number_format=formato)
+                self.assertEqual(importacion._codigo_celda(celda), esperado)
+
+
+class ExportacionVentasTest(TestCase):
+    """Exportación de ventas: filtros de fecha y estado, y ventas archivadas intercaladas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_exportar', 'admin@ejemplo.com', 'admin123')
+        cls.producto = Producto.objects.create(
+            codigo_barras='7509000000001',
+            nombre='Aceite',
+            precio_compra=30,
+            precio_venta=45,
+            stock=20,
+        )
+        cls.ventas = {}
+        for dias_atras, estado in ((300, 'completada'), (200, 'completada'), (100, 'cancelada'), (10, 'completada')):
+            venta, _ = procesar_checkout([{'producto_id': cls.producto.id, 'cantidad': 1, 'precio_unitario': 45}])
+            Venta.objects.filter(id=venta.id).update(
+                fecha=timezone.now() - timedelta(days=dias_atras), estado=estado,
+            )
+            cls.ventas[dias_atras] = venta.id
+        archivo.archivar(dias=180)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def exportar(self, dias_desde, dias_hasta=0, **filtros):
+        hoy = timezone.localdate()
+        respuesta = self.client.get(reverse('productos:exportar_ventas'), {
+            'desde': hoy - timedelta(days=dias_desde),
+            'hasta': hoy - timedelta(days=dias_hasta),
+            'formato': 'jsonl',
+            **filtros,
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        return [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+
+    def test_archivadas_y_activas_en_orden_de_fecha(self):
+        self.assertEqual(VentaArchivada.objects.count(), 2)
+        filas = self.exportar(400)
+        self.assertEqual([fila['venta_id'] for fila in filas], [self.ventas[d] for d in (300, 200, 100, 10)])
+        self.assertEqual({fila['codigo_barras'] for fila in filas}, {'7509000000001'})
+
+    def test_filtros_de_fecha_y_estado(self):
+        self.assertEqual(
+            [fila['venta_id'] for fila in self.exportar(250, 50)],
+            [self.ventas[200], self.ventas[100]],
+        )
+        self.assertEqual([fila['venta_id'] for fila in self.exportar(400, estado='cancelada')], [self.ventas[100]])
+        self.assertEqual(
+            [fila['venta_id'] for fila in self.exportar(400, estado='completada')],
+            [self.ventas[300], self.ventas[200], self.ventas[10]],
+        )
+
+    def test_csv_y_errores(self):
+        hoy = timezone.localdate()
+        respuesta = self.client.get(reverse('productos:exportar_ventas'), {'desde': hoy - timedelta(days=20)})
+        lineas = b''.join(respuesta.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0].split(','), list(exportacion.COLUMNAS))
+        self.assertEqual(len(lineas), 2)
+
+        respuesta = self.client.get(
+            reverse('productos:exportar_ventas'), {'desde': hoy, 'hasta': hoy - timedelta(days=1)},
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('error', respuesta.json())
+
+
+class MetricasTest(TestCase):
+    """Métricas por vista en formato de Prometheus y detección de N+1"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_metricas', 'admin@ejemplo.com', 'admin123')
+
+    def setUp(self):
+        metricas.registro.limpiar()
+        self.addCleanup(metricas.registro.limpiar)
+
+    def medir(self, consultas):
+        """Pasa una petición por el middleware con una vista que ejecuta `consultas` SELECT iguales"""
+        def vista(request):
+            for _ in range(consultas):
+                Producto.objects.filter(id=1).exists()
+            return HttpResponse('hola')
+
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(view_name='prueba:vista')
+        return metricas.MetricasMiddleware(vista)(request)
+
+    def test_formato_prometheus(self):
+        metricas.registro.registrar('productos:lista', 0.03, 3, 0.01, 100, 200, False)
+        metricas.registro.registrar('productos:lista', 0.2, 60, 0.05, 50, 404, True)
+        texto = metricas.exportar_prometheus()
+        lineas = texto.splitlines()
+
+        self.assertTrue(texto.endswith('\n'))
+        self.assertIn('# TYPE pos_peticion_segundos histogram', lineas)
+        # Buckets acumulados: cada observación cuenta en su límite y en todos los mayores
+        self.assertIn('pos_peticion_segundos_bucket{vista="productos:lista",le="0.025"} 0', lineas)
+        self.assertIn('pos_peticion_segundos_bucket{vista="productos:lista",le="0.05"} 1', lineas)
+        self.assertIn('pos_peticion_segundos_bucket{vista="productos:lista",le="0.25"} 2', lineas)
+        self.assertIn('pos_peticion_segundos_bucket{vista="productos:lista",le="+Inf"} 2', lineas)
+        self.assertIn('pos_peticion_segundos_count{vista="productos:lista"} 2', lineas)
+        self.assertIn('pos_consultas_por_peticion_bucket{vista="productos:lista",le="50"} 1', lineas)
+        self.assertIn('pos_respuesta_bytes_total{vista="productos:lista"} 150', lineas)
+        self.assertIn('pos_respuestas_total{vista="productos:lista",codigo="2xx"} 1', lineas)
+        self.assertIn('pos_respuestas_total{vista="productos:lista",codigo="4xx"} 1', lineas)
+        self.assertIn('pos_n_mas_uno_total{vista="productos:lista"} 1', lineas)
+
+    def test_etiquetas_escapadas(self):
+        metricas.registro.registrar('rara"\\vista', 0.01, 1, 0, 0, 200, False)
+        self.assertIn('pos_n_mas_uno_total{vista="rara\\"\\\\vista"} 0', metricas.exportar_prometheus())
+
+    def test_n_mas_uno(self):
+        with self.assertNoLogs('productos.metricas', 'WARNING'):
+            self.medir(metricas.UMBRAL_DUPLICADAS - 1)
+        with self.assertLogs('productos.metricas', 'WARNING') as logs:
+            self.medir(metricas.UMBRAL_DUPLICADAS)
+        self.assertIn('Posible N+1 en prueba:vista', logs.output[0])
+
+        vista = metricas.registro.copia()['prueba:vista']
+        self.assertEqual(vista.n_mas_uno, 1)
+        self.assertEqual(vista.consultas.total, 2)
+        self.assertEqual(vista.consultas.suma, 2 * metricas.UMBRAL_DUPLICADAS - 1)
+        self.assertEqual(vista.bytes, 2 * len('hola'))
+
+    def test_vista_de_metricas(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('productos:lista'))
+        respuesta = self.client.get(reverse('productos:metricas'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('pos_peticion_segundos_count{vista="productos:lista"} 1', respuesta.content.decode())
+
+
+class ReordenTest(TestCase):
+    """bajo_stock(), el filtro del admin y los números del reporte de reorden"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin_reorden', 'admin@ejemplo.com', 'admin123')
+        cls.productos = {}
+        for i, (nombre, stock, activo) in enumerate([
+            ('Agotado', 0, True),
+            ('Bajo rápido', 3, True),
+            ('Bajo sin venta', 4, True),
+            ('En el mínimo', 5, True),
+            ('Suficiente', 6, True),
+            ('Inactivo', 1, False),
+        ]):
+            cls.productos[nombre] = Producto.objects.create(
+                codigo_barras=f'751000000000{i}',
+                nombre=nombre,
+                precio_compra=10,
+                precio_venta=15,
+                stock=stock,
+                stock_minimo=5,
+                activo=activo,
+            )
+        hoy = timezone.localdate()
+        for nombre, unidades, dias_atras in [
+            ('Agotado', 30, 3),
+            ('Bajo rápido', 60, 0),
+            ('En el mínimo', 10, 5),
+            # Fuera de la ventana de 30 días
+            ('En el mínimo', 500, 40),
+        ]:
+            ResumenProductoDiario.objects.create(
+                fecha=hoy - timedelta(days=dias_atras), producto=cls.productos[nombre], unidades=unidades,
+            )
+
+    def test_bajo_stock(self):
+        self.assertEqual(
+            set(Producto.objects.bajo_stock().values_list('nombre', flat=True)),
+            {'Agotado', 'Bajo rápido', 'Bajo sin venta', 'En el mínimo', 'Inactivo'},
+        )
+        self.assertEqual(list(Producto.objects.agotados().values_list('nombre', flat=True)), ['Agotado'])
+
+    def test_filtro_del_admin(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:productos_producto_changelist')
+        esperados = {
+            'reordenar': {'Agotado', 'Bajo rápido', 'Bajo sin venta', 'En el mínimo', 'Inactivo'},
+            'agotado': {'Agotado'},
+            'ok': {'Suficiente'},
+        }
+        for valor, nombres in esperados.items():
+            with self.subTest(nivel_stock=valor):
+                respuesta = self.client.get(url, {'nivel_stock': valor})
+                self.assertEqual({p.nombre for p in respuesta.context['cl'].result_list}, nombres)
+
+    def test_numeros_del_reporte(self):
+        grupos = reorden.reporte(dias=30, cobertura=14)
+        self.assertEqual([fila['nombre'] for fila in grupos['agotado']], ['Agotado'])
+        # Los que antes se acaban primero; sin ventas al final
+        self.assertEqual(
+            [fila['nombre'] for fila in grupos['bajo']],
+            ['Bajo rápido', 'En el mínimo', 'Bajo sin venta'],
+        )
+        filas = {fila['nombre']: fila for grupo in grupos.values() for fila in grupo}
+
+        agotado = filas['Agotado']
+        self.assertEqual((agotado['vendidas'], agotado['velocidad'], agotado['dias_restantes']), (30, 1.0, 0.0))
+        # 5 de mínimo + 14 días a 1 por día
+        self.assertEqual((agotado['sugerido'], agotado['costo_estimado']), (19, Decimal('190.00')))
+
+        rapido = filas['Bajo rápido']
+        self.assertEqual((rapido['velocidad'], rapido['dias_restantes'], rapido['sugerido']), (2.0, 1.5, 30))
+
+        # Sin ventas alcanza justo para salir del mínimo
+        sin_venta = filas['Bajo sin venta']
+        self.assertEqual((sin_venta['vendidas'], sin_venta['dias_restantes'], sin_venta['sugerido']), (0, None, 2))
+
+        self.assertEqual(filas['En el mínimo']['vendidas'], 10)
+
+    def test_csv(self):
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse('productos:reporte_reorden'), {'formato': 'csv'})
+        lineas = respuesta.content.decode().splitlines()
+        self.assertEqual(lineas[0], 'grupo,' + ','.join(reorden.COLUMNAS_CSV))
+        self.assertEqual(lineas[1].split(',')[:2], ['agotado', '7510000000000'])
+        self.assertEqual(len(lineas), 5)
+
+
+class TypeaheadTest(TransactionTestCase):
+    """
+    El índice del autocompletado se reconstruye cuando cambia la versión
+    compartida. La reconstrucción corre en otro hilo con su propia conexión,
+    que sólo ve datos confirmados: por eso TransactionTestCase.
+    """
+
+    def setUp(self):
+        typeahead.indice.version = None
+        self.addCleanup(setattr, typeahead.indice, 'version', None)
+        admin = User.objects.create_superuser('admin_typeahead', 'admin@ejemplo.com', 'admin123')
+        self.client.force_login(admin)
+        Producto.objects.create(
+            codigo_barras='7511000000001',
+            nombre='Mermelada de fresa',
+            precio_compra=20,
+            precio_venta=32,
+            stock=6,
+        )
+
+    def buscar(self, termino):
+        respuesta = self.client.get(reverse('productos:typeahead'), {'q': termino})
+        return [fila['nombre'] for fila in respuesta.json()['resultados']]
+
+    def test_incremento_de_version_reconstruye(self):
+        self.assertEqual(self.buscar('mermel'), ['Mermelada de fresa'])
+        version = typeahead.version()
+        self.assertEqual(typeahead.indice.version, version)
+
+        # Fuera de una transacción el incremento es inmediato
+        Producto.objects.create(
+            codigo_barras='7511000000002', nombre='Mermelada de mango', precio_compra=20, precio_venta=32,
+        )
+        self.assertGreater(typeahead.version(), version)
+        self.assertEqual(self.buscar('mermel'), ['Mermelada de fresa', 'Mermelada de mango'])
+        self.assertEqual(typeahead.indice.version, typeahead.version())
+
+    def test_reconstruye_fuera_del_hilo_compartido(self):
+        with mock.patch('productos.views.sync_to_async', wraps=sync_to_async) as envolver:
+            self.buscar('fresa')
+            envolver.assert_called_once_with(typeahead.asegurar_en_hilo, thread_sensitive=False)
+
+            # Misma versión: ni reconstrucción ni salto de hilo
+            with mock.patch.object(typeahead.indice, 'construir') as construir:
+                self.assertEqual(self.buscar('fresa'), ['Mermelada de fresa'])
+            construir.assert_not_called()
+            self.assertEqual(envolver.call_count, 1)
+
+
+class CatalogoCacheTest(TestCase):
+    """Versión del catálogo al confirmar, marcas de stock rellenadas en cada petición y 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cajero = User.objects.create_user('cajero_catalogo', password='cajero123')
+        cls.producto = Producto.objects.create(
+            codigo_barras='7512000000001',
+            nombre='Harina',
+            precio_compra=15,
+            precio_venta=22,
+            stock=7,
+            stock_minimo=5,
+        )
+
+    def setUp(self):
+        caches[settings.PRODUCTOS_CACHE_ALIAS].clear()
+
+    def vender(self, cantidad):
+        with self.captureOnCommitCallbacks(execute=True):
+            procesar_checkout([{'producto_id': self.producto.id, 'cantidad': cantidad, 'precio_unitario': 22}])
+
+    def test_version_cambia_al_confirmar(self):
+        version = catalogo.version()
+        producto = Producto.objects.get(id=self.producto.id)
+        producto.precio_venta = 24
+        with self.captureOnCommitCallbacks() as callbacks:
+            producto.save()
+        self.assertEqual(catalogo.version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(catalogo.version(), version)
+
+        # Una venta sólo cambia el stock: la versión se queda
+        version = catalogo.version()
+        self.vender(1)
+        self.assertEqual(catalogo.version(), version)
+
+    def test_marcas_de_stock_rellenadas(self):
+        html = self.client.get(reverse('productos:lista')).content.decode()
+        self.assertNotIn('<!--stock:', html)
+        self.assertNotIn(' Bajo</span>', html)
+
+        # La tabla sale de la caché (misma versión) pero el stock es el de ahora
+        self.vender(3)
+        with mock.patch('productos.views._tabla_lista') as generar:
+            html = self.client.get(reverse('productos:lista')).content.decode()
+        generar.assert_not_called()
+        self.assertNotIn('<!--stock:', html)
+        self.assertIn(' Bajo</span>', html)
+
+        self.assertEqual(catalogo.ids_stock('<!--stock:4:lista--> <!--stock:9:pos-->'), {4, 9})
+        self.assertEqual(catalogo.rellenar_stock('[<!--stock:999999:lista-->]', {}), '[]')
+
+    def test_304_hasta_que_cambia_el_stock(self):
+        url = reverse('productos:lista')
+        respuesta = self.client.get(url)
+        etag = respuesta['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.vender(1)
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_304_en_paginas_del_grid(self):
+        self.client.force_login(self.cajero)
+        url = reverse('productos:productos_pos')
+        respuesta = self.client.get(url)
+        self.assertEqual([p['stock'] for p in respuesta.json()['productos']], [7])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+
+        self.vender(2)
+        nueva = self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual([p['stock'] for p in nueva.json()['productos']], [5])
+
+
+@override_settings(PRODUCTOS_REPLICA_DB='replica')
+class ReplicaTest(TransactionTestCase):
+    """
+    A qué base va cada lectura. Sólo se pregunta al router (QuerySet.db), sin
+    consultar la réplica, que no existe en las pruebas. TransactionTestCase:
+    dentro de una transacción de la primaria nunca se usa la réplica.
+    """
+
+    def base_lectura(self, modelo=Producto):
+        with replica.lecturas_replica():
+            return modelo.objects.all().db
+
+    def peticion(self, vista, **cookies):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        return replica.ReplicaMiddleware(vista)(request)
+
+    def test_enrutamiento(self):
+        self.assertEqual(Producto.objects.all().db, 'default')
+        self.assertEqual(self.base_lectura(), 'replica')
+        self.assertEqual(self.base_lectura(Venta), 'replica')
+        # Versiones de caché y usuarios siempre de la primaria
+        self.assertEqual(self.base_lectura(models.VersionCache), 'default')
+        self.assertEqual(self.base_lectura(User), 'default')
+        with transaction.atomic():
+            self.assertEqual(self.base_lectura(), 'default')
+        with override_settings(PRODUCTOS_REPLICA_DB=None):
+            self.assertEqual(self.base_lectura(), 'default')
+
+    def test_lee_lo_que_escribiste(self):
+        bases = []
+
+        def vista(request):
+            bases.append(self.base_lectura())
+            Producto.objects.create(
+                codigo_barras='7513000000001', nombre='Sal', precio_compra=5, precio_venta=9,
+            )
+            bases.append(self.base_lectura())
+            return HttpResponse()
+
+        respuesta = self.peticion(vista)
+        self.assertEqual(bases, ['replica', 'default'])
+        self.assertIn(replica.COOKIE_FIJADO, respuesta.cookies)
+
+        # La siguiente petición (el redirect) trae la cookie y lee de la primaria
+        def leer(request):
+            bases.append(self.base_lectura())
+            return HttpResponse()
+
+        bases.clear()
+        self.peticion(leer, **{replica.COOKIE_FIJADO: '1'})
+        self.assertEqual(bases, ['default'])
+
+        # Sin escribir ni cookie no se fija nada, y la fijación no sale de la petición
+        bases.clear()
+        respuesta = self.peticion(leer)
+        self.assertEqual(bases, ['replica'])
+        self.assertNotIn(replica.COOKIE_FIJADO, respuesta.cookies)
+        self.assertEqual(self.base_lectura(), 'replica')
+
+    def test_hilos_de_trabajo_no_quedan_fijados(self):
+        def escribir():
+            try:
+                Producto.objects.create(
+                    codigo_barras='7513000000002', nombre='Azúcar', precio_compra=20, precio_venta=28,
+                )
+            finally:
+                connection.close()
+
+        # Un solo hilo, como un worker de run_workers que toma un trabajo tras otro
+        with ThreadPoolExecutor(max_workers=1) as hilos:
+            hilos.submit(escribir).result()
+            self.assertEqual(hilos.submit(self.base_lectura).result(), 'replica')
+        self.assertEqual(self.base_lectura(), 'replica')
@@ -0,0 +1,196 @@
+"""
+Tickets de venta en HTML, ESC/POS (impresoras térmicas) y PDF.
+
+Una venta sólo cambia cuando cambia su fecha_actualizacion, así que cada
+ticket renderizado se guarda en caché con la clave
+(venta.id, fecha_actualizacion, formato) y se sirve con un ETag fuerte
+derivado de la misma clave.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+
+from . import archivo
+from .models import DetalleVenta, Venta, VentaArchivada
+
+FORMATOS = ('html', 'escpos', 'pdf')
+TIEMPO_CACHE = 7 * 24 * 3600
+
+ENCABEZADO = ('SISTEMA PDV', 'Tienda Wicho', 'RFC: XXX-XXXXXX-XXX')
+PIE = ('¡Gracias por su compra!', 'Conserve su ticket', 'www.sistemapos.com')
+
+# Impresora de 80 mm con fuente A: 42 columnas
+ANCHO_COLUMNAS = 42
+
+# Comandos ESC/POS
+ESC_INICIAR = b'\x1b@'
+ESC_CODIFICACION_PC850 = b'\x1bt\x02'
+ESC_CENTRAR = b'\x1ba\x01'
+ESC_IZQUIERDA = b'\x1ba\x00'
+ESC_NEGRITA = b'\x1bE\x01'
+ESC_NORMAL = b'\x1bE\x00'
+GS_CORTE_PARCIAL = b'\x1dVB\x00'
+
+# PDF: 80 mm a 203 dpi, como la impresora térmica
+PDF_ANCHO = 576
+PDF_MARGEN = 16
+PDF_DPI = 203
+PDF_TAMANO_FUENTE = 20
+
+
+def _cache():
+    return caches[getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')]
+
+
+def version(venta_id):
+    """fecha_actualizacion de la venta, o Http404 si no existe"""
+    fecha = Venta.objects.filter(id=venta_id).values_list('fecha_actualizacion', flat=True).first()
+    if fecha is None:
+        # Las ventas viejas pueden estar en el archivo
+        fecha = VentaArchivada.objects.filter(id=venta_id).values_list('fecha_actualizacion', flat=True).first()
+    if fecha is None:
+        raise Http404('Venta no encontrada')
+    return fecha
+
+
+def clave(venta_id, fecha_actualizacion, formato):
+    return f'ticket:{venta_id}:{fecha_actualizacion.timestamp()}:{formato}'
+
+
+def etag(venta_id, fecha_actualizacion, formato, extra=''):
+    """ETag fuerte; `extra` distingue respuestas que dependen de algo más (p. ej. el usuario)"""
+    base = clave(venta_id, fecha_actualizacion, formato) + extra
+    return '"{}"'.format(hashlib.sha1(base.encode()).hexdigest())
+
+
+def cargar_venta(venta_id):
+    """Venta y sus detalles (con producto) en una sola consulta"""
+    detalles = list(
+        DetalleVenta.objects
+        .filter(venta_id=venta_id)
+        .select_related('venta', 'producto')
+        .order_by('id')
+    )
+    if detalles:
+        return detalles[0].venta, detalles
+    # Venta sin detalles o archivada: no hay detalle activo desde el cual traerla
+    venta = archivo.obtener_venta(venta_id)
+    if isinstance(venta, VentaArchivada):
+        return venta, archivo.detalles_archivados(venta_id)
+    return venta, []
+
+
+def obtener(venta_id, fecha_actualizacion, formato):
+    """
+    (contenido, versión) del ticket: str para html, bytes para escpos y pdf.
+    Si la venta cambió después de leer fecha_actualizacion, se renderiza y
+    regresa la versión nueva; la clave de caché y el ETag se toman de ella.
+    """
+    cache = _cache()
+    contenido = cache.get(clave(venta_id, fecha_actualizacion, formato))
+    if contenido is not None:
+        return contenido, fecha_actualizacion
+    venta, detalles = cargar_venta(venta_id)
+    contenido = RENDERIZADORES[formato](venta, detalles)
+    cache.set(clave(venta_id, venta.fecha_actualizacion, formato), contenido, TIEMPO_CACHE)
+    return contenido, venta.fecha_actualizacion
+
+
+def renderizar_html(venta, detalles):
+    return render_to_string('productos/includes/ticket.html', {
+        'venta': venta,
+        'detalles': detalles,
+    })
+
+
+def _lineas(venta, detalles, ancho=ANCHO_COLUMNAS):
+    """
+    Contenido del ticket como lista de (estilo, izquierda, derecha), común a
+    ESC/POS y PDF. estilo es 'normal', 'separador' o contiene 'centro'/'negrita'.
+    """
+    lineas = [('negrita-centro', ENCABEZADO[0], '')]
+    lineas += [('centro', texto, '') for texto in ENCABEZADO[1:]]
+    lineas.append(('separador', '', ''))
+    lineas.append(('normal', 'Ticket:', f'#{venta.id}'))
+    lineas.append(('normal', 'Fecha:', timezone.localtime(venta.fecha).strftime('%d/%m/%Y %H:%M')))
+    lineas.append(('normal', 'Estado:', venta.get_estado_display()))
+    lineas.append(('separador', '', ''))
+    for detalle in detalles:
+        lineas.append(('normal', detalle.producto.nombre[:ancho], ''))
+        lineas.append((
+            'normal',
+            f'  {detalle.cantidad} x ${detalle.precio_unitario}',
+            f'${detalle.subtotal}',
+        ))
+    lineas.append(('separador', '', ''))
+    lineas.append(('negrita', 'TOTAL:', f'${venta.total}'))
+    lineas.append(('separador', '', ''))
+    lineas += [('centro', texto, '') for texto in PIE]
+    return lineas
+
+
+def renderizar_escpos(venta, detalles, ancho=ANCHO_COLUMNAS):
+    """Flujo de bytes ESC/POS listo para enviar a la impresora térmica"""
+    salida = bytearray(ESC_INICIAR + ESC_CODIFICACION_PC850)
+    for estilo, izquierda, derecha in _lineas(venta, detalles, ancho):
+        if estilo == 'separador':
+            texto = '-' * ancho
+        elif derecha:
+            espacio = max(ancho - len(izquierda) - len(derecha), 1)
+            texto = izquierda + ' ' * espacio + derecha
+        else:
+            texto = izquierda
+
+        salida += ESC_CENTRAR if 'centro' in estilo else ESC_IZQUIERDA
+        salida += ESC_NEGRITA if 'negrita' in estilo else ESC_NORMAL
+        salida += texto.encode('cp850', errors='replace') + b'\n'
+
+    salida += ESC_NORMAL + ESC_IZQUIERDA + b'\n\n\n' + GS_CORTE_PARCIAL
+    return bytes(salida)
+
+
+def renderizar_pdf(venta, detalles):
+    """PDF de una página del ancho de un rollo de 80 mm, dibujado con Pillow"""
+    fuente = ImageFont.load_default(size=PDF_TAMANO_FUENTE)
+    alto_linea = int(PDF_TAMANO_FUENTE * 1.5)
+    lineas = _lineas(venta, detalles)
+
+    imagen = Image.new('RGB', (PDF_ANCHO, alto_linea * (len(lineas) + 2)), 'white')
+    dibujo = ImageDraw.Draw(imagen)
+    y = alto_linea
+    for estilo, izquierda, derecha in lineas:
+        if estilo == 'separador':
+            dibujo.line(
+                [(PDF_MARGEN, y + alto_linea // 2), (PDF_ANCHO - PDF_MARGEN, y + alto_linea // 2)],
+                fill='black',
+            )
+        elif 'centro' in estilo:
+            dibujo.text((PDF_ANCHO // 2, y), izquierda, font=fuente, fill='black', anchor='ma')
+        else:
+            dibujo.text((PDF_MARGEN, y), izquierda, font=fuente, fill='black')
+            if derecha:
+                dibujo.text((PDF_ANCHO - PDF_MARGEN, y), derecha, font=fuente, fill='black', anchor='ra')
+        if 'negrita' in estilo:
+            # Sin fuente negrita empaquetada: se vuelve a dibujar desplazado 1 px
+            x = PDF_ANCHO // 2 + 1 if 'centro' in estilo else PDF_MARGEN + 1
+            dibujo.text((x, y), izquierda, font=fuente, fill='black', anchor='ma' if 'centro' in estilo else 'la')
+            if derecha:
+                dibujo.text((PDF_ANCHO - PDF_MARGEN + 1, y), derecha, font=fuente, fill='black', anchor='ra')
+        y += alto_linea
+
+    salida = BytesIO()
+    imagen.save(salida, 'PDF', resolution=PDF_DPI)
+    return salida.getvalue()
+
+
+RENDERIZADORES = {
+    'html': renderizar_html,
+    'escpos': renderizar_escpos,
+    'pdf': renderizar_pdf,
+}
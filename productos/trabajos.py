@@ -0,0 +1,199 @@
+"""
+Cola de trabajos en la base de datos.
+
+Las funciones registradas con @tarea se encolan con encolar(), que inserta
+el Trabajo con transaction.on_commit: si la transacción que lo pide se
+revierte, el trabajo no existe. run_workers los toma y ejecuta en un pool
+de hilos fuera de las peticiones.
+
+- Toma: un UPDATE condicional (estado='pendiente' -> 'en_proceso') por
+  trabajo; si otro trabajador lo tomó primero, el UPDATE no cambia filas.
+- Ejecución: la tarea y el cambio a 'completado' van en la misma
+  transacción, así que sus escrituras en la base ocurren una sola vez.
+- Reintentos: con error vuelve a 'pendiente' con espera exponencial
+  (ESPERA_BASE * 2^intentos) hasta max_intentos; después queda 'fallido'.
+- Abandonados: un trabajo 'en_proceso' por más de TIEMPO_MAXIMO (el
+  trabajador murió) regresa a la cola.
+- Deduplicación: con clave_unica, encolar lo mismo mientras hay uno
+  pendiente o en proceso no crea otro.
+- Historial: los completados se borran después de DIAS_HISTORIAL días.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+
+from .models import Trabajo
+
+logger = logging.getLogger('productos.trabajos')
+
+TAREAS = {}
+ESPERA_BASE = 5
+ESPERA_MAXIMA = 3600
+TIEMPO_MAXIMO = timedelta(minutes=10)
+DIAS_HISTORIAL = 7
+
+
+def tarea(nombre=None, max_intentos=5):
+    """Registra una función como tarea; se llama con los argumentos del trabajo"""
+    def decorador(funcion):
+        TAREAS[nombre or funcion.__name__] = (funcion, max_intentos)
+        return funcion
+    return decorador
+
+
+def _insertar(nombre, clave, argumentos):
+    _, max_intentos = TAREAS[nombre]
+    try:
+        # Savepoint propio: un duplicado no debe romper la transacción de quien encola
+        with transaction.atomic():
+            return Trabajo.objects.create(
+                tarea=nombre,
+                argumentos=argumentos,
+                clave_unica=clave,
+                max_intentos=max_intentos,
+            )
+    except IntegrityError:
+        # Ya hay uno pendiente o en proceso con la misma clave
+        return None
+
+
+def encolar(nombre, clave=None, **argumentos):
+    """
+    Encola la tarea al confirmar la transacción actual (de inmediato fuera
+    de una). Los argumentos deben poder guardarse como JSON.
+    """
+    if nombre not in TAREAS:
+        raise ValueError(f'Tarea no registrada: {nombre}')
+    transaction.on_commit(lambda: _insertar(nombre, clave, argumentos))
+
+
+def espera(intentos):
+    """Segundos antes del siguiente intento, con un poco de azar para no sincronizar reintentos"""
+    segundos = min(ESPERA_BASE * 2 ** max(intentos - 1, 0), ESPERA_MAXIMA)
+    return segundos * random.uniform(0.8, 1.2)
+
+
+def disponibles(ahora):
+    """Pendientes que ya pueden correr, en orden de llegada (índice trabajo_disponible_idx)"""
+    return (
+        Trabajo.objects
+        .filter(estado='pendiente', disponible_en__lte=ahora)
+        .order_by('disponible_en', 'id')
+    )
+
+
+def tomar(trabajador, cantidad=1):
+    """Marca como en proceso hasta `cantidad` trabajos disponibles y los regresa"""
+    ahora = timezone.now()
+    candidatos = list(disponibles(ahora).values_list('id', flat=True)[:cantidad * 2])
+    tomados = []
+    for trabajo_id in candidatos:
+        if len(tomados) == cantidad:
+            break
+        ganado = Trabajo.objects.filter(id=trabajo_id, estado='pendiente').update(
+            estado='en_proceso',
+            iniciado=ahora,
+            trabajador=trabajador,
+            intentos=F('intentos') + 1,
+        )
+        if ganado:
+            tomados.append(trabajo_id)
+    return list(Trabajo.objects.filter(id__in=tomados).order_by('id'))
+
+
+def ejecutar(trabajo):
+    """Corre un trabajo ya tomado y registra el resultado. Regresa True si terminó bien"""
+    funcion, _ = TAREAS.get(trabajo.tarea, (None, None))
+    try:
+        if funcion is None:
+            raise LookupError(f'Tarea no registrada: {trabajo.tarea}')
+        with transaction.atomic():
+            funcion(**trabajo.argumentos)
+            Trabajo.objects.filter(id=trabajo.id).update(
+                estado='completado',
+                terminado=timezone.now(),
+                error='',
+            )
+        return True
+    except Exception:
+        error = traceback.format_exc()
+        ahora = timezone.now()
+        if trabajo.intentos >= trabajo.max_intentos:
+            logger.error('Trabajo %s falló definitivamente:\n%s', trabajo, error)
+            cambios = {'estado': 'fallido', 'terminado': ahora}
+        else:
+            logger.warning('Trabajo %s falló (intento %d), se reintentará', trabajo, trabajo.intentos)
+            cambios = {'estado': 'pendiente', 'disponible_en': ahora + timedelta(seconds=espera(trabajo.intentos))}
+        Trabajo.objects.filter(id=trabajo.id).update(error=error[-5000:], **cambios)
+        return False
+
+
+def recuperar_abandonados(tiempo_maximo=TIEMPO_MAXIMO):
+    """
+    Regresa a la cola los trabajos en proceso de un trabajador que no
+    terminó; si ya agotaron sus intentos (p. ej. tiran al trabajador cada
+    vez) quedan fallidos.
+    """
+    ahora = timezone.now()
+    abandonados = Trabajo.objects.filter(estado='en_proceso', iniciado__lt=ahora - tiempo_maximo)
+    fallidos = abandonados.filter(intentos__gte=F('max_intentos')).update(
+        estado='fallido',
+        terminado=ahora,
+        error='El trabajador no terminó el trabajo',
+    )
+    return abandonados.update(estado='pendiente', disponible_en=ahora) + fallidos
+
+
+def purgar(dias=DIAS_HISTORIAL):
+    """Borra los trabajos completados hace más de `dias` días"""
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = Trabajo.objects.filter(estado='completado', terminado__lt=limite).delete()
+    return borrados
+
+
+def reintentar(trabajos):
+    """Vuelve a encolar trabajos fallidos con sus intentos en cero"""
+    return trabajos.filter(estado='fallido').update(
+        estado='pendiente',
+        intentos=0,
+        disponible_en=timezone.now(),
+        terminado=None,
+    )
+
+
+def estadisticas(desde=None):
+    """
+    Profundidad de la cola por estado, antigüedad del pendiente más viejo y
+    latencia (creado -> iniciado) y duración de los terminados desde `desde`
+    (la última hora por defecto).
+    """
+    ahora = timezone.now()
+    desde = desde or ahora - timedelta(hours=1)
+    por_estado = dict(
+        Trabajo.objects.order_by().values_list('estado').annotate(total=Count('id'))
+    )
+    mas_viejo = (
+        Trabajo.objects
+        .filter(estado='pendiente')
+        .aggregate(creado=Min('creado'))['creado']
+    )
+    tiempos = (
+        Trabajo.objects
+        .filter(estado='completado', iniciado__gte=desde)
+        .aggregate(
+            terminados=Count('id'),
+            latencia_promedio=Avg(ExpressionWrapper(F('iniciado') - F('creado'), output_field=DurationField())),
+            latencia_maxima=Max(ExpressionWrapper(F('iniciado') - F('creado'), output_field=DurationField())),
+            duracion_promedio=Avg(ExpressionWrapper(F('terminado') - F('iniciado'), output_field=DurationField())),
+        )
+    )
+    return {
+        'por_estado': [(clave, nombre, por_estado.get(clave, 0)) for clave, nombre in Trabajo.ESTADO_CHOICES],
+        'antiguedad_pendiente': ahora - mas_viejo if mas_viejo else None,
+        **tiempos,
+    }
@@ -0,0 +1,164 @@
+"""
+Turnos de caja.
+
+Cada TurnoCaja lleva, por estado de venta, el número de ventas y la suma
+de sus totales. Los contadores se actualizan con F() dentro de la misma
+transacción que registra, cambia de estado o borra una venta del turno:
+registrar_venta() para el checkout y aplicar_ventas(ids, -1/+1) alrededor
+de cualquier otro cambio (con el mismo patrón que resumenes.py). El corte
+de caja es la lectura de una fila.
+
+Un turno cerrado ya entregó su corte: las ventas que le pertenecen no
+cambian de estado ni se editan o borran (verificar_abiertos() y los
+permisos del admin).
+
+conciliar() compara los contadores con la suma completa de las ventas del
+turno, activas y archivadas, y con corregir=True los reemplaza.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import TurnoCaja, Venta, VentaArchivada
+
+CERO = Decimal('0.00')
+# Estado de la venta -> (contador, total) en TurnoCaja
+CAMPOS = {
+    'completada': ('ventas_completadas', 'total_completadas'),
+    'cancelada': ('ventas_canceladas', 'total_canceladas'),
+    'pendiente': ('ventas_pendientes', 'total_pendientes'),
+}
+
+
+def abierto(usuario):
+    """Turno abierto del cajero, o None"""
+    return TurnoCaja.objects.filter(usuario=usuario, estado='abierto').first()
+
+
+def abrir(usuario, caja, fondo_inicial=CERO):
+    """Abre un turno; ValueError si la caja o el cajero ya tienen uno abierto"""
+    try:
+        with transaction.atomic():
+            return TurnoCaja.objects.create(usuario=usuario, caja=caja, fondo_inicial=fondo_inicial)
+    except IntegrityError:
+        raise ValueError(f'La caja {caja} o el cajero ya tienen un turno abierto')
+
+
+def cerrar(turno_id, efectivo_contado):
+    """Cierra el turno con el efectivo contado y lo regresa con sus totales"""
+    with transaction.atomic():
+        cerrados = TurnoCaja.objects.filter(id=turno_id, estado='abierto').update(
+            estado='cerrado',
+            cerrado=timezone.now(),
+            efectivo_contado=efectivo_contado,
+        )
+        if not cerrados:
+            raise ValueError('El turno ya está cerrado')
+        return TurnoCaja.objects.get(id=turno_id)
+
+
+def registrar_venta(turno_id, estado, total):
+    """Suma una venta nueva a su turno; ValueError si el turno ya se cerró"""
+    campo_ventas, campo_total = CAMPOS[estado]
+    actualizados = TurnoCaja.objects.filter(id=turno_id, estado='abierto').update(**{
+        campo_ventas: F(campo_ventas) + 1,
+        campo_total: F(campo_total) + total,
+    })
+    if not actualizados:
+        raise ValueError('El turno de caja está cerrado; abra uno nuevo')
+
+
+def verificar_abiertos(venta_ids):
+    """
+    Lanza ValueError si alguna de las ventas pertenece a un turno cerrado.
+    Bloquea sus turnos con select_for_update() para que ninguno se cierre
+    antes de que termine la transacción.
+    """
+    turno_ids = set(
+        Venta.objects.filter(id__in=list(venta_ids), turno_id__isnull=False).values_list('turno_id', flat=True)
+    )
+    if not turno_ids:
+        return
+    estados = TurnoCaja.objects.select_for_update().filter(id__in=turno_ids).values_list('id', 'estado')
+    cerrados = sorted(turno_id for turno_id, estado in estados if estado == 'cerrado')
+    if cerrados:
+        raise ValueError(
+            f'Hay ventas de turnos de caja cerrados ({", ".join(f"#{turno_id}" for turno_id in cerrados)}); no se pueden cambiar'
+        )
+
+
+def _por_turno(ventas):
+    return (
+        ventas
+        .filter(turno_id__isnull=False)
+        .values('turno_id', 'estado')
+        .annotate(ventas=Count('id'), total=Sum('total'))
+        .order_by()
+    )
+
+
+def aplicar_ventas(venta_ids, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) las ventas indicadas, con su estado y
+    total actuales, a los contadores de sus turnos. Para cambiar una venta:
+    restar, cambiar y volver a sumar.
+    """
+    venta_ids = list(venta_ids)
+    if not venta_ids:
+        return
+    cambios = defaultdict(dict)
+    for fila in _por_turno(Venta.objects.filter(id__in=venta_ids)):
+        campo_ventas, campo_total = CAMPOS[fila['estado']]
+        cambios[fila['turno_id']][campo_ventas] = F(campo_ventas) + signo * fila['ventas']
+        cambios[fila['turno_id']][campo_total] = F(campo_total) + signo * (fila['total'] or CERO)
+    for turno_id, valores in cambios.items():
+        TurnoCaja.objects.filter(id=turno_id).update(**valores)
+
+
+def totales(turno_ids):
+    """Contadores calculados desde las ventas (activas y archivadas) de los turnos"""
+    resultado = defaultdict(lambda: {campo: 0 for par in CAMPOS.values() for campo in par})
+    for modelo in (Venta, VentaArchivada):
+        for fila in _por_turno(modelo.objects.filter(turno_id__in=turno_ids)):
+            campo_ventas, campo_total = CAMPOS[fila['estado']]
+            resultado[fila['turno_id']][campo_ventas] += fila['ventas']
+            resultado[fila['turno_id']][campo_total] += fila['total'] or CERO
+    return resultado
+
+
+def conciliar(turnos, corregir=False):
+    """
+    Compara los contadores de los turnos (un queryset de TurnoCaja) con
+    totales(). Regresa una lista de (turno, {campo: (guardado, calculado)})
+    con los que no coinciden; con corregir=True guarda los valores calculados.
+    """
+    diferencias = []
+    # Una sola transacción: las ventas que entren mientras tanto no quedan a medias
+    with transaction.atomic():
+        if corregir:
+            # Con los turnos bloqueados ninguna venta puede sumarse entre el
+            # cálculo y la corrección (registrar_venta espera el bloqueo)
+            turnos = turnos.select_for_update()
+        turnos = list(turnos)
+        calculados = totales([turno.id for turno in turnos])
+        for turno in turnos:
+            _comparar(turno, calculados[turno.id], corregir, diferencias)
+    return diferencias
+
+
+def _comparar(turno, esperado, corregir, diferencias):
+    distintos = {
+        campo: (getattr(turno, campo), valor)
+        for campo, valor in esperado.items()
+        if getattr(turno, campo) != valor
+    }
+    if not distintos:
+        return
+    diferencias.append((turno, distintos))
+    if corregir:
+        TurnoCaja.objects.filter(id=turno.id).update(
+            **{campo: valor for campo, (_, valor) in distintos.items()}
+        )
@@ -0,0 +1,163 @@
+"""
+Índice en memoria para el autocompletado del punto de venta.
+
+Cada proceso guarda los productos activos en dos estructuras:
+- una lista ordenada de claves (cada palabra del nombre normalizado, el
+  nombre completo y el código de barras) para buscar por prefijo con bisect;
+- el texto de todos los nombres y códigos unido en una sola cadena, para
+  buscar por subcadena con str.find (en C, sin recorrer objetos Python).
+
+El índice se reconstruye cuando cambia su versión, compartida por todos los
+procesos en la base de datos (versiones.py); invalidar() la incrementa al
+confirmar la transacción y se llama al guardar o borrar productos y en las
+operaciones masivas. El stock no forma parte del índice: la vista lo
+consulta sólo para los resultados.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+
+from django.db import close_old_connections
+
+from . import versiones
+from .busqueda import normalizar
+from .imagenes import campos_json
+from .models import Producto
+
+CLAVE_VERSION = 'typeahead'
+LIMITE = 10
+MAXIMO_LIMITE = 50
+# Separa los productos en el texto de búsqueda por subcadena
+SEPARADOR = '\x00'
+
+
+def version():
+    return versiones.leer(CLAVE_VERSION)
+
+
+async def aversion():
+    return await versiones.aleer(CLAVE_VERSION)
+
+
+def invalidar():
+    """
+    Marca el índice como desactualizado en todos los procesos al confirmar
+    la transacción actual (de inmediato fuera de una)
+    """
+    versiones.incrementar(CLAVE_VERSION)
+
+
+class IndicePrefijos:
+    def __init__(self):
+        self.version = None
+        # (productos, claves, ids_claves, texto, inicios, ids_texto): se
+        # reemplaza completa para que una búsqueda nunca mezcle dos versiones
+        self.estado = ({}, [], [], '', [], [])
+        self._candado = threading.Lock()
+
+    def asegurar(self, version_actual):
+        """Reconstruye el índice si su versión no es la actual"""
+        if self.version == version_actual:
+            return
+        with self._candado:
+            # Otro hilo pudo reconstruirlo mientras se esperaba el candado
+            if self.version != version_actual:
+                self.construir(version_actual)
+
+    def construir(self, version_actual):
+        productos = {}
+        entradas = []
+        partes = []
+        inicios = []
+        ids_texto = []
+        posicion = 0
+
+        filas = (
+            Producto.objects
+            .filter(activo=True)
+            .values_list('id', 'nombre', 'codigo_barras', 'precio_venta', 'imagen', 'miniaturas')
+            .order_by('nombre', 'id')
+        )
+        for producto_id, nombre, codigo, precio, imagen, miniaturas in filas.iterator(chunk_size=5000):
+            productos[producto_id] = (nombre, codigo, precio, imagen, miniaturas)
+            normalizado = normalizar(nombre)
+            entradas.append((codigo.lower(), producto_id))
+            entradas.append((normalizado, producto_id))
+            for palabra in set(normalizado.split()[1:]):
+                entradas.append((palabra, producto_id))
+
+            texto = f'{normalizado} {codigo.lower()}{SEPARADOR}'
+            inicios.append(posicion)
+            ids_texto.append(producto_id)
+            partes.append(texto)
+            posicion += len(texto)
+
+        entradas.sort()
+        self.estado = (
+            productos,
+            [clave for clave, _ in entradas],
+            [producto_id for _, producto_id in entradas],
+            ''.join(partes),
+            inicios,
+            ids_texto,
+        )
+        self.version = version_actual
+
+    def buscar(self, termino, limite=LIMITE):
+        """
+        Hasta `limite` pares (id, datos): primero los productos con una
+        palabra (o el código) que empieza con el término, luego los que lo
+        contienen.
+        """
+        termino = normalizar(termino).strip()
+        if not termino:
+            return []
+        productos, claves, ids_claves, texto, inicios, ids_texto = self.estado
+        encontrados = {}
+
+        inicio = bisect_left(claves, termino)
+        fin = bisect_right(claves, termino + '\uffff', lo=inicio)
+        for i in range(inicio, fin):
+            encontrados.setdefault(ids_claves[i], None)
+            if len(encontrados) >= limite:
+                break
+
+        posicion = texto.find(termino)
+        while posicion != -1 and len(encontrados) < limite:
+            indice = bisect_right(inicios, posicion) - 1
+            encontrados.setdefault(ids_texto[indice], None)
+            # Continuar en el siguiente producto
+            siguiente = inicios[indice + 1] if indice + 1 < len(inicios) else len(texto)
+            posicion = texto.find(termino, siguiente)
+        return [(producto_id, productos[producto_id]) for producto_id in encontrados]
+
+
+def resultado(producto_id, datos, stock):
+    """Dict para la respuesta JSON, con el mismo formato que productos_pos"""
+    nombre, codigo, precio, imagen, miniaturas = datos
+    if imagen:
+        campo = Producto._meta.get_field('imagen')
+        imagen = campo.attr_class(None, campo, imagen)
+    return {
+        'id': producto_id,
+        'nombre': nombre,
+        'codigo_barras': codigo,
+        'precio_venta': str(precio),
+        'stock': stock,
+        **campos_json(imagen, miniaturas),
+    }
+
+
+indice = IndicePrefijos()
+
+
+def asegurar_en_hilo(version_actual):
+    """
+    indice.asegurar() para un hilo del pool de sync_to_async con
+    thread_sensitive=False: la reconstrucción no ocupa el hilo compartido
+    con las demás llamadas síncronas. Al terminar cierra las conexiones del
+    hilo, que Django no cierra por sí solo fuera de una petición.
+    """
+    try:
+        indice.asegurar(version_actual)
+    finally:
+        close_old_connections()
@@ -10,6 +10,18 @@ urlpatterns = [
     path('', views.lista_productos, name='lista'),
     path('<int:producto_id>/', views.detalle_producto, name='detalle'),
     path('pos/', views.punto_venta, name='punto_venta'),
+    path('pos/productos/', views.productos_pos, name='productos_pos'),
+    path('pos/catalogo/', views.catalogo_pos, name='catalogo_pos'),
+    path('pos/buscar/', views.buscar_typeahead, name='typeahead'),
+    path('pos/scan/<str:codigo>/', views.escanear_codigo, name='escanear'),
+    path('pos/escaner/estadisticas/', views.estadisticas_escaner, name='estadisticas_escaner'),
     path('pos/procesar/', views.procesar_venta, name='procesar_venta'),
+    path('pos/procesar/lote/', views.procesar_lote_ventas, name='procesar_lote'),
+    path('pos/turno/', views.turno_caja, name='turno_caja'),
+    path('pos/turno/<int:turno_id>/corte/', views.corte_turno, name='corte_turno'),
     path('venta/<int:venta_id>/ticket/', views.ticket_venta, name='ticket_venta'),
+    path('venta/<int:venta_id>/ticket/<str:formato>/', views.ticket_venta, name='ticket_venta_formato'),
+    path('ventas/exportar/', views.exportar_ventas, name='exportar_ventas'),
+    path('reorden/', views.reporte_reorden, name='reporte_reorden'),
+    path('metricas/', views.metricas_prometheus, name='metricas'),
 ]
\ No newline at end of file
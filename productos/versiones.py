@@ -0,0 +1,44 @@
+"""
+Versiones compartidas de las cachés.
+
+El índice del autocompletado vive en la memoria de cada proceso, y el alias
+PRODUCTOS_CACHE_ALIAS puede ser una caché local (LocMem); una versión
+guardada ahí sólo la vería el proceso que la incrementó. La versión vive en
+la tabla cache_version de la primaria: todos los procesos y servidores leen
+la misma fila, así que un incremento invalida la caché en todos ellos.
+
+incrementar() actúa al confirmar la transacción actual (de inmediato fuera
+de una): antes del commit otra petición podría guardar los datos viejos con
+la versión nueva.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import VersionCache
+
+
+def _inicial():
+    # Una fila nueva (base recreada) no vuelve a 0: eso reutilizaría
+    # entradas guardadas con una versión anterior
+    return time.time_ns()
+
+
+def leer(nombre):
+    # get_or_create ya resuelve la carrera de dos procesos que la crean a la vez
+    return VersionCache.objects.get_or_create(nombre=nombre, defaults={'valor': _inicial()})[0].valor
+
+
+async def aleer(nombre):
+    return (await VersionCache.objects.aget_or_create(nombre=nombre, defaults={'valor': _inicial()}))[0].valor
+
+
+def _incrementar(nombre):
+    if not VersionCache.objects.filter(nombre=nombre).update(valor=F('valor') + 1):
+        leer(nombre)
+
+
+def incrementar(nombre):
+    """Incrementa la versión `nombre` al confirmar la transacción actual"""
+    transaction.on_commit(lambda: _incrementar(nombre))
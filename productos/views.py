@@ -1,152 +1,503 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.gzip import gzip_page
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.safestring import mark_safe
+from django.utils.http import http_date
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
-from django.db import transaction
-from .models import Producto, Venta, DetalleVenta
-from .forms import CustomLoginForm, BusquedaProductoForm
-from django.db.models import Q
-from decimal import Decimal
+from django.conf import settings
+from django.db import IntegrityError, OperationalError
+from django.utils import timezone
+from .models import Producto, TurnoCaja, Venta
+from .forms import (
+    AbrirTurnoForm, BusquedaProductoForm, CerrarTurnoForm, CustomLoginForm, ExportarVentasForm,
+)
+from .servicios import clave_valida, procesar_checkout, procesar_lote, validar_items
+from .paginacion import paginar_keyset
+from .imagenes import campos_json
+from .replica import en_replica, lecturas_replica
+from . import (
+    catalogo, escaner, exportacion, metricas, reorden, sincronizacion, tickets, turnos, typeahead,
+)
+import asyncio
 import json
+from asgiref.sync import sync_to_async
+
+
+# Columnas que realmente muestra cada vista (sin descripcion ni fechas)
+CAMPOS_LISTA = (
+    'id', 'codigo_barras', 'nombre', 'precio_compra', 'precio_venta', 'activo',
+)
+CAMPOS_POS = ('id', 'codigo_barras', 'nombre', 'precio_venta', 'stock', 'imagen', 'miniaturas')
+
+PRODUCTOS_POR_PAGINA = 50
+PRODUCTOS_POR_PAGINA_POS = 48
+MAXIMO_VENTAS_LOTE = 500
 
 
 def lista_productos(request):
-    """Lista pública de productos"""
-    productos = Producto.objects.all()
-    contexto = {
+    """Lista pública de productos (tabla en caché por versión del catálogo, stock al momento)"""
+    cursor = request.GET.get('cursor')
+    version = catalogo.version()
+    tabla = catalogo.obtener('lista', (cursor,), lambda: _tabla_lista(cursor), version_actual=version)
+    stock = catalogo.stock_actual(catalogo.ids_stock(tabla))
+    # La página incluye el encabezado del usuario: su ETag depende de él
+    etag = catalogo.etag('lista', cursor, extra=f':{request.user.pk}', stock=stock, version_actual=version)
+    ultima = catalogo.ultima_modificacion_stock(stock, version)
+    
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(ultima))
+    if response is None:
+        tabla = catalogo.rellenar_stock(tabla, stock)
+        response = render(request, 'productos/lista_productos.html', {'tabla': mark_safe(tabla)})
+        _condicionales(response, etag, ultima)
+    
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _tabla_lista(cursor):
+    productos, siguiente = paginar_keyset(
+        Producto.objects.only(*CAMPOS_LISTA),
+        cursor,
+        PRODUCTOS_POR_PAGINA,
+    )
+    return render_to_string('productos/includes/lista_productos.html', {
         'productos': productos,
-    }
-    return render(request, 'productos/lista_productos.html', contexto)
+        'siguiente_cursor': siguiente,
+        'es_primera_pagina': not cursor,
+    })
 
 
 def detalle_producto(request, producto_id):
-    """Detalle público de producto"""
-    producto = get_object_or_404(Producto, id=producto_id)
-    contexto = {
-        'producto': producto,
-    }
-    return render(request, 'productos/detalle_producto.html', contexto)
+    """
+    Detalle público de producto. Su fecha_actualizacion cambia con cada
+    cambio del producto (también los de stock), así que sirve de versión.
+    """
+    fecha = Producto.objects.filter(id=producto_id).values_list('fecha_actualizacion', flat=True).first()
+    if fecha is None:
+        raise Http404('Producto no encontrado')
+    etag = catalogo.etag_producto(producto_id, fecha, extra=f':{request.user.pk}')
+    
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(fecha))
+    if response is None:
+        producto = get_object_or_404(Producto, id=producto_id)
+        response = render(request, 'productos/detalle_producto.html', {
+            'producto': producto,
+        })
+        _condicionales(response, etag, fecha)
+    
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _timestamp(fecha):
+    return int(fecha.timestamp()) if fecha else None
+
+
+def _condicionales(response, etag, fecha):
+    response['ETag'] = etag
+    if fecha:
+        response['Last-Modified'] = http_date(fecha.timestamp())
 
 
 @login_required
 def punto_venta(request):
-    """Punto de venta con validaciones"""
-    form = BusquedaProductoForm(request.GET or None)
+    """Vista principal del POS; el grid sin búsqueda sale del caché del catálogo"""
+    # Ligado aunque no haya parámetros: sin filtros también es válido y se cachea
+    form = BusquedaProductoForm(request.GET)
+    if form.is_valid() and not form.cleaned_data['buscar'] and not request.GET.get('cursor'):
+        grid = catalogo.obtener(
+            'grid_pos',
+            (form.cleaned_data['activo'],),
+            lambda: _grid_pos(request),
+        )
+    else:
+        grid = _grid_pos(request)
+    grid = catalogo.rellenar_stock(grid, catalogo.stock_actual(catalogo.ids_stock(grid)))
     
-    productos = Producto.objects.filter(activo=True)
+    return render(request, 'productos/punto_venta.html', {
+        'grid': mark_safe(grid),
+        'form': form,
+    })
+
+
+def _grid_pos(request):
+    form, productos, siguiente = _pagina_pos(request)
+    return render_to_string('productos/includes/grid_pos.html', {
+        'productos': productos,
+        'siguiente_cursor': siguiente,
+    }, request=request)
+
+
+@login_required
+def productos_pos(request):
+    """Siguiente página del grid del punto de venta (scroll infinito, JSON)"""
+    form, productos, siguiente = _pagina_pos(request)
+    # El ETag incluye el stock de la página: una venta no cambia la versión del catálogo
+    etag = catalogo.etag(
+        'productos_pos',
+        request.GET.get('cursor'),
+        request.GET.get('activo'),
+        request.GET.get('buscar'),
+        stock={producto.id: producto.stock for producto in productos},
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({
+            'productos': [
+                {
+                    'id': producto.id,
+                    'nombre': producto.nombre,
+                    'codigo_barras': producto.codigo_barras,
+                    'precio_venta': str(producto.precio_venta),
+                    'stock': producto.stock,
+                    **campos_json(producto.imagen, producto.miniaturas),
+                }
+                for producto in productos
+            ],
+            'siguiente': siguiente,
+        })
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _pagina_pos(request):
+    """
+    Productos del grid del POS. Sin búsqueda se pagina por cursor;
+    con búsqueda se regresan los resultados más relevantes, sin cursor.
+    """
+    form = BusquedaProductoForm(request.GET or None)
+    productos = Producto.objects.filter(activo=True).only(*CAMPOS_POS)
     
     if form.is_valid():
-        buscar = form.cleaned_data.get('buscar')
-        activo = form.cleaned_data.get('activo')
-        
-        if buscar:
-            productos = productos.filter(
-                Q(nombre__icontains=buscar) |
-                Q(codigo_barras__icontains=buscar)
-            )
-        
-        if activo == '1':
-            productos = productos.filter(activo=True)
-        elif activo == '0':
-            productos = productos.filter(activo=False)
+        productos = form.filtrar(productos)
+        if form.cleaned_data.get('buscar'):
+            return form, list(productos), None
     
-    productos = productos.order_by('-activo', 'nombre')
+    productos, siguiente = paginar_keyset(
+        productos,
+        request.GET.get('cursor'),
+        PRODUCTOS_POR_PAGINA_POS,
+    )
+    return form, productos, siguiente
+
+
+@login_required
+@gzip_page
+@condition(etag_func=lambda request: sincronizacion.etag(request.GET.get('desde')))
+def catalogo_pos(request):
+    """Catálogo para la copia local de las terminales (completo o incremental)"""
+    return JsonResponse(sincronizacion.obtener_lote(request.GET.get('desde')))
+
+
+@login_required
+async def buscar_typeahead(request):
+    """
+    Autocompletado del POS (JSON). Vista asíncrona: si el cliente aborta la
+    petición mientras se espera la base de datos, la tarea se cancela.
+    """
+    termino = request.GET.get('q', '')[:100]
+    limite = _entero_positivo(request.GET.get('limite'), typeahead.LIMITE, typeahead.MAXIMO_LIMITE)
+    if not termino.strip():
+        return JsonResponse({'resultados': []})
+
+    version = await typeahead.aversion()
+    if typeahead.indice.version != version:
+        # En un hilo propio: en el hilo síncrono compartido bloquearía las demás
+        # consultas del proceso. Termina aunque esta petición se cancele y la
+        # aprovechan las siguientes.
+        await asyncio.shield(sync_to_async(typeahead.asegurar_en_hilo, thread_sensitive=False)(version))
+    encontrados = typeahead.indice.buscar(termino, limite)
+
+    # El stock cambia con cada venta y no está en el índice
+    ids = [producto_id for producto_id, _ in encontrados]
+    stock = {
+        producto_id: cantidad
+        async for producto_id, cantidad in Producto.objects.filter(id__in=ids, activo=True).values_list('id', 'stock')
+    }
+    return JsonResponse({
+        'resultados': [
+            typeahead.resultado(producto_id, datos, stock[producto_id])
+            for producto_id, datos in encontrados
+            if producto_id in stock
+        ],
+    })
+
+
+@login_required
+def escanear_codigo(request, codigo):
+    """Consulta rápida por código de barras para el lector (JSON)"""
+    datos = escaner.buscar_codigo(codigo)
+    if datos is None:
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    return JsonResponse({
+        'id': datos['id'],
+        'nombre': datos['nombre'],
+        'precio_venta': str(datos['precio_venta']),
+        'stock': datos['stock'],
+        'activo': datos['activo'],
+    })
+
+
+@staff_member_required
+def estadisticas_escaner(request):
+    """Aciertos y fallos de la caché del lector"""
+    return JsonResponse(escaner.estadisticas())
+
+
+def _entero_positivo(valor, defecto, maximo=365):
+    try:
+        return min(max(int(valor), 1), maximo)
+    except (TypeError, ValueError):
+        return defecto
+
+
+@staff_member_required
+@lecturas_replica()
+def reporte_reorden(request):
+    """Productos por reordenar con cantidad sugerida según la venta reciente"""
+    dias = _entero_positivo(request.GET.get('dias'), reorden.DIAS_VENTAS)
+    cobertura = _entero_positivo(request.GET.get('cobertura'), reorden.DIAS_COBERTURA)
+    grupos = reorden.reporte(dias, cobertura)
     
-    return render(request, 'productos/punto_venta.html', {
-        'productos': productos,
-        'form': form
+    if request.GET.get('formato') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="reorden-{timezone.localdate()}.csv"'
+        reorden.escribir_csv(response, grupos)
+        return response
+    
+    return render(request, 'productos/reporte_reorden.html', {
+        'grupos': [(nombre, grupos[clave]) for clave, nombre in reorden.GRUPOS],
+        'dias': dias,
+        'cobertura': cobertura,
     })
 
 
+@staff_member_required
+def metricas_prometheus(request):
+    """Métricas por vista de este proceso en formato de Prometheus"""
+    return HttpResponse(
+        metricas.exportar_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def _turno_venta(request):
+    """
+    Id del turno abierto del cajero (None si no tiene). Con
+    PRODUCTOS_TURNO_OBLIGATORIO lanza ValueError en lugar de regresar None.
+    """
+    turno_id = (
+        TurnoCaja.objects
+        .filter(usuario=request.user, estado='abierto')
+        .values_list('id', flat=True)
+        .first()
+    )
+    if turno_id is None and getattr(settings, 'PRODUCTOS_TURNO_OBLIGATORIO', False):
+        raise ValueError('Abra un turno de caja antes de vender')
+    return turno_id
+
+
 @login_required
 @require_POST
 def procesar_venta(request):
     """Procesar venta con validaciones del servidor"""
     try:
         datos = json.loads(request.body)
+        if not isinstance(datos, dict):
+            return JsonResponse({'error': 'JSON inválido'}, status=400)
         items = datos.get('items', [])
+        clave = datos.get('clave_idempotencia')
         
-        # Validación: verificar que haya items
-        if not items or len(items) == 0:
-            return JsonResponse({
-                'error': 'El carrito está vacío'
-            }, status=400)
-        
-        # Validación: verificar estructura de cada item
-        errores = []
-        for idx, item in enumerate(items):
-            if not item.get('producto_id'):
-                errores.append(f'Item {idx + 1}: ID de producto faltante')
-            if not item.get('cantidad') or item['cantidad'] <= 0:
-                errores.append(f'Item {idx + 1}: Cantidad inválida')
-            if not item.get('precio_unitario') or item['precio_unitario'] <= 0:
-                errores.append(f'Item {idx + 1}: Precio inválido')
-        
+        # Validación: estructura del carrito
+        errores = validar_items(items)
         if errores:
             return JsonResponse({
                 'error': ', '.join(errores)
             }, status=400)
         
-        # Procesar venta en transacción atómica
-        with transaction.atomic():
-            venta = Venta.objects.create(estado='completada')
+        if clave not in (None, ''):
+            if not clave_valida(clave):
+                return JsonResponse({'error': 'Clave de idempotencia inválida'}, status=400)
             
-            for item in items:
-                try:
-                    producto = Producto.objects.get(id=item['producto_id'])
-                except Producto.DoesNotExist:
-                    raise ValueError(f'Producto ID {item["producto_id"]} no encontrado')
-                
-                cantidad = int(item['cantidad'])
-                precio_unitario = Decimal(str(item['precio_unitario']))
-                
-                # Validar stock disponible
-                if producto.stock < cantidad:
-                    raise ValueError(
-                        f'Stock insuficiente para {producto.nombre}. '
-                        f'Disponible: {producto.stock}, Solicitado: {cantidad}'
-                    )
-                
-                # Crear detalle de venta
-                DetalleVenta.objects.create(
-                    venta=venta,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=precio_unitario
-                )
-                
-                # Actualizar stock
-                producto.stock -= cantidad
-                producto.save()
-            
-            # Calcular total de la venta
-            venta.calcular_total()
+            # Reintento de una venta ya registrada: no se vuelve a cobrar
+            venta = Venta.objects.filter(clave_idempotencia=clave).first()
+            if venta is not None:
+                return _respuesta_venta(venta, venta.cantidad_items(), duplicada=True)
+        
+        # Procesar venta en transacción atómica
+        turno_id = _turno_venta(request)
+        try:
+            venta, detalles = procesar_checkout(items, clave, request.user, turno_id)
+        except IntegrityError:
+            venta = Venta.objects.get(clave_idempotencia=clave)
+            return _respuesta_venta(venta, venta.cantidad_items(), duplicada=True)
         
         # Respuesta exitosa
-        return JsonResponse({
-            'venta_id': venta.id,
-            'total': str(venta.total),
-            'cantidad_items': venta.cantidad_items(),
-            'fecha': venta.fecha.strftime('%d/%m/%Y %H:%M')
-        })
+        return _respuesta_venta(venta, len(detalles))
     
     except ValueError as e:
         return JsonResponse({'error': str(e)}, status=400)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'JSON inválido'}, status=400)
+    except OperationalError:
+        # Tiempo de espera del bloqueo agotado: la terminal puede reintentar con la misma clave
+        return JsonResponse({'error': 'Base de datos ocupada, intente de nuevo'}, status=503)
     except Exception as e:
         return JsonResponse({'error': 'Error interno del servidor'}, status=500)
 
 
 @login_required
-def ticket_venta(request, venta_id):
-    """Ver ticket - requiere login"""
-    venta = get_object_or_404(Venta, id=venta_id)
-    contexto = {
-        'venta': venta,
-    }
-    return render(request, 'productos/ticket_venta.html', contexto)
+@require_POST
+def procesar_lote_ventas(request):
+    """Procesar ventas encoladas por la terminal (JSON: {"ventas": [...]})"""
+    try:
+        datos = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    
+    ventas = datos.get('ventas') if isinstance(datos, dict) else None
+    if not isinstance(ventas, list) or not ventas:
+        return JsonResponse({'error': 'No hay ventas para procesar'}, status=400)
+    if len(ventas) > MAXIMO_VENTAS_LOTE:
+        return JsonResponse({
+            'error': f'Máximo {MAXIMO_VENTAS_LOTE} ventas por lote'
+        }, status=400)
+    
+    try:
+        turno_id = _turno_venta(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    try:
+        resultados = procesar_lote(ventas, cajero=request.user, turno_id=turno_id)
+    except Exception:
+        return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+    
+    return JsonResponse({'resultados': resultados})
+
+
+def _respuesta_venta(venta, cantidad_items, duplicada=False):
+    return JsonResponse({
+        'venta_id': venta.id,
+        'total': str(venta.total),
+        'cantidad_items': cantidad_items,
+        'fecha': venta.fecha.strftime('%d/%m/%Y %H:%M'),
+        'duplicada': duplicada,
+    })
+
+
+CONTENT_TYPES_TICKET = {
+    'escpos': 'application/octet-stream',
+    'pdf': 'application/pdf',
+}
+EXTENSIONES_TICKET = {
+    'escpos': 'bin',
+    'pdf': 'pdf',
+}
+
+
+@login_required
+def ticket_venta(request, venta_id, formato='html'):
+    """Ver ticket - requiere login (HTML, ESC/POS o PDF, desde caché)"""
+    if formato not in tickets.FORMATOS:
+        raise Http404('Formato de ticket no válido')
+    
+    fecha_actualizacion = tickets.version(venta_id)
+    # La página HTML incluye el encabezado del usuario: su ETag depende de él
+    extra = f':{request.user.pk}' if formato == 'html' else ''
+    etag = tickets.etag(venta_id, fecha_actualizacion, formato, extra)
+    
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        contenido, fecha_actualizacion = tickets.obtener(venta_id, fecha_actualizacion, formato)
+        # La venta pudo cambiar desde tickets.version(): el ETag describe lo que se envía
+        etag = tickets.etag(venta_id, fecha_actualizacion, formato, extra)
+        if formato == 'html':
+            response = render(request, 'productos/ticket_venta.html', {
+                'venta_id': venta_id,
+                'ticket': mark_safe(contenido),
+            })
+        else:
+            response = HttpResponse(contenido, content_type=CONTENT_TYPES_TICKET[formato])
+            response['Content-Disposition'] = (
+                f'inline; filename="ticket-{venta_id}.{EXTENSIONES_TICKET[formato]}"'
+            )
+    
+    response['ETag'] = etag
+    # Siempre revalidar: el ETag cambia si la venta se edita
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@staff_member_required
+def exportar_ventas(request):
+    """Detalles de venta de un rango de fechas en CSV o JSONL, sin cargarlos en memoria"""
+    form = ExportarVentasForm(request.GET)
+    if not form.is_valid():
+        # Mismo formato {'error': ...} que las demás vistas JSON
+        mensaje = '; '.join(
+            ' '.join(mensajes) if campo == '__all__' else f'{campo}: {" ".join(mensajes)}'
+            for campo, mensajes in form.errors.items()
+        )
+        return JsonResponse({'error': mensaje}, status=400)
+    
+    datos = form.cleaned_data
+    # El generador corre después de que la vista regresa: él mismo entra a la réplica
+    response = StreamingHttpResponse(
+        en_replica(exportacion.exportar(datos['formato'], datos['desde'], datos['hasta'], datos['estado'])),
+        content_type=exportacion.CONTENT_TYPES[datos['formato']],
+    )
+    nombre = f"ventas-{datos['desde']}-{datos['hasta']}.{datos['formato']}"
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
+@login_required
+def turno_caja(request):
+    """Turno de caja del cajero: apertura, totales en curso y corte"""
+    turno = turnos.abierto(request.user)
+    abrir_form = AbrirTurnoForm()
+    cerrar_form = CerrarTurnoForm()
+    error = None
+    
+    if request.method == 'POST':
+        try:
+            if request.POST.get('accion') == 'abrir':
+                abrir_form = AbrirTurnoForm(request.POST)
+                if abrir_form.is_valid():
+                    turnos.abrir(request.user, **abrir_form.cleaned_data)
+                    return redirect('productos:turno_caja')
+            elif request.POST.get('accion') == 'cerrar' and turno is not None:
+                cerrar_form = CerrarTurnoForm(request.POST)
+                if cerrar_form.is_valid():
+                    turno = turnos.cerrar(turno.id, cerrar_form.cleaned_data['efectivo_contado'])
+                    return redirect('productos:corte_turno', turno_id=turno.id)
+            else:
+                error = 'El turno cambió; revise e intente de nuevo'
+        except ValueError as e:
+            error = str(e)
+    
+    return render(request, 'productos/turno_caja.html', {
+        'turno': turno,
+        'abrir_form': abrir_form,
+        'cerrar_form': cerrar_form,
+        'error': error,
+    })
+
+
+@login_required
+def corte_turno(request, turno_id):
+    """Corte de un turno: una sola fila con los totales acumulados"""
+    turno = get_object_or_404(TurnoCaja.objects.select_related('usuario'), id=turno_id)
+    if turno.usuario_id != request.user.id and not request.user.is_staff:
+        raise Http404('Turno no encontrado')
+    return render(request, 'productos/corte_turno.html', {'turno': turno})
 
 
 def login_view(request):
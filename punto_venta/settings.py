@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import copy
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Primero, para medir también sesión y autenticación
+    'productos.metricas.MetricasMiddleware',
+    # Antes de sesiones: guardar la sesión también cuenta como escritura
+    'productos.replica.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,13 +80,111 @@ WSGI_APPLICATION = 'punto_venta.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Perfil elegido con POS_DB_ENGINE: 'sqlite' (por defecto) o 'postgresql'.
+
+POS_DB_ENGINE = os.environ.get('POS_DB_ENGINE', 'sqlite')
+
+if POS_DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POS_DB_NAME', 'punto_venta'),
+            'USER': os.environ.get('POS_DB_USER', 'punto_venta'),
+            'PASSWORD': os.environ.get('POS_DB_PASSWORD', ''),
+            'HOST': os.environ.get('POS_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('POS_DB_PORT', '5432'),
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('POS_DB_POOL', '1') == '1':
+        # Pool nativo de Django 5.1+ (psycopg[pool]); no admite CONN_MAX_AGE
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POS_DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('POS_DB_POOL_MAX', '10')),
+            'timeout': int(os.environ.get('POS_DB_POOL_TIMEOUT', '10')),
+        }
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('POS_DB_CONN_MAX_AGE', '60'))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+else:
+    # WAL permite leer mientras otro cajero escribe; IMMEDIATE toma el candado
+    # de escritura al iniciar la transacción y busy_timeout espera en lugar de
+    # fallar con "database is locked".
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('POS_DB_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=5000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        }
+    }
+
+# Ventas archivadas (archivar_ventas). Con POS_ARCHIVO_DB_PATH se guardan en
+# un archivo SQLite aparte; si no, en tablas propias de la base principal.
+PRODUCTOS_ARCHIVO_DB = 'default'
+if os.environ.get('POS_ARCHIVO_DB_PATH'):
+    DATABASES['archivo'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ['POS_ARCHIVO_DB_PATH'],
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;PRAGMA busy_timeout=5000;',
+            'timeout': 20,
+        },
     }
+    PRODUCTOS_ARCHIVO_DB = 'archivo'
+
+# Réplica de lectura para reportes, exportaciones y listas del admin. En
+# PostgreSQL, POS_REPLICA_DB_HOST es el host de una réplica de streaming; en
+# SQLite, POS_REPLICA_DB_PATH es una copia que mantiene sincronizar_replica.
+PRODUCTOS_REPLICA_DB = None
+if POS_DB_ENGINE == 'postgresql' and os.environ.get('POS_REPLICA_DB_HOST'):
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica']['HOST'] = os.environ['POS_REPLICA_DB_HOST']
+elif POS_DB_ENGINE != 'postgresql' and os.environ.get('POS_REPLICA_DB_PATH'):
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica']['NAME'] = os.environ['POS_REPLICA_DB_PATH']
+if 'replica' in DATABASES:
+    # En pruebas la réplica es la misma base de pruebas
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    PRODUCTOS_REPLICA_DB = 'replica'
+
+DATABASE_ROUTERS = ['productos.routers.ArchivoRouter', 'productos.routers.ReplicaRouter']
+
+
+# Caché
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# El alias 'catalogo' guarda la caché del lector de códigos de barras.
+# Con POS_CACHE_DIR se usa un caché en archivos compartido entre procesos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogo': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalogo',
+        'TIMEOUT': 3600,
+    },
 }
 
+if os.environ.get('POS_CACHE_DIR'):
+    CACHES['catalogo'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['POS_CACHE_DIR'],
+        'TIMEOUT': 3600,
+    }
+
+PRODUCTOS_CACHE_ALIAS = 'catalogo'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -144,4 +247,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Configuración de autenticación
 LOGIN_URL = '/productos/login/'
 LOGIN_REDIRECT_URL = '/productos/pos/'
-LOGOUT_REDIRECT_URL = '/productos/login/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/productos/login/'
+
+# Búsqueda de productos (punto de venta y admin)
+# Usar 'productos.busqueda.IcontainsBackend' en bases de datos sin FTS5
+PRODUCTOS_BUSQUEDA_BACKEND = 'productos.busqueda.FTS5Backend'
+
+# Con True el punto de venta rechaza ventas de un cajero sin turno de caja abierto
+PRODUCTOS_TURNO_OBLIGATORIO = os.environ.get('POS_TURNO_OBLIGATORIO') == '1'
@@ -0,0 +1,128 @@
+const CatalogoLocal = {
+
+    DB_NOMBRE: 'pos-catalogo',
+    DB_VERSION: 1,
+    db: null,
+    url: null,
+    etag: null,
+
+    // Abrir (o crear) la base IndexedDB con los almacenes de productos y metadatos
+    abrir: function(url) {
+        this.url = url;
+
+        return new Promise((resolve, reject) => {
+            if (!window.indexedDB) {
+                reject(new Error('IndexedDB no disponible'));
+                return;
+            }
+
+            const peticion = indexedDB.open(this.DB_NOMBRE, this.DB_VERSION);
+
+            peticion.onupgradeneeded = () => {
+                const db = peticion.result;
+                db.createObjectStore('productos', { keyPath: 'id' });
+                db.createObjectStore('meta');
+            };
+            peticion.onsuccess = () => {
+                this.db = peticion.result;
+                resolve(this);
+            };
+            peticion.onerror = () => reject(peticion.error);
+        });
+    },
+
+    // Normalizar texto: minúsculas y sin acentos ("Jamón" -> "jamon")
+    normalizar: function(texto) {
+        return (texto || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
+    },
+
+    leerMeta: function(clave) {
+        return new Promise((resolve, reject) => {
+            const peticion = this.db.transaction('meta').objectStore('meta').get(clave);
+            peticion.onsuccess = () => resolve(peticion.result);
+            peticion.onerror = () => reject(peticion.error);
+        });
+    },
+
+    // Aplicar un lote del servidor: altas/cambios, bajas y nuevo cursor en una transacción
+    aplicarLote: function(lote) {
+        return new Promise((resolve, reject) => {
+            const tx = this.db.transaction(['productos', 'meta'], 'readwrite');
+            const productos = tx.objectStore('productos');
+
+            if (lote.completo && !lote.continuacion) {
+                productos.clear();
+            }
+            lote.productos.forEach(producto => {
+                producto.busqueda = this.normalizar(producto.nombre) + ' ' + producto.codigo_barras;
+                productos.put(producto);
+            });
+            lote.eliminados.forEach(id => productos.delete(id));
+            tx.objectStore('meta').put(lote.cursor, 'cursor');
+
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => reject(tx.error);
+        });
+    },
+
+    // Descargar los cambios desde el último cursor hasta quedar al día
+    sincronizar: async function() {
+        let cursor = await this.leerMeta('cursor');
+        let primero = true;
+
+        while (true) {
+            const params = cursor ? '?desde=' + encodeURIComponent(cursor) : '';
+            const headers = {};
+            if (primero && this.etag) {
+                headers['If-None-Match'] = this.etag;
+            }
+
+            const response = await fetch(this.url + params, { headers: headers });
+            if (response.status === 304) {
+                return;
+            }
+            if (!response.ok) {
+                throw new Error('Error al sincronizar catálogo: ' + response.status);
+            }
+
+            const lote = await response.json();
+            lote.continuacion = !primero;
+            await this.aplicarLote(lote);
+
+            // El ETag corresponde al cursor pedido: sirve para la siguiente consulta
+            // cuando este lote ya no trajo cambios
+            this.etag = response.headers.get('ETag');
+            primero = false;
+            cursor = lote.cursor;
+
+            if (!lote.hay_mas) {
+                return;
+            }
+        }
+    },
+
+    // Buscar por subcadena en nombre o código sin ir al servidor
+    buscar: function(texto, limite) {
+        const termino = this.normalizar(texto.trim());
+        limite = limite || 100;
+
+        return new Promise((resolve, reject) => {
+            const resultados = [];
+            const peticion = this.db.transaction('productos').objectStore('productos').openCursor();
+
+            peticion.onsuccess = () => {
+                const cursor = peticion.result;
+                if (!cursor || resultados.length >= limite) {
+                    resultados.sort((a, b) => a.nombre.localeCompare(b.nombre, 'es'));
+                    resolve(resultados);
+                    return;
+                }
+                if (cursor.value.busqueda.includes(termino)) {
+                    resultados.push(cursor.value);
+                }
+                cursor.continue();
+            };
+            peticion.onerror = () => reject(peticion.error);
+        });
+    }
+};